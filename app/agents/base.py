@@ -2,19 +2,17 @@
 from __future__ import annotations
 
 import json
-import os
-from pathlib import Path
+from functools import cached_property
 
-from strands import Agent as StrandsAgent
-from strands.models import BedrockModel, OpenAIModel
 from pydantic import BaseModel
 
-from app.core.config import settings
-from app.mcp.prompt_registry import PromptRegistryClient
-from app.mcp.schema_registry import SchemaRegistryClient
-from app.mcp.routing import RoutingClient
-from app.services.llm_client import LangChainLLMClient, LLMClient
-from app.utils.prompt_loader import load_prompt, load_prompt_vars
+from app.core.metrics import estimate_cost, record_llm_call, record_prompt
+from app.services.llm_cache import CachedLLMClient, cache_key, get_llm_cache, llm_cache_enabled_for
+from app.services.llm_client import LLMClient, LLMResult
+from app.services.model_registry import ModelRegistry, get_model_registry
+from app.services.prompt_builder import BuiltPrompt, build_prompt, document_allowance, dynamic_header, static_block
+from app.services.prompt_cache import get_prompt_prefix, get_schema_json
+from app.utils.document import DocumentHandle
 
 
 class AgentResult(BaseModel):
@@ -22,113 +20,138 @@ class AgentResult(BaseModel):
 
 
 class AwsStrandsAgent:
+    # Resources this agent uses: "llm" (LangChain), "strands", "prompts" (templates/schemas).
+    capabilities: frozenset[str] = frozenset()
+    # Bump when a change to prompts, models or output shape should invalidate stored stage results.
+    version: str = "1"
+
     def __init__(self, llm_client: LLMClient | None = None) -> None:
-        """Initialize Strands and LangChain clients for agent execution."""
-        self._agent = self._build_strands_agent()
-        self._llm = llm_client or LangChainLLMClient()
-        self._router = RoutingClient()
-        self._prompt_registry = PromptRegistryClient()
-        self._schema_registry = SchemaRegistryClient()
+        """Create the agent; declared resources are built lazily on first use."""
+        self._llm_override = llm_client
+
+    @property
+    def _models(self) -> ModelRegistry:
+        """The worker's model registry (only touched by LLM-backed agents)."""
+        return get_model_registry()
+
+    @cached_property
+    def _llm(self) -> LLMClient:
+        """Default LangChain client, built on first use."""
+        self._require("llm")
+        return self._llm_override or self._models.get_llm()
+
+    def _require(self, capability: str) -> None:
+        """Fail fast when an agent uses a resource it did not declare."""
+        if capability not in self.capabilities:
+            raise RuntimeError(f"{type(self).__name__} does not declare the '{capability}' capability.")
 
     def run(self, document_path: str, context: dict) -> AgentResult:
+        """Compatibility shim: open the document and delegate to ``run_document``."""
+        with DocumentHandle.open(document_path) as document:
+            return self.run_document(document, context)
+
+    def run_document(self, document: DocumentHandle, context: dict) -> AgentResult:
         raise NotImplementedError
 
-    def _build_strands_agent(self) -> StrandsAgent:
-        """Build the default Strands agent from environment settings."""
-        return self._build_strands_agent_for(settings.strands_provider, settings.strands_model_id)
-
-    def _build_strands_agent_for(self, provider: str, model_id: str) -> StrandsAgent:
-        """Build a Strands agent for a specific provider/model."""
-        provider = provider.lower()
-        if provider == "default":
-            return StrandsAgent()
-        if provider == "openai":
-            client_args = {}
-            api_key = os.getenv("OPENAI_API_KEY")
-            if api_key:
-                client_args["api_key"] = api_key
-            model = OpenAIModel(
-                client_args=client_args,
-                model_id=model_id,
-                params={"temperature": settings.strands_temperature},
-            )
-            return StrandsAgent(model=model)
-        if provider == "bedrock":
-            model = BedrockModel(
-                model_id=model_id,
-                region_name=settings.strands_region,
-                temperature=settings.strands_temperature,
-            )
-            return StrandsAgent(model=model)
-        raise ValueError(f"Unsupported Strands provider: {provider}")
-
-    def _get_strands_agent(self, context: dict) -> StrandsAgent:
-        """Resolve the Strands agent from MCP routing (tenant-aware)."""
+    def _get_strands_agent(self, context: dict):
+        """Resolve the pooled Strands agent from MCP routing (tenant-aware)."""
+        self._require("strands")
         tenant_id = context.get("tenant_id")
         if tenant_id:
-            decision = self._router.resolve_route(str(tenant_id))
+            decision = self._models.resolve_route(str(tenant_id))
             if decision.provider in {"openai", "bedrock"}:
-                return self._build_strands_agent_for(decision.provider, decision.model)
-        return self._agent
+                return self._models.get_strands_agent(decision.provider, decision.model)
+        return self._models.get_strands_agent()
+
+    def _invoke_strands(self, context: dict, prompt: str) -> str:
+        """Call the routed Strands agent (through the response cache) and return its text output."""
+        agent = self._get_strands_agent(context)
+        cache = get_llm_cache() if self._cache_allowed(context) else None
+        key = cache_key(f"strands:{agent.provider}", agent.model, agent.temperature, prompt)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                record_llm_call({"provider": agent.provider, "model": agent.model, "cache": "hit"})
+                return cached
+        result = agent(prompt)
+        message = getattr(result, "message", None)
+        text = message if isinstance(message, str) else str(result)
+        record_llm_call(_strands_usage(agent.provider, agent.model, result))
+        if cache is not None:
+            cache.set(key, text)
+        return text
+
+    def _generate(self, context: dict, prompt: str) -> LLMResult:
+        """Generate with the routed LangChain client through the response cache."""
+        result = self._llm_for(context).generate(prompt)
+        record_llm_call(result.metadata)
+        return result
+
+    def _llm_for(self, context: dict) -> LLMClient:
+        """Routed client for this context, wrapped in the response cache when allowed.
+
+        Resolve it before entering an event loop: routing may call MCP synchronously.
+        """
+        llm = self._get_llm(context)
+        if self._cache_allowed(context):
+            llm = CachedLLMClient(llm, get_llm_cache())
+        return llm
+
+    def _cache_allowed(self, context: dict) -> bool:
+        """Honor the global switch, per-tenant opt-outs and the tenant route's cache flag."""
+        tenant_id = context.get("tenant_id")
+        route_allows = self._models.resolve_route(str(tenant_id)).cache_enabled if tenant_id else True
+        return llm_cache_enabled_for(tenant_id, route_allows)
 
     def _get_llm(self, context: dict) -> LLMClient:
-        """Resolve the LangChain client from MCP routing (tenant-aware)."""
+        """Resolve the pooled LangChain client from MCP routing (tenant-aware)."""
+        self._require("llm")
         tenant_id = context.get("tenant_id")
         if tenant_id:
-            decision = self._router.resolve_route(str(tenant_id))
-            return LangChainLLMClient(provider=decision.provider, model=decision.model)
+            decision = self._models.resolve_route(str(tenant_id))
+            return self._models.get_llm(provider=decision.provider, model=decision.model)
         return self._llm
 
-    def _read_document(self, document_path: str) -> str:
-        """Load a document from disk as text."""
-        return Path(document_path).read_text(encoding="utf-8", errors="ignore")
-
-    def _render_prompt(
+    def _build_prompt(
         self,
         prompt_name: str,
         context: dict,
         document_text: str,
+        *,
         schema_name: str | None = None,
-    ) -> str:
-        """Combine prompt templates, context, and schema into a single prompt."""
-        prompt = self._load_prompt(prompt_name)
-        try:
-            vars_payload = load_prompt_vars(prompt_name.replace(".txt", ".json"))
-        except FileNotFoundError:
-            vars_payload = {}
-        prompt_vars = json.dumps(vars_payload, ensure_ascii=True)
-        context_json = json.dumps(context, ensure_ascii=True)
-        schema_payload = self._load_schema(schema_name)
-        schema_json = json.dumps(schema_payload, ensure_ascii=True) if schema_payload else None
-        parts = [
-            prompt,
-            f"Prompt vars: {prompt_vars}",
-            f"Context: {context_json}",
-        ]
-        if schema_json:
-            parts.append(f"Schema: {schema_json}")
-        parts.append(f"Document:\n{document_text}")
-        return "\n\n".join(
-            parts
+        model: str = "",
+        budget: int = 0,
+        context_keys: tuple[str, ...] = (),
+        strategy: str = "sections",
+    ) -> BuiltPrompt:
+        """Build a prompt that fits ``budget`` tokens of ``model`` (0 disables the budget).
+
+        Template, vars and schema come first so providers can cache them as a shared
+        prefix; the context and document follow. Only ``context_keys`` of the context are
+        rendered (none by default): per-document ids would make every prompt unique and
+        defeat the response cache.
+        """
+        self._require("prompts")
+        context = {key: context[key] for key in context_keys if key in context}
+        built = build_prompt(
+            get_prompt_prefix(prompt_name),
+            get_schema_json(schema_name),
+            context,
+            document_text,
+            model=model,
+            budget=budget,
+            strategy=strategy,
         )
+        record_prompt(built.tokens_saved)
+        return built
 
-    def _load_prompt(self, prompt_name: str) -> str:
-        """Fetch a prompt from MCP if configured, otherwise from disk."""
-        try:
-            record = self._prompt_registry.fetch_prompt(prompt_name)
-            return record.template
-        except Exception:
-            return load_prompt(prompt_name)
-
-    def _load_schema(self, schema_name: str | None) -> dict | None:
-        """Fetch a JSON schema from MCP if configured."""
-        if not schema_name:
-            return None
-        try:
-            record = self._schema_registry.fetch_schema(schema_name)
-            return record.payload
-        except Exception:
-            return None
+    def _document_allowance(
+        self, prompt_name: str, context: dict, *, schema_name: str | None, model: str, budget: int
+    ) -> int:
+        """Document tokens that fit ``budget`` next to this prompt's static block and ``context``."""
+        self._require("prompts")
+        static = static_block(get_prompt_prefix(prompt_name), get_schema_json(schema_name))
+        return document_allowance(static, dynamic_header(context), budget, model)
 
     def _parse_json(self, text: str, fallback: dict | list) -> dict | list:
         """Parse JSON from model output with a safe fallback."""
@@ -144,3 +167,17 @@ class AwsStrandsAgent:
                     except json.JSONDecodeError:
                         continue
         return fallback
+
+
+def _strands_usage(provider: str, model: str, result: object) -> dict:
+    """LLMResult-style metadata from a Strands result's accumulated token usage."""
+    usage = getattr(getattr(result, "metrics", None), "accumulated_usage", None) or {}
+    prompt_tokens = int(usage.get("inputTokens", 0))
+    completion_tokens = int(usage.get("outputTokens", 0))
+    return {
+        "provider": provider,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens),
+    }
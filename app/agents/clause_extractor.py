@@ -1,29 +1,295 @@
 """Clause extraction agent implemented in AWS Strands."""
 from __future__ import annotations
 
+import asyncio
 import logging
+import queue
+import re
+from typing import Callable
 
 from app.core.config import settings
 from app.agents.base import AgentResult, AwsStrandsAgent
+from app.core.metrics import record_llm_call
+from app.services.llm_client import LLMClient, LLMResult, run_async, submit_async
+from app.services.prompt_builder import BuiltPrompt
+from app.utils.chunking import TextSection, split_sections
+from app.utils.document import DocumentHandle
+from app.utils.json_stream import JsonArrayStream, parse_array_objects
+from app.utils.tokens import count_tokens
 
 logger = logging.getLogger(__name__)
 
+# Context the extraction prompt uses; ids and bookkeeping fields would only make prompts unique.
+_CONTEXT_KEYS = ("contract_type", "extraction_mode", "section")
+_DONE = object()
+
 class ClauseExtractionAgent(AwsStrandsAgent):
-    def run(self, document_path: str, context: dict) -> AgentResult:
-        """Extract key clauses from the contract using the configured LLM."""
+    capabilities = frozenset({"llm", "prompts"})
+
+    def run_document(
+        self,
+        document: DocumentHandle,
+        context: dict,
+        on_clause: Callable[[dict], None] | None = None,
+    ) -> AgentResult:
+        """Extract key clauses section by section (map) and merge them across boundaries (reduce).
+
+        With ``CLAUSE_STREAMING`` on, clauses are handed to ``on_clause`` as the model emits them.
+        """
         logger.info("clause_extraction_start document_id=%s", context.get("document_id"))
-        document_text = self._read_document(document_path)
-        prompt = self._render_prompt(
+        document_text = document.text
+        # Prompts and the routed client are resolved here; only provider calls run on the event loop.
+        llm = self._llm_for(context)
+        sections = split_sections(document_text, settings.clause_section_chars, settings.clause_section_overlap)
+        sections = self._fit_sections(document_text, sections, context, llm.model)
+        prompts = [
+            self._section_prompt(document_text, section, len(sections), context, llm.model).text
+            for section in sections
+        ]
+        if settings.clause_streaming:
+            clauses, responses = self._stream_sections(document_text, sections, prompts, llm, on_clause)
+        else:
+            responses = run_async(_generate_all(llm, prompts, settings.clause_max_concurrency))
+            extracted = [
+                self._anchor(document_text, section, response.text)
+                for section, response in zip(sections, responses)
+            ]
+            clauses = _merge_clauses(document_text, [clause for batch in extracted for clause in batch])
+        for response in responses:
+            # Recorded here: the event loop thread does not carry this stage's metrics span.
+            record_llm_call(response.metadata)
+        logger.info(
+            "clause_extraction_done document_id=%s sections=%s count=%s",
+            context.get("document_id"),
+            len(sections),
+            len(clauses),
+        )
+        return AgentResult(payload={"clauses": clauses})
+
+    def _section_prompt(
+        self, document_text: str, section: TextSection, total: int, context: dict, model: str
+    ) -> BuiltPrompt:
+        """Render the extraction prompt for one section."""
+        section_context = context
+        if total > 1:
+            section_context = {**context, "section": {"index": section.index, "count": total}}
+        return self._build_prompt(
             "extract_clauses.txt",
-            context,
-            document_text,
+            section_context,
+            document_text[section.start : section.end],
             schema_name=settings.mcp_schema_clause_extraction or None,
+            model=model,
+            budget=settings.prompt_budget_clauses,
+            context_keys=_CONTEXT_KEYS,
+            strategy="truncate",
         )
-        response = self._get_llm(context).generate(prompt)
-        parsed = self._parse_json(response.text, [])
-        if isinstance(parsed, dict):
-            clauses = parsed.get("clauses", [])
-        else:
-            clauses = parsed
-        logger.info("clause_extraction_done document_id=%s count=%s", context.get("document_id"), len(clauses))
-        return AgentResult({"clauses": clauses})
+
+    def _fit_sections(
+        self, document_text: str, sections: list[TextSection], context: dict, model: str
+    ) -> list[TextSection]:
+        """Split sections that would overflow the prompt budget; extraction must see every clause, so none are cut."""
+        budget = settings.prompt_budget_clauses
+        if not budget:
+            return sections
+        probe = {key: context[key] for key in _CONTEXT_KEYS if key in context}
+        probe["section"] = {"index": 99999, "count": 99999}
+        allowance = self._document_allowance(
+            "extract_clauses.txt",
+            probe,
+            schema_name=settings.mcp_schema_clause_extraction or None,
+            model=model,
+            budget=budget,
+        )
+        if allowance <= 0:
+            raise ValueError(f"PROMPT_BUDGET_CLAUSES={budget} does not cover the static clause prompt.")
+        fitted: list[TextSection] = []
+        for section in sections:
+            text = document_text[section.start : section.end]
+            tokens = count_tokens(text, model)
+            if tokens <= allowance:
+                fitted.append(section)
+                continue
+            # Aim under the allowance: token density varies across a section.
+            max_chars = max(2, int(len(text) * allowance / tokens * 0.9))
+            overlap = min(settings.clause_section_overlap, max_chars // 2 - 1)
+            for part in split_sections(text, max_chars, max(0, overlap)):
+                fitted.append(TextSection(index=0, start=section.start + part.start, end=section.start + part.end))
+        if len(fitted) > len(sections):
+            logger.info("clause_sections_resplit sections=%s fitted=%s budget=%s", len(sections), len(fitted), budget)
+        return [section.model_copy(update={"index": index}) for index, section in enumerate(fitted)]
+
+    def _stream_sections(
+        self,
+        document_text: str,
+        sections: list[TextSection],
+        prompts: list[str],
+        llm: LLMClient,
+        on_clause: Callable[[dict], None] | None,
+    ) -> tuple[list[dict], list[LLMResult]]:
+        """Stream every section, releasing each clause as soon as it parses.
+
+        Only clauses outside the overlaps with neighbouring sections are released
+        early; no other section can repeat them. The rest are merged once all
+        sections finish. Each clause gets a ``clause_id`` that is unique within this run;
+        ids follow arrival order, so the caller clears earlier runs' clauses before indexing.
+        """
+        parsed: queue.SimpleQueue = queue.SimpleQueue()
+        future = submit_async(_stream_all(llm, prompts, settings.clause_max_concurrency, parsed))
+        released: list[dict] = []
+        held: list[dict] = []
+        counts = [0] * len(sections)
+        try:
+            # Drained on this thread so ``on_clause`` never blocks the event loop.
+            while (item := parsed.get()) is not _DONE:
+                index, clause = item
+                clause = self._anchor_clause(document_text, sections[index], clause)
+                if not _interior(clause, sections, index):
+                    held.append(clause)
+                    continue
+                overlapping = _overlapping(released, clause)
+                if overlapping is not None:
+                    # Re-emitted under the same clause_id, so the indexed copy is overwritten.
+                    _absorb(document_text, overlapping, clause)
+                    clause = overlapping
+                else:
+                    clause["clause_id"] = f"{index}.{counts[index]}"
+                    counts[index] += 1
+                    released.append(clause)
+                if on_clause is not None:
+                    on_clause(clause)
+            responses = future.result()
+        finally:
+            future.cancel()
+        merged = _merge_clauses(document_text, held)
+        for ordinal, clause in enumerate(merged):
+            clause["clause_id"] = f"merged.{ordinal}"
+        return released + merged, responses
+
+    def _anchor(self, document_text: str, section: TextSection, response_text: str) -> list[dict]:
+        """Parse a section's clauses and anchor each one to document offsets."""
+        # Tolerant parse: a truncated or malformed response still yields its complete clauses.
+        return [self._anchor_clause(document_text, section, clause) for clause in parse_array_objects(response_text)]
+
+    def _anchor_clause(self, document_text: str, section: TextSection, clause: dict) -> dict:
+        """Copy of ``clause`` with its document offsets (None when its text is not found)."""
+        span = _locate(document_text[section.start : section.end], str(clause.get("text") or ""))
+        clause = dict(clause)
+        clause["start_offset"] = section.start + span[0] if span else None
+        clause["end_offset"] = section.start + span[1] if span else None
+        return clause
+
+
+async def _generate_all(llm: LLMClient, prompts: list[str], concurrency: int) -> list[LLMResult]:
+    """Run one ``agenerate`` per prompt, at most ``concurrency`` at a time, preserving order."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def generate(prompt: str) -> LLMResult:
+        async with semaphore:
+            return await llm.agenerate(prompt)
+
+    return await asyncio.gather(*(generate(prompt) for prompt in prompts))
+
+
+async def _stream_all(
+    llm: LLMClient, prompts: list[str], concurrency: int, parsed: queue.SimpleQueue
+) -> list[LLMResult]:
+    """Stream one response per prompt, at most ``concurrency`` at a time, queueing ``(index, clause)`` as parsed."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def stream(index: int, prompt: str) -> LLMResult:
+        parser = JsonArrayStream()
+
+        def on_text(text: str) -> None:
+            for element in parser.feed(text):
+                parsed.put((index, element))
+
+        async with semaphore:
+            result = await llm.astream(prompt, on_text)
+        for element in parser.close():
+            parsed.put((index, element))
+        if parser.skipped:
+            logger.warning("clause_stream_elements_skipped section=%s skipped=%s", index, parser.skipped)
+        return result
+
+    try:
+        return await asyncio.gather(*(stream(index, prompt) for index, prompt in enumerate(prompts)))
+    finally:
+        parsed.put(_DONE)
+
+
+def _interior(clause: dict, sections: list[TextSection], index: int) -> bool:
+    """Whether an anchored clause lies outside section ``index``'s overlaps with its neighbours."""
+    start = clause.get("start_offset")
+    if start is None:
+        return False
+    if index > 0 and start < sections[index - 1].end:
+        return False
+    return index + 1 >= len(sections) or clause["end_offset"] <= sections[index + 1].start
+
+
+def _locate(haystack: str, needle: str) -> tuple[int, int] | None:
+    """Find ``needle`` in ``haystack`` exactly, then ignoring whitespace differences."""
+    needle = needle.strip()
+    if not needle:
+        return None
+    index = haystack.find(needle)
+    if index != -1:
+        return index, index + len(needle)
+    words = needle.split()
+    match = re.search(r"\s+".join(re.escape(word) for word in words), haystack)
+    return match.span() if match else None
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _overlapping(clauses: list[dict], clause: dict) -> dict | None:
+    """The last anchored clause of the same type whose span overlaps ``clause``."""
+    clause_type = _normalize(str(clause.get("clause_type") or ""))
+    return next(
+        (
+            kept
+            for kept in reversed(clauses)
+            if _normalize(str(kept.get("clause_type") or "")) == clause_type
+            and clause["start_offset"] < kept["end_offset"]
+            and kept["start_offset"] < clause["end_offset"]
+        ),
+        None,
+    )
+
+
+def _absorb(document_text: str, kept: dict, clause: dict) -> None:
+    """Widen ``kept`` to cover ``clause`` and keep the higher confidence."""
+    if clause["start_offset"] < kept["start_offset"] or clause["end_offset"] > kept["end_offset"]:
+        kept["start_offset"] = min(kept["start_offset"], clause["start_offset"])
+        kept["end_offset"] = max(kept["end_offset"], clause["end_offset"])
+        kept["text"] = document_text[kept["start_offset"] : kept["end_offset"]]
+    confidences = [c for c in (kept.get("confidence"), clause.get("confidence")) if isinstance(c, (int, float))]
+    if confidences:
+        kept["confidence"] = max(confidences)
+
+
+def _merge_clauses(document_text: str, clauses: list[dict]) -> list[dict]:
+    """De-duplicate clauses repeated in overlapping sections and join ones split across a cut."""
+    anchored = sorted(
+        (clause for clause in clauses if clause.get("start_offset") is not None),
+        key=lambda clause: (clause["start_offset"], -clause["end_offset"]),
+    )
+    merged: list[dict] = []
+    for clause in anchored:
+        previous = _overlapping(merged, clause)
+        if previous is None:
+            merged.append(clause)
+            continue
+        _absorb(document_text, previous, clause)
+
+    seen = {(_normalize(str(c.get("clause_type") or "")), _normalize(str(c.get("text") or ""))) for c in merged}
+    for clause in clauses:
+        if clause.get("start_offset") is not None:
+            continue
+        key = (_normalize(str(clause.get("clause_type") or "")), _normalize(str(clause.get("text") or "")))
+        if key not in seen:
+            seen.add(key)
+            merged.append(clause)
+    return merged
@@ -5,24 +5,27 @@ import logging
 
 from app.core.config import settings
 from app.agents.base import AgentResult, AwsStrandsAgent
+from app.utils.document import DocumentHandle
 
 logger = logging.getLogger(__name__)
 
 class ContractTypeAgent(AwsStrandsAgent):
-    def run(self, document_path: str, context: dict) -> AgentResult:
+    capabilities = frozenset({"strands", "prompts"})
+
+    def run_document(self, document: DocumentHandle, context: dict) -> AgentResult:
         """Detect the contract type using the CUAD taxonomy."""
         logger.info("contract_type_start document_id=%s", context.get("document_id"))
-        document_text = self._read_document(document_path)
-        prompt = self._render_prompt(
+        document_text = document.text
+        prompt = self._build_prompt(
             "detect_contract_type.txt",
             context,
             document_text,
             schema_name=settings.mcp_schema_contract_type or None,
+            model=self._get_strands_agent(context).model,
+            budget=settings.prompt_budget_contract_type,
         )
-        agent = self._get_strands_agent(context)
-        result = agent(prompt)
-        raw_text = getattr(result, "message", str(result))
+        raw_text = self._invoke_strands(context, prompt.text)
         payload = self._parse_json(raw_text, {"contract_type": "Unknown"})
         contract_type = payload.get("contract_type", "Unknown")
         logger.info("contract_type_done document_id=%s type=%s", context.get("document_id"), contract_type)
-        return AgentResult({"contract_type": contract_type})
+        return AgentResult(payload={"contract_type": contract_type})
@@ -2,10 +2,13 @@
 from __future__ import annotations
 
 import logging
+from functools import cached_property
 
 from app.agents.base import AgentResult, AwsStrandsAgent
+from app.core.config import settings
+from app.services.near_duplicates import NearDuplicateIndex
 from app.services.storage import RedisClient
-from app.utils.hashing import sha256_file
+from app.utils.document import DocumentHandle
 
 logger = logging.getLogger(__name__)
 
@@ -15,14 +18,36 @@ class DeduplicationAgent(AwsStrandsAgent):
         super().__init__()
         self._redis = redis_client
 
-    def run(self, document_path: str, context: dict) -> AgentResult:
-        """Compute a SHA-256 hash and check for duplicates in Redis."""
+    def run_document(self, document: DocumentHandle, context: dict) -> AgentResult:
+        """Claim the handle's SHA-256 hash in Redis; another owner means a duplicate."""
         logger.info("dedup_start document_id=%s", context.get("document_id"))
-        document_hash = sha256_file(document_path)
-        is_duplicate = bool(self._redis and self._redis.has_document_hash(document_hash))
+        document_hash = document.sha256
+        document_id = context.get("document_id")
+        is_duplicate = False
+        if self._redis:
+            # The API usually claimed the hash at upload; the claim is then ours and not a duplicate.
+            claim = self._redis.claim_document_hash(document_hash, str(document_id))
+            is_duplicate = claim is not None and claim.document_id != document_id
+        payload = {"is_duplicate": is_duplicate, "document_hash": document_hash}
+        if settings.near_dup_enabled and not is_duplicate:
+            matches = self._near_duplicates.query(self._near_duplicates.signature(document.text), exclude=document_id)
+            if matches:
+                payload["near_duplicate_of"], payload["similarity"] = matches[0]
         logger.info(
-            "dedup_done document_id=%s duplicate=%s",
-            context.get("document_id"),
+            "dedup_done document_id=%s duplicate=%s near_duplicate_of=%s similarity=%s",
+            document_id,
             is_duplicate,
+            payload.get("near_duplicate_of"),
+            payload.get("similarity"),
         )
-        return AgentResult({"is_duplicate": is_duplicate, "document_hash": document_hash})
+        return AgentResult(payload=payload)
+
+    def register(self, document: DocumentHandle, document_id: str) -> None:
+        """Add a fully processed document to the near-duplicate index."""
+        if settings.near_dup_enabled:
+            self._near_duplicates.add(document_id, self._near_duplicates.signature(document.text))
+
+    @cached_property
+    def _near_duplicates(self) -> NearDuplicateIndex:
+        """MinHash/LSH index, built on first use."""
+        return NearDuplicateIndex()
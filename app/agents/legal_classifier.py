@@ -5,24 +5,39 @@ import logging
 
 from app.core.config import settings
 from app.agents.base import AgentResult, AwsStrandsAgent
+from app.services.preclassifier import get_preclassifier
+from app.utils.document import DocumentHandle
 
 logger = logging.getLogger(__name__)
 
 class LegalClassifierAgent(AwsStrandsAgent):
-    def run(self, document_path: str, context: dict) -> AgentResult:
+    capabilities = frozenset({"strands", "prompts"})
+
+    def run_document(self, document: DocumentHandle, context: dict) -> AgentResult:
         """Classify whether the document is a legal contract."""
         logger.info("legal_classifier_start document_id=%s", context.get("document_id"))
-        document_text = self._read_document(document_path)
-        prompt = self._render_prompt(
+        document_text = document.text
+        preclassifier = get_preclassifier()
+        if preclassifier is not None:
+            decision = preclassifier.decide(document_text)
+            if decision.is_legal is not None:
+                logger.info(
+                    "legal_classifier_done document_id=%s is_legal=%s source=preclassifier score=%.3f",
+                    context.get("document_id"),
+                    decision.is_legal,
+                    decision.score,
+                )
+                return AgentResult(payload={"is_legal": decision.is_legal, "source": "preclassifier"})
+        prompt = self._build_prompt(
             "classify_legal.txt",
             context,
             document_text,
             schema_name=settings.mcp_schema_legal_classification or None,
+            model=self._get_strands_agent(context).model,
+            budget=settings.prompt_budget_classifier,
         )
-        agent = self._get_strands_agent(context)
-        result = agent(prompt)
-        raw_text = getattr(result, "message", str(result))
+        raw_text = self._invoke_strands(context, prompt.text)
         payload = self._parse_json(raw_text, {"is_legal": False})
         is_legal = bool(payload.get("is_legal", False))
-        logger.info("legal_classifier_done document_id=%s is_legal=%s", context.get("document_id"), is_legal)
-        return AgentResult({"is_legal": is_legal})
+        logger.info("legal_classifier_done document_id=%s is_legal=%s source=llm", context.get("document_id"), is_legal)
+        return AgentResult(payload={"is_legal": is_legal, "source": "llm"})
@@ -3,36 +3,130 @@ from __future__ import annotations
 
 import logging
 
-from transformers import pipeline
-
 from app.agents.base import AgentResult, AwsStrandsAgent
+from app.core.config import settings
+from app.services.ner_server import get_ner_client
+from app.utils.chunking import TextWindow, token_windows, word_offsets
+from app.utils.document import DocumentHandle
 
 logger = logging.getLogger(__name__)
 
 class NerAgent(AwsStrandsAgent):
     _ner_pipeline = None
+    _tokenizer = None
+
+    def __init__(
+        self,
+        window_tokens: int | None = None,
+        stride_tokens: int | None = None,
+        batch_size: int | None = None,
+    ) -> None:
+        """Create an NER agent that runs the pipeline over overlapping token windows."""
+        super().__init__()
+        self._window_tokens = window_tokens or settings.ner_window_tokens
+        self._stride_tokens = settings.ner_stride_tokens if stride_tokens is None else stride_tokens
+        self._batch_size = batch_size or settings.ner_batch_size
 
     @classmethod
     def _get_pipeline(cls):
         """Load and cache the Transformers NER pipeline."""
         if cls._ner_pipeline is None:
-            cls._ner_pipeline = pipeline("ner", aggregation_strategy="simple")
+            from transformers import pipeline
+
+            cls._ner_pipeline = pipeline("ner", model=settings.ner_model, aggregation_strategy="simple")
         return cls._ner_pipeline
 
-    def run(self, document_path: str, context: dict) -> AgentResult:
-        """Extract entities using a Transformer-based NER pipeline."""
+    @classmethod
+    def _get_tokenizer(cls):
+        """Return the NER tokenizer without loading the model when a node server is used."""
+        if cls._ner_pipeline is not None:
+            return cls._ner_pipeline.tokenizer
+        if not settings.ner_server_socket:
+            return cls._get_pipeline().tokenizer
+        if cls._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            cls._tokenizer = AutoTokenizer.from_pretrained(settings.ner_model)
+        return cls._tokenizer
+
+    def run_document(self, document: DocumentHandle, context: dict) -> AgentResult:
+        """Extract entities using a Transformer-based NER pipeline over sliding windows."""
         logger.info("ner_start document_id=%s", context.get("document_id"))
-        document_text = self._read_document(document_path)
-        extractor = self._get_pipeline()
-        extracted = extractor(document_text)
-        entities = [
+        document_text = document.text
+        windows = self._windows(document_text)
+        extracted = self._extract([document_text[window.start : window.end] for window in windows])
+        entities = _merge_entities(
+            entity
+            for window, items in zip(windows, extracted)
+            for entity in _remap(window, items)
+        )
+        logger.info(
+            "ner_done document_id=%s count=%s windows=%s",
+            context.get("document_id"),
+            len(entities),
+            len(windows),
+        )
+        return AgentResult(payload={"entities": entities})
+
+    def _windows(self, text: str) -> list[TextWindow]:
+        """Split text into token windows using the pipeline's tokenizer offsets."""
+        tokenizer = self._get_tokenizer()
+        if tokenizer is not None and getattr(tokenizer, "is_fast", False):
+            encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+            offsets = [tuple(span) for span in encoded["offset_mapping"]]
+        else:
+            offsets = word_offsets(text)
+        return token_windows(offsets, len(text), self._window_tokens, self._stride_tokens)
+
+    def _extract(self, texts: list[str]) -> list[list[dict]]:
+        """Run window texts through the node NER server, or the local pipeline in batches."""
+        if not texts:
+            return []
+        if settings.ner_server_socket:
+            try:
+                return get_ner_client().infer(texts)
+            except OSError as exc:
+                if not settings.ner_server_fallback:
+                    raise
+                logger.warning("ner_server_unavailable socket=%s error=%s", settings.ner_server_socket, exc)
+        results = self._get_pipeline()(texts, batch_size=self._batch_size)
+        if texts and results and isinstance(results[0], dict):
+            # A single input comes back as a flat list of entities.
+            results = [results]
+        return results
+
+
+def _remap(window: TextWindow, items: list[dict]) -> list[dict]:
+    """Shift window-relative offsets to document offsets, keeping only entities the window owns."""
+    entities = []
+    for item in items:
+        start = window.start + int(item.get("start", 0))
+        end = window.start + int(item.get("end", 0))
+        if not window.own_start <= start < window.own_end:
+            continue
+        entities.append(
             {
                 "entity_type": item.get("entity_group"),
                 "entity_value": item.get("word"),
-                "start_offset": item.get("start"),
-                "end_offset": item.get("end"),
+                "start_offset": start,
+                "end_offset": end,
             }
-            for item in extracted
-        ]
-        logger.info("ner_done document_id=%s count=%s", context.get("document_id"), len(entities))
-        return AgentResult({"entities": entities})
+        )
+    return entities
+
+
+def _merge_entities(entities) -> list[dict]:
+    """Sort by offset and merge overlapping spans of the same type, keeping the longest."""
+    merged: list[dict] = []
+    for entity in sorted(entities, key=lambda item: (item["start_offset"], -item["end_offset"])):
+        previous = merged[-1] if merged else None
+        if (
+            previous is not None
+            and previous["entity_type"] == entity["entity_type"]
+            and entity["start_offset"] < previous["end_offset"]
+        ):
+            if entity["end_offset"] - entity["start_offset"] > previous["end_offset"] - previous["start_offset"]:
+                merged[-1] = entity
+            continue
+        merged.append(entity)
+    return merged
@@ -0,0 +1,47 @@
+"""Per-worker registry of reusable agent instances."""
+from __future__ import annotations
+
+import importlib
+import os
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.agents.base import AwsStrandsAgent
+
+# "module:Class" paths so an agent's heavy dependencies load only when its stage first runs.
+AGENT_CLASSES: dict[str, str] = {
+    "classification": "app.agents.legal_classifier:LegalClassifierAgent",
+    "deduplication": "app.agents.deduplicator:DeduplicationAgent",
+    "contract_type": "app.agents.contract_type:ContractTypeAgent",
+    "clauses": "app.agents.clause_extractor:ClauseExtractionAgent",
+    "ner": "app.agents.ner_agent:NerAgent",
+}
+
+_lock = threading.Lock()
+_pid: int | None = None
+_agents: dict[str, AwsStrandsAgent] = {}
+
+
+def get_agent(stage: str) -> AwsStrandsAgent:
+    """Return this worker process's agent instance for a pipeline stage."""
+    global _pid, _agents
+    with _lock:
+        if _pid != os.getpid():
+            _pid = os.getpid()
+            _agents = {}
+        agent = _agents.get(stage)
+        if agent is None:
+            agent = _agents[stage] = _build_agent(stage)
+        return agent
+
+
+def _build_agent(stage: str) -> AwsStrandsAgent:
+    """Import and construct the agent class for a stage."""
+    module_name, class_name = AGENT_CLASSES[stage].split(":")
+    agent_cls = getattr(importlib.import_module(module_name), class_name)
+    if stage == "deduplication":
+        from app.services.storage import RedisClient
+
+        return agent_cls(redis_client=RedisClient())
+    return agent_cls()
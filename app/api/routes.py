@@ -1,32 +1,212 @@
 """FastAPI routes for document ingestion."""
 from __future__ import annotations
 
+import asyncio
 import logging
-from pathlib import Path
+import tempfile
+import zipfile
+from typing import IO, Any, AsyncIterator
 from uuid import uuid4
 
-from fastapi import APIRouter, HTTPException, UploadFile
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 
-from app.tasks.orchestrator import process_legal_document
+from app.core.config import settings
+from app.services.document_status import DocumentStatus, get_document_statuses
+from app.services.document_store import DocumentTooLargeError, StoredDocument, get_document_store
+from app.services.storage import RedisClient
+from app.tasks.signatures import enqueue_process_document, enqueue_process_documents
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
+_redis = RedisClient()
+
+
+async def _read_chunks(document: UploadFile) -> AsyncIterator[bytes]:
+    """Yield an upload in ``UPLOAD_CHUNK_SIZE`` pieces."""
+    while chunk := await document.read(settings.upload_chunk_size):
+        yield chunk
 
 
 @router.post("/documents")
-async def upload_document(document: UploadFile, extraction_mode: str = "all") -> dict[str, str]:
-    """Receive a document upload and enqueue the extraction task."""
+async def upload_document(document: UploadFile, extraction_mode: str = "all") -> dict[str, str | bool | None]:
+    """Receive a document upload, short-circuit exact duplicates, and enqueue the extraction task."""
     if extraction_mode not in {"all", "ner-only"}:
         raise HTTPException(status_code=400, detail="Invalid extraction_mode. Use 'all' or 'ner-only'.")
     document_id = str(uuid4())
-    upload_path = Path("/tmp") / f"{document_id}-{document.filename}"
-    content = await document.read()
-    upload_path.write_bytes(content)
-    task = process_legal_document.delay(document_id, str(upload_path), extraction_mode)
+    try:
+        stored = await get_document_store().save_stream(_read_chunks(document))
+    except DocumentTooLargeError as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+    document_hash = stored.sha256
+
+    claim = await run_in_threadpool(_redis.claim_document_hash, document_hash, document_id)
+    if claim is not None:
+        logger.info(
+            "document_upload duplicate document_id=%s existing_document_id=%s state=%s",
+            document_id,
+            claim.document_id,
+            claim.state,
+        )
+        return {"task_id": None, "document_id": claim.document_id, "duplicate": True, "state": claim.state}
+
+    try:
+        task = enqueue_process_document(document_id, stored.uri, extraction_mode, document_hash)
+    except Exception:
+        await run_in_threadpool(_redis.release_document_hash, document_hash, document_id)
+        raise
+    await run_in_threadpool(_redis.mark_documents_queued, [document_id])
     logger.info(
         "document_upload enqueued task_id=%s document_id=%s mode=%s",
         task.id,
         document_id,
         extraction_mode,
     )
-    return {"task_id": task.id, "document_id": document_id}
+    return {"task_id": task.id, "document_id": document_id, "duplicate": False, "state": "in_flight"}
+
+
+def _is_zip(document: UploadFile) -> bool:
+    """Treat ``.zip`` uploads and zip content types as archives to unpack."""
+    return (document.filename or "").lower().endswith(".zip") or document.content_type in {
+        "application/zip",
+        "application/x-zip-compressed",
+    }
+
+
+async def _read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> AsyncIterator[bytes]:
+    """Yield one archive member in ``UPLOAD_CHUNK_SIZE`` pieces, decompressing off the event loop."""
+    with archive.open(info) as member:
+        while chunk := await asyncio.to_thread(member.read, settings.upload_chunk_size):
+            yield chunk
+
+
+async def _spool_archive(document: UploadFile) -> IO[bytes]:
+    """Stream an uploaded zip to an anonymous temp file (zip needs random access)."""
+    spool = await asyncio.to_thread(tempfile.TemporaryFile)
+    size = 0
+    try:
+        async for chunk in _read_chunks(document):
+            size += len(chunk)
+            if size > settings.batch_max_bytes:
+                raise DocumentTooLargeError(settings.batch_max_bytes)
+            await asyncio.to_thread(spool.write, chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+async def _store_batch(documents: list[UploadFile]) -> list[tuple[str, StoredDocument]]:
+    """Store every uploaded file and every file inside uploaded zips."""
+    store = get_document_store()
+    stored: list[tuple[str, StoredDocument]] = []
+
+    def check_count() -> None:
+        if len(stored) >= settings.batch_max_documents:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batches are limited to {settings.batch_max_documents} documents.",
+            )
+
+    for document in documents:
+        if not _is_zip(document):
+            check_count()
+            stored.append((document.filename or "", await store.save_stream(_read_chunks(document))))
+            continue
+        spool = await _spool_archive(document)
+        try:
+            try:
+                archive = zipfile.ZipFile(spool)
+            except zipfile.BadZipFile as exc:
+                raise HTTPException(status_code=400, detail=f"Invalid zip archive: {document.filename}") from exc
+            with archive:
+                for info in archive.infolist():
+                    name = info.filename
+                    if info.is_dir() or name.startswith("__MACOSX/") or name.rsplit("/", 1)[-1].startswith("."):
+                        continue
+                    if info.file_size > settings.upload_max_bytes:
+                        raise DocumentTooLargeError(settings.upload_max_bytes)
+                    check_count()
+                    stored.append((name, await store.save_stream(_read_member(archive, info))))
+        finally:
+            spool.close()
+    return stored
+
+
+@router.post("/documents/batch")
+async def upload_batch(documents: list[UploadFile] = File(...), extraction_mode: str = "all") -> dict[str, Any]:
+    """Ingest several files (or zips of files) and enqueue all new documents in one group publish."""
+    if extraction_mode not in {"all", "ner-only"}:
+        raise HTTPException(status_code=400, detail="Invalid extraction_mode. Use 'all' or 'ner-only'.")
+    try:
+        stored = await _store_batch(documents)
+    except DocumentTooLargeError as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+
+    members: list[dict[str, Any]] = []
+    pending: list[tuple[str, str, str, str | None]] = []
+    for filename, item in stored:
+        document_id = str(uuid4())
+        claim = await run_in_threadpool(_redis.claim_document_hash, item.sha256, document_id)
+        if claim is not None:
+            members.append(
+                {"filename": filename, "document_id": claim.document_id, "duplicate": True, "state": claim.state}
+            )
+            continue
+        members.append({"filename": filename, "document_id": document_id, "duplicate": False, "state": "in_flight"})
+        pending.append((document_id, item.uri, extraction_mode, item.sha256))
+
+    try:
+        result = enqueue_process_documents(pending) if pending else None
+    except Exception:
+        for document_id, _, _, document_hash in pending:
+            await run_in_threadpool(_redis.release_document_hash, document_hash, document_id)
+        raise
+    if result is not None:
+        await run_in_threadpool(_redis.mark_documents_queued, [document_id for document_id, *_ in pending])
+        task_ids = iter(child.id for child in result.results)
+        for member in members:
+            member["task_id"] = None if member["duplicate"] else next(task_ids)
+
+    batch_id = str(uuid4())
+    await run_in_threadpool(_redis.save_batch, batch_id, members)
+    logger.info(
+        "document_batch enqueued batch_id=%s documents=%s duplicates=%s",
+        batch_id,
+        len(pending),
+        len(members) - len(pending),
+    )
+    return {"batch_id": batch_id, "documents": members}
+
+
+@router.get("/documents/{document_id}")
+async def get_document_status(document_id: str) -> DocumentStatus:
+    """Report per-stage pipeline status for one document."""
+    statuses = await run_in_threadpool(get_document_statuses, [document_id])
+    status = statuses[document_id]
+    # Nothing recorded by a worker yet: only documents this API enqueued are pending, the rest are unknown.
+    if status.state == "pending" and not await run_in_threadpool(_redis.is_document_queued, document_id):
+        raise HTTPException(status_code=404, detail="Unknown document.")
+    return status
+
+
+@router.get("/batches/{batch_id}")
+async def get_batch_status(batch_id: str) -> dict[str, Any]:
+    """Report pipeline status for every document in a batch."""
+    members = await run_in_threadpool(_redis.load_batch, batch_id)
+    if members is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired batch.")
+    document_ids = list(dict.fromkeys(member["document_id"] for member in members if member.get("document_id")))
+    statuses = await run_in_threadpool(get_document_statuses, document_ids)
+    counts: dict[str, int] = {}
+    for status in statuses.values():
+        counts[status.state] = counts.get(status.state, 0) + 1
+    return {
+        "batch_id": batch_id,
+        "counts": counts,
+        "documents": [
+            {**member, "status": statuses[member["document_id"]] if member.get("document_id") else None}
+            for member in members
+        ],
+    }
@@ -0,0 +1,174 @@
+"""Stage timing spans and Prometheus metrics."""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, start_http_server
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = Histogram(
+    "lexiai_stage_seconds",
+    "Wall time per pipeline stage.",
+    ["stage", "tenant", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+DOCUMENT_BYTES = Histogram(
+    "lexiai_document_bytes",
+    "Size of documents entering a stage.",
+    ["stage"],
+    buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+)
+LLM_CALLS = Counter("lexiai_llm_calls_total", "LLM/Strands calls per stage.", ["stage", "tenant", "model", "cache"])
+LLM_TOKENS = Counter("lexiai_llm_tokens_total", "LLM tokens per stage.", ["stage", "tenant", "model", "kind"])
+LLM_COST = Counter("lexiai_llm_cost_usd_total", "Estimated LLM spend in USD.", ["stage", "tenant", "model"])
+PROMPT_TOKENS_SAVED = Counter(
+    "lexiai_prompt_tokens_saved_total", "Document tokens dropped by prompt budgets.", ["stage", "tenant"]
+)
+
+
+class StageSpan:
+    def __init__(self, stage: str, tenant: str, document_bytes: int | None = None) -> None:
+        """Accumulates one stage's wall time, LLM usage, cost and cache hits."""
+        self.stage = stage
+        self.tenant = tenant
+        self.document_bytes = document_bytes
+        self.started = time.perf_counter()
+        self.status = "ok"
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.prompt_tokens_saved = 0
+        self.models: set[str] = set()
+
+    def record_llm(self, metadata: dict[str, Any] | None) -> None:
+        """Add one model call's usage (from ``LLMResult.metadata``) to the span and counters."""
+        metadata = metadata or {}
+        model = str(metadata.get("model") or "unknown")
+        cache = "hit" if metadata.get("cache") == "hit" else "miss"
+        self.llm_calls += 1
+        self.models.add(model)
+        LLM_CALLS.labels(self.stage, self.tenant, model, cache).inc()
+        if cache == "hit":
+            # Usage on a hit describes the original call, not new spend.
+            self.cache_hits += 1
+            return
+        prompt_tokens = int(metadata.get("prompt_tokens") or 0)
+        completion_tokens = int(metadata.get("completion_tokens") or 0)
+        cost = float(metadata.get("cost_usd") or 0.0)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost_usd += cost
+        LLM_TOKENS.labels(self.stage, self.tenant, model, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(self.stage, self.tenant, model, "completion").inc(completion_tokens)
+        LLM_COST.labels(self.stage, self.tenant, model).inc(cost)
+
+    def record_prompt(self, tokens_saved: int) -> None:
+        """Add document tokens a prompt budget kept out of a prompt."""
+        self.prompt_tokens_saved += tokens_saved
+        if tokens_saved:
+            PROMPT_TOKENS_SAVED.labels(self.stage, self.tenant).inc(tokens_saved)
+
+    @property
+    def seconds(self) -> float:
+        """Wall time since the span started."""
+        return time.perf_counter() - self.started
+
+    def metadata(self) -> dict[str, Any]:
+        """Span summary for ``task_logs.metadata``."""
+        return {
+            "seconds": round(self.seconds, 4),
+            "tenant": self.tenant,
+            "document_bytes": self.document_bytes,
+            "llm_calls": self.llm_calls,
+            "cache_hits": self.cache_hits,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+            "models": sorted(self.models),
+        }
+
+
+_current_span: ContextVar[StageSpan | None] = ContextVar("lexiai_stage_span", default=None)
+
+
+@contextmanager
+def stage_span(stage: str, tenant: str | None = None, document_bytes: int | None = None) -> Iterator[StageSpan]:
+    """Time a pipeline stage; LLM calls made inside it are attributed to it."""
+    span = StageSpan(stage, tenant or "default", document_bytes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException:
+        span.status = "error"
+        raise
+    finally:
+        _current_span.reset(token)
+        STAGE_SECONDS.labels(stage, span.tenant, span.status).observe(span.seconds)
+        if document_bytes is not None:
+            DOCUMENT_BYTES.labels(stage).observe(document_bytes)
+
+
+def current_span() -> StageSpan | None:
+    """The span of the stage running in this context, if any."""
+    return _current_span.get()
+
+
+def record_llm_call(metadata: dict[str, Any] | None) -> None:
+    """Attribute an LLM/Strands call to the current stage span (no-op outside a stage)."""
+    span = _current_span.get()
+    if span is not None:
+        span.record_llm(metadata)
+
+
+def record_prompt(tokens_saved: int) -> None:
+    """Attribute prompt-budget savings to the current stage span (no-op outside a stage)."""
+    span = _current_span.get()
+    if span is not None:
+        span.record_prompt(tokens_saved)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD cost from ``LLM_PRICING`` (per-million-token prices keyed by model); 0 when unpriced."""
+    prices = json.loads(settings.llm_pricing or "{}").get(model)
+    if not prices:
+        return 0.0
+    return (prompt_tokens * prices.get("prompt", 0.0) + completion_tokens * prices.get("completion", 0.0)) / 1e6
+
+
+def start_worker_metrics_server(port: int) -> None:
+    """Serve worker metrics; with PROMETHEUS_MULTIPROC_DIR set, aggregate all prefork children."""
+    multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        from prometheus_client import multiprocess
+
+        path = Path(multiproc_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        for stale in path.glob("*.db"):
+            stale.unlink()
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
+    logger.info("worker_metrics_started port=%s multiprocess=%s", port, bool(multiproc_dir))
+
+
+def mark_worker_process_dead(pid: int) -> None:
+    """Drop an exited prefork child's live metrics files (multiprocess mode only)."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 from fastapi import FastAPI
+from prometheus_client import make_asgi_app
 
 from app.api.routes import router
 from app.core.logging import configure_logging
@@ -11,6 +12,7 @@ def create_app() -> FastAPI:
     configure_logging()
     app = FastAPI(title="LexiAI Legal Intelligence")
     app.include_router(router)
+    app.mount("/metrics", make_asgi_app())
     return app
 
 
@@ -1,12 +1,22 @@
 """Shared MCP client utilities."""
 from __future__ import annotations
 
-from strands.tools.mcp import MCPClient
-from mcp import stdio_client, StdioServerParameters
+import atexit
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Callable, TypeVar
+
 from pydantic import BaseModel
 
 from app.core.config import settings
 
+if TYPE_CHECKING:
+    from strands.tools.mcp import MCPClient
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
+
 
 class MCPConfig(BaseModel):
     command: str
@@ -51,8 +61,144 @@ def get_routing_mcp_config() -> MCPConfig | None:
 
 def create_mcp_client(config: MCPConfig) -> MCPClient:
     """Create a Strands MCP client from stdio server configuration."""
+    from mcp import StdioServerParameters, stdio_client
+    from strands.tools.mcp import MCPClient
+
     return MCPClient(
         lambda: stdio_client(
             StdioServerParameters(command=config.command, args=config.args)
         )
     )
+
+
+def read_version(config: MCPConfig, uri_template: str, name: str) -> str | None:
+    """Read a version/ETag resource for ``name`` when a version URI template is configured."""
+    if not uri_template:
+        return None
+    raw = get_session_manager().call(config, lambda client: client.read_resource_sync(uri_template.format(name=name)))
+    version = raw if isinstance(raw, str) else raw.decode("utf-8")
+    return version.strip() or None
+
+
+def _is_alive(client: MCPClient) -> bool:
+    """Best-effort check that a started client's stdio session is still running."""
+    is_active = getattr(client, "_is_session_active", None)
+    if callable(is_active):
+        return bool(is_active())
+    thread = getattr(client, "_background_thread", None)
+    return thread is None or thread.is_alive()
+
+
+# Raised once the server process is gone; the client's session thread outlives it, so ``_is_alive`` still holds.
+_DISCONNECT_ERRORS = {
+    "ClosedResourceError",
+    "BrokenResourceError",
+    "EndOfStream",
+    "BrokenPipeError",
+    "ConnectionResetError",
+}
+
+
+def _is_disconnect(exc: BaseException) -> bool:
+    """Whether ``exc``, or an error it wraps, means the stdio pipe to the server is closed."""
+    seen: set[int] = set()
+    current: BaseException | None = exc
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        name = type(current).__name__
+        if name in _DISCONNECT_ERRORS or (name == "McpError" and "connection closed" in str(current).lower()):
+            return True
+        current = current.__cause__ or current.__context__
+    return False
+
+
+class _Session:
+    def __init__(self, config: MCPConfig, factory: Callable[[MCPConfig], MCPClient]) -> None:
+        """Hold one long-lived client for a config; ``lock`` serializes its callers."""
+        self.config = config
+        self.lock = threading.Lock()
+        self._factory = factory
+        self._client: MCPClient | None = None
+
+    def client(self) -> MCPClient:
+        """Return the running client, (re)starting the server process when needed."""
+        if self._client is not None and not _is_alive(self._client):
+            logger.warning("mcp_session_dead command=%s", self.config.command)
+            self.close()
+        if self._client is None:
+            client = self._factory(self.config)
+            client.start()
+            self._client = client
+            logger.info("mcp_session_started command=%s pid=%s", self.config.command, os.getpid())
+        return self._client
+
+    def close(self) -> None:
+        """Stop the client and its server process, ignoring shutdown errors."""
+        client, self._client = self._client, None
+        if client is None:
+            return
+        try:
+            client.stop(None, None, None)
+        except Exception as exc:
+            logger.warning("mcp_session_stop_failed command=%s error=%s", self.config.command, exc)
+
+
+class MCPSessionManager:
+    def __init__(self, client_factory: Callable[[MCPConfig], MCPClient] = create_mcp_client) -> None:
+        """Keep one long-lived MCP session per distinct config for this process."""
+        self._factory = client_factory
+        self._lock = threading.Lock()
+        self._sessions: dict[tuple[str, tuple[str, ...]], _Session] = {}
+        self._pid = os.getpid()
+
+    def call(self, config: MCPConfig, operation: Callable[[MCPClient], T]) -> T:
+        """Run ``operation`` on the shared session, reconnecting once if the server died."""
+        session = self._session(config)
+        with session.lock:
+            client = session.client()
+            try:
+                return operation(client)
+            except Exception as exc:
+                if _is_alive(client) and not _is_disconnect(exc):
+                    raise
+                logger.warning("mcp_session_reconnect command=%s", config.command)
+                session.close()
+                return operation(session.client())
+
+    def shutdown(self) -> None:
+        """Stop every session owned by this process."""
+        with self._lock:
+            sessions = list(self._sessions.values()) if self._pid == os.getpid() else []
+            self._sessions = {}
+            self._pid = os.getpid()
+        for session in sessions:
+            with session.lock:
+                session.close()
+
+    def _session(self, config: MCPConfig) -> _Session:
+        """Return the session for ``config``, discarding sessions inherited across fork."""
+        key = (config.command, tuple(config.args))
+        with self._lock:
+            if self._pid != os.getpid():
+                self._sessions = {}
+                self._pid = os.getpid()
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = _Session(config, self._factory)
+            return session
+
+
+_session_manager = MCPSessionManager()
+
+
+def get_session_manager() -> MCPSessionManager:
+    """Return the process-wide MCP session manager."""
+    return _session_manager
+
+
+def shutdown_mcp_sessions() -> None:
+    """Stop all MCP sessions held by this process."""
+    _session_manager.shutdown()
+
+
+atexit.register(shutdown_mcp_sessions)
@@ -3,12 +3,14 @@ from __future__ import annotations
 
 from pydantic import BaseModel
 
-from app.mcp.client import create_mcp_client, get_prompt_mcp_config
+from app.core.config import settings
+from app.mcp.client import get_prompt_mcp_config, get_session_manager, read_version
 
 
 class PromptRecord(BaseModel):
     name: str
     template: str
+    version: str | None = None
 
 
 class PromptRegistryClient:
@@ -17,10 +19,17 @@ class PromptRegistryClient:
         config = get_prompt_mcp_config()
         if not config:
             raise RuntimeError("MCP prompt client not configured.")
-        with create_mcp_client(config) as client:
-            prompt = client.get_prompt_sync(name, {})
-            if hasattr(prompt, "messages") and prompt.messages:
-                content = prompt.messages[0].content
-            else:
-                content = str(prompt)
-            return PromptRecord(name=name, template=content)
+        version = read_version(config, settings.mcp_prompt_version_uri, name)
+        prompt = get_session_manager().call(config, lambda client: client.get_prompt_sync(name, {}))
+        if hasattr(prompt, "messages") and prompt.messages:
+            content = prompt.messages[0].content
+        else:
+            content = str(prompt)
+        return PromptRecord(name=name, template=content, version=version)
+
+    def fetch_prompt_version(self, name: str) -> str | None:
+        """Fetch only the current version/ETag of a prompt, if the registry exposes one."""
+        config = get_prompt_mcp_config()
+        if not config:
+            return None
+        return read_version(config, settings.mcp_prompt_version_uri, name)
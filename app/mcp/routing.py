@@ -6,12 +6,13 @@ import json
 from pydantic import BaseModel
 
 from app.core.config import settings
-from app.mcp.client import create_mcp_client, get_routing_mcp_config
+from app.mcp.client import get_routing_mcp_config, get_session_manager
 
 
 class RouteDecision(BaseModel):
     provider: str
     model: str
+    cache_enabled: bool = True
 
 
 class RoutingClient:
@@ -20,7 +21,10 @@ class RoutingClient:
         config = get_routing_mcp_config()
         if not config:
             return RouteDecision(provider=settings.llm_provider, model=settings.llm_model)
-        with create_mcp_client(config) as client:
-            raw = client.read_resource_sync(tenant_id)
-            payload = json.loads(raw) if isinstance(raw, str) else json.loads(raw.decode("utf-8"))
-            return RouteDecision(provider=payload.get("provider"), model=payload.get("model"))
+        raw = get_session_manager().call(config, lambda client: client.read_resource_sync(tenant_id))
+        payload = json.loads(raw) if isinstance(raw, str) else json.loads(raw.decode("utf-8"))
+        return RouteDecision(
+            provider=payload.get("provider"),
+            model=payload.get("model"),
+            cache_enabled=payload.get("cache", True),
+        )
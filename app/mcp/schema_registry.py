@@ -5,12 +5,14 @@ import json
 
 from pydantic import BaseModel
 
-from app.mcp.client import create_mcp_client, get_schema_mcp_config
+from app.core.config import settings
+from app.mcp.client import get_schema_mcp_config, get_session_manager, read_version
 
 
 class SchemaRecord(BaseModel):
     name: str
     payload: dict
+    version: str | None = None
 
 
 class SchemaRegistryClient:
@@ -19,7 +21,14 @@ class SchemaRegistryClient:
         config = get_schema_mcp_config()
         if not config:
             raise RuntimeError("MCP schema client not configured.")
-        with create_mcp_client(config) as client:
-            raw = client.read_resource_sync(name)
-            payload = json.loads(raw) if isinstance(raw, str) else json.loads(raw.decode("utf-8"))
-            return SchemaRecord(name=name, payload=payload)
+        version = read_version(config, settings.mcp_schema_version_uri, name)
+        raw = get_session_manager().call(config, lambda client: client.read_resource_sync(name))
+        payload = json.loads(raw) if isinstance(raw, str) else json.loads(raw.decode("utf-8"))
+        return SchemaRecord(name=name, payload=payload, version=version)
+
+    def fetch_schema_version(self, name: str) -> str | None:
+        """Fetch only the current version/ETag of a schema, if the registry exposes one."""
+        config = get_schema_mcp_config()
+        if not config:
+            return None
+        return read_version(config, settings.mcp_schema_version_uri, name)
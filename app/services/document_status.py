@@ -0,0 +1,93 @@
+"""Per-document pipeline status assembled from pipeline_state and task_logs."""
+from __future__ import annotations
+
+from datetime import datetime
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.services.storage import PipelineProgress, PostgresClient, TaskLog
+from app.tasks.pipeline import PIPELINE_DAG, STAGE_LOG_AGENTS, completed_steps
+from app.utils.cache import TTLCache
+
+# Terminal orchestrator statuses that end a run early.
+_STOP_STATUSES = {"non_legal", "duplicate", "near_duplicate", "unsupported_format", "extraction_failed", "stopped"}
+
+
+class StageStatus(BaseModel):
+    status: str
+    error: str | None = None
+    updated_at: datetime | None = None
+
+
+class DocumentStatus(BaseModel):
+    document_id: str
+    # pending | running | retrying | completed | stopped | failed
+    state: str
+    reason: str | None = None
+    error: str | None = None
+    stages: dict[str, StageStatus]
+    updated_at: datetime | None = None
+
+
+def summarize(document_id: str, progress: PipelineProgress | None, logs: list[TaskLog]) -> DocumentStatus:
+    """Combine completed stages with the latest log per stage into one status."""
+    latest = {log.agent: log for log in logs}
+    done = completed_steps(progress) if progress else set()
+    stages = {}
+    for stage in PIPELINE_DAG:
+        log = latest.get(STAGE_LOG_AGENTS[stage])
+        if stage in done:
+            stages[stage] = StageStatus(status="completed", updated_at=log.created_at if log else None)
+        elif log is not None:
+            stages[stage] = StageStatus(status=log.status, error=log.error, updated_at=log.created_at)
+        else:
+            stages[stage] = StageStatus(status="pending")
+
+    orchestrator = latest.get("orchestrator")
+    reason = error = None
+    if orchestrator is not None and orchestrator.status == "completed":
+        state = "completed"
+    elif orchestrator is not None and orchestrator.status in _STOP_STATUSES:
+        state, reason = "stopped", orchestrator.status
+    elif orchestrator is not None and orchestrator.status in {"failed", "retrying"}:
+        state, error = orchestrator.status, orchestrator.error
+    elif done or logs:
+        state = "running"
+    else:
+        # Nothing recorded yet: queued, or an unknown id.
+        state = "pending"
+    timestamps = [log.created_at for log in logs if log.created_at] + ([progress.updated_at] if progress else [])
+    timestamps = [value for value in timestamps if value is not None]
+    return DocumentStatus(
+        document_id=document_id,
+        state=state,
+        reason=reason,
+        error=error,
+        stages=stages,
+        updated_at=max(timestamps) if timestamps else None,
+    )
+
+
+_postgres = PostgresClient()
+_statuses = TTLCache("document_status", settings.status_cache_ttl, max_entries=4096)
+
+
+def get_document_statuses(document_ids: list[str]) -> dict[str, DocumentStatus]:
+    """Statuses for several documents (two queries), cached for ``STATUS_CACHE_TTL`` seconds.
+
+    Blocking; call from a thread when serving async requests.
+    """
+
+    def load() -> tuple[dict[str, DocumentStatus], None]:
+        progress = _postgres.load_progress_many(document_ids)
+        logs = _postgres.load_latest_task_logs(document_ids)
+        return (
+            {
+                document_id: summarize(document_id, progress.get(document_id), logs.get(document_id, []))
+                for document_id in document_ids
+            },
+            None,
+        )
+
+    return _statuses.get_or_load(tuple(document_ids), load)
@@ -0,0 +1,154 @@
+"""Content-addressed storage for uploaded documents."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import AsyncIterator
+from urllib.parse import unquote, urlparse
+from uuid import uuid4
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentTooLargeError(ValueError):
+    def __init__(self, max_bytes: int) -> None:
+        """Raised when an upload exceeds the configured size limit."""
+        super().__init__(f"Document exceeds the {max_bytes} byte upload limit.")
+        self.max_bytes = max_bytes
+
+
+class StoredDocument(BaseModel):
+    sha256: str
+    size: int
+    uri: str
+    # False when identical bytes were already stored and the upload was discarded.
+    created: bool
+
+
+class DocumentStore:
+    async def save_stream(self, chunks: AsyncIterator[bytes], max_bytes: int | None = None) -> StoredDocument:
+        """Stream bytes into the store, addressed by their SHA-256."""
+        raise NotImplementedError
+
+    def local_path(self, uri: str) -> Path:
+        """Return a local filesystem path for a stored document URI."""
+        raise NotImplementedError
+
+    def load_artifact(self, sha256: str, name: str) -> bytes | None:
+        """Return a derived artifact (e.g. extracted text) stored for a document digest, if any."""
+        raise NotImplementedError
+
+    def save_artifact(self, sha256: str, name: str, data: bytes) -> None:
+        """Store a derived artifact for a document digest, replacing any previous copy."""
+        raise NotImplementedError
+
+
+class LocalDocumentStore(DocumentStore):
+    def __init__(self, root: str | Path) -> None:
+        """Store documents under ``root/ab/cd/<sha256>``; ``root`` must be shared by API and workers."""
+        self.root = Path(root)
+        self._incoming = self.root / "incoming"
+        self._incoming.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, sha256: str) -> Path:
+        """Final location of a document with the given digest."""
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    async def save_stream(self, chunks: AsyncIterator[bytes], max_bytes: int | None = None) -> StoredDocument:
+        """Write to a temp file while hashing, then rename into place (or drop it if already stored)."""
+        limit = max_bytes or settings.upload_max_bytes
+        temp_path = self._incoming / f"{uuid4().hex}.part"
+        digest = hashlib.sha256()
+        size = 0
+        handle = await asyncio.to_thread(temp_path.open, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > limit:
+                    raise DocumentTooLargeError(limit)
+                digest.update(chunk)
+                await asyncio.to_thread(handle.write, chunk)
+            await asyncio.to_thread(_flush_and_sync, handle)
+        except BaseException:
+            handle.close()
+            temp_path.unlink(missing_ok=True)
+            raise
+        handle.close()
+        sha256 = digest.hexdigest()
+        final_path = self.path_for(sha256)
+        created = await asyncio.to_thread(self._commit, temp_path, final_path)
+        logger.info("document_stored sha256=%s size=%s created=%s", sha256, size, created)
+        return StoredDocument(sha256=sha256, size=size, uri=final_path.as_uri(), created=created)
+
+    def local_path(self, uri: str) -> Path:
+        """Resolve ``file://`` URIs; bare paths (pre-store task payloads) are returned unchanged."""
+        parsed = urlparse(uri)
+        if parsed.scheme == "file":
+            return Path(unquote(parsed.path))
+        if parsed.scheme:
+            raise ValueError(f"LocalDocumentStore cannot open '{parsed.scheme}' URIs.")
+        return Path(uri)
+
+    def artifact_path(self, sha256: str, name: str) -> Path:
+        """Location of a derived artifact: ``root/artifacts/ab/cd/<sha256>.<name>``."""
+        return self.root / "artifacts" / sha256[:2] / sha256[2:4] / f"{sha256}.{name}"
+
+    def load_artifact(self, sha256: str, name: str) -> bytes | None:
+        """Read an artifact, or None when it was never stored."""
+        try:
+            return self.artifact_path(sha256, name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def save_artifact(self, sha256: str, name: str, data: bytes) -> None:
+        """Write to a temp file and rename into place, so readers never see a partial artifact."""
+        temp_path = self._incoming / f"{uuid4().hex}.part"
+        with temp_path.open("wb") as handle:
+            handle.write(data)
+            _flush_and_sync(handle)
+        final_path = self.artifact_path(sha256, name)
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, final_path)
+
+    def _commit(self, temp_path: Path, final_path: Path) -> bool:
+        """Atomically move a finished upload into place; keep the existing copy if present."""
+        if final_path.exists():
+            temp_path.unlink(missing_ok=True)
+            return False
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, final_path)
+        return True
+
+
+def _flush_and_sync(handle) -> None:
+    handle.flush()
+    os.fsync(handle.fileno())
+
+
+def build_document_store(url: str) -> DocumentStore:
+    """Create a store from a URL; only ``file://`` is supported today."""
+    parsed = urlparse(url)
+    if parsed.scheme in {"", "file"}:
+        return LocalDocumentStore(unquote(parsed.path) if parsed.scheme else url)
+    raise ValueError(f"Unsupported document store URL scheme: {parsed.scheme}")
+
+
+_store_lock = threading.Lock()
+_store: DocumentStore | None = None
+
+
+def get_document_store() -> DocumentStore:
+    """Return the process-wide document store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = build_document_store(settings.document_store_url)
+        return _store
@@ -1,10 +1,351 @@
-"""ElasticSearch indexing stub."""
+"""ElasticSearch client with buffered bulk indexing."""
 from __future__ import annotations
 
+import atexit
+import json
+import logging
+import os
+import threading
+import time
 from typing import Any
 
+import httpx
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (owner, index); owner is usually the document_id being processed.
+BufferKey = tuple[str | None, str]
+
+# Identifier fields mapped as keyword so term queries match them exactly; the rest stays dynamic.
+_KEYWORD_FIELDS = ("document_id", "source_document_id", "clause_id", "tenant_id")
+INDEX_TEMPLATES: dict[str, dict[str, Any]] = {
+    index: {
+        "index_patterns": [index],
+        "template": {"mappings": {"properties": {field: {"type": "keyword"} for field in _KEYWORD_FIELDS}}},
+    }
+    for index in ("legal_clauses_index", "legal_ner_index")
+}
+
+
+class BulkItemError(BaseModel):
+    index: str
+    doc_id: str | None = None
+    status: int
+    error: Any = None
+
+
+class BulkReport(BaseModel):
+    indexed: int = 0
+    failures: list[BulkItemError] = []
+
+    def merge(self, other: "BulkReport") -> "BulkReport":
+        """Combine two reports into a new one."""
+        return BulkReport(indexed=self.indexed + other.indexed, failures=self.failures + other.failures)
+
+
+class ElasticBulkError(RuntimeError):
+    def __init__(self, report: BulkReport) -> None:
+        """Raised when one or more bulk items were rejected."""
+        super().__init__(f"{len(report.failures)} bulk item(s) failed; first={report.failures[0].model_dump()}")
+        self.report = report
+
+
+def build_doc_id(document_id: str, step: str, ordinal: int | str) -> str:
+    """Derive a stable document _id so retried stages overwrite instead of duplicating."""
+    return f"{document_id}:{step}:{ordinal}"
+
+
+def _document_query(document_id: str) -> dict[str, Any]:
+    """Exact match on document_id, on both templated and older dynamically mapped indexes."""
+    # Indexes created before the templates map document_id as text with a keyword sub-field.
+    return {
+        "bool": {
+            "should": [{"term": {"document_id": document_id}}, {"term": {"document_id.keyword": document_id}}],
+            "minimum_should_match": 1,
+        }
+    }
+
 
 class ElasticClient:
-    def index(self, index: str, document: dict[str, Any]) -> None:
-        # Placeholder for ElasticSearch indexing.
-        return None
+    def __init__(
+        self,
+        url: str | None = None,
+        *,
+        transport: httpx.BaseTransport | None = None,
+        max_docs: int | None = None,
+        max_bytes: int | None = None,
+        flush_interval: float | None = None,
+    ) -> None:
+        """Create a pooled HTTP client; ``transport`` allows an in-process bulk stand-in."""
+        self._client = httpx.Client(
+            base_url=url or settings.elastic_url,
+            transport=transport,
+            timeout=settings.elastic_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.elastic_max_connections,
+                max_keepalive_connections=settings.elastic_max_connections,
+            ),
+        )
+        self._max_docs = max_docs or settings.elastic_bulk_max_docs
+        self._max_bytes = max_bytes or settings.elastic_bulk_max_bytes
+        self._flush_interval = flush_interval if flush_interval is not None else settings.elastic_bulk_flush_interval
+        self._lock = threading.Lock()
+        # Keyed by owner as well as index so one document's flush never sends or reports another's.
+        self._buffers: dict[BufferKey, list[bytes]] = {}
+        self._buffer_bytes: dict[BufferKey, int] = {}
+        self._buffered_at: dict[BufferKey, float] = {}
+        # Item failures from background flushes, reported on the owner's next flush.
+        self._failures: dict[str | None, list[BulkItemError]] = {}
+        self._stop = threading.Event()
+        self._flusher: threading.Thread | None = None
+        self._templates_lock = threading.Lock()
+        self._templates_ready = False
+
+    def index(
+        self, index: str, document: dict[str, Any], doc_id: str | None = None, owner: str | None = None
+    ) -> None:
+        """Buffer a document for ``owner`` (e.g. its document_id), flushing that owner's full buffers."""
+        action: dict[str, Any] = {"_index": index}
+        if doc_id is not None:
+            action["_id"] = doc_id
+        entry = (
+            json.dumps({"index": action}, ensure_ascii=True).encode("utf-8")
+            + b"\n"
+            + json.dumps(document, ensure_ascii=True, default=str).encode("utf-8")
+            + b"\n"
+        )
+        key = (owner, index)
+        now = time.monotonic()
+        with self._lock:
+            self._start_flusher()
+            self._buffers.setdefault(key, []).append(entry)
+            self._buffer_bytes[key] = self._buffer_bytes.get(key, 0) + len(entry)
+            self._buffered_at.setdefault(key, now)
+            ready = [
+                name
+                for name in self._buffers
+                if name[0] == owner
+                and (
+                    len(self._buffers[name]) >= self._max_docs
+                    or self._buffer_bytes[name] >= self._max_bytes
+                    or now - self._buffered_at[name] >= self._flush_interval
+                )
+            ]
+            payloads = [(name, self._take(name)) for name in ready]
+        self._send_all(owner, payloads, [])
+
+    def flush(self, index: str | None = None, owner: str | None = None) -> BulkReport:
+        """Send ``owner``'s buffered documents (optionally one index's) and return their combined report.
+
+        Item failures from background flushes of those buffers are included.
+        """
+        with self._lock:
+            keys = [key for key in self._buffers if key[0] == owner and (index is None or key[1] == index)]
+            payloads = [(key, self._take(key)) for key in keys]
+            earlier = self._failures.pop(owner, [])
+            if index is not None:
+                kept = [failure for failure in earlier if failure.index != index]
+                earlier = [failure for failure in earlier if failure.index == index]
+                if kept:
+                    self._failures[owner] = kept
+        return self._send_all(owner, payloads, earlier)
+
+    def fetch_documents(self, index: str, document_id: str, size: int = 10000) -> list[dict[str, Any]]:
+        """Return the stored sources for one document_id (after flushing pending writes)."""
+        with self._lock:
+            owners = {key[0] for key in self._buffers if key[1] == index}
+        for owner in owners:
+            self.flush(index, owner)
+        query = _document_query(document_id)
+        response = self._client.post(f"/{index}/_search", json={"size": size, "query": query, "sort": ["_doc"]})
+        if response.status_code == 404:
+            return []
+        response.raise_for_status()
+        return [hit["_source"] for hit in response.json().get("hits", {}).get("hits", [])]
+
+    def delete_documents(self, index: str, document_id: str) -> int:
+        """Delete every stored document for one document_id and return how many were removed.
+
+        Buffered writes are left alone; call this before indexing the replacements.
+        """
+        response = self._client.post(
+            f"/{index}/_delete_by_query",
+            params={"conflicts": "proceed", "refresh": "true"},
+            json={"query": _document_query(document_id)},
+        )
+        if response.status_code == 404:
+            return 0
+        response.raise_for_status()
+        return int(response.json().get("deleted", 0))
+
+    def ensure_templates(self) -> bool:
+        """Install ``INDEX_TEMPLATES`` once per client; a failure is logged and retried on the next bulk."""
+        if self._templates_ready:
+            return True
+        with self._templates_lock:
+            if not self._templates_ready:
+                try:
+                    for name, template in INDEX_TEMPLATES.items():
+                        self._client.put(f"/_index_template/{name}", json=template).raise_for_status()
+                except httpx.HTTPError as exc:
+                    logger.warning("elastic_index_template_failed error=%s", exc)
+                    return False
+                self._templates_ready = True
+        return True
+
+    def close(self) -> None:
+        """Stop the background flusher, flush every owner's pending writes and release pooled connections."""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        error: Exception | None = None
+        try:
+            with self._lock:
+                owners = {key[0] for key in self._buffers} | set(self._failures)
+            for owner in owners:
+                try:
+                    self.flush(owner=owner)
+                except Exception as exc:
+                    error = error or exc
+        finally:
+            self._client.close()
+        if error is not None:
+            raise error
+
+    def _take(self, key: BufferKey) -> bytes:
+        """Remove and join a buffer; caller must hold the lock."""
+        payload = b"".join(self._buffers.pop(key, []))
+        self._buffer_bytes.pop(key, None)
+        self._buffered_at.pop(key, None)
+        return payload
+
+    def _requeue(self, payloads: list[tuple[BufferKey, bytes]]) -> None:
+        """Put unsent payloads back at the front of their buffers."""
+        now = time.monotonic()
+        with self._lock:
+            for key, payload in payloads:
+                if payload:
+                    self._buffers.setdefault(key, []).insert(0, payload)
+                    self._buffer_bytes[key] = self._buffer_bytes.get(key, 0) + len(payload)
+                    self._buffered_at[key] = now
+
+    def _send_all(
+        self, owner: str | None, payloads: list[tuple[BufferKey, bytes]], earlier: list[BulkItemError]
+    ) -> BulkReport:
+        """Send payloads through ``_bulk`` and raise if any item was rejected.
+
+        On a transport error the unsent payloads are re-queued before the error propagates.
+        """
+        report = BulkReport(failures=list(earlier))
+        for position, (_, payload) in enumerate(payloads):
+            if not payload:
+                continue
+            try:
+                report = report.merge(self._bulk(payload))
+            except Exception:
+                self._requeue(payloads[position:])
+                if earlier:
+                    with self._lock:
+                        self._failures.setdefault(owner, []).extend(earlier)
+                raise
+        if report.failures:
+            raise ElasticBulkError(report)
+        return report
+
+    def _start_flusher(self) -> None:
+        """Start the interval flusher on first use, in the process that uses it; caller must hold the lock."""
+        if self._flusher is None and self._flush_interval > 0:
+            self._flusher = threading.Thread(target=self._run_flusher, name="elastic-flusher", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        """Flush buffers older than the flush interval, even when no further documents arrive."""
+        while not self._stop.wait(self._flush_interval / 2):
+            try:
+                self._flush_expired()
+            except Exception as exc:
+                logger.warning("elastic_background_flush_failed error=%s", exc)
+
+    def _flush_expired(self) -> None:
+        """Send expired buffers; item failures are kept for their owner, unsent payloads re-queued."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, at in self._buffered_at.items() if now - at >= self._flush_interval]
+            payloads = [(key, self._take(key)) for key in expired]
+        for position, (key, payload) in enumerate(payloads):
+            try:
+                report = self._bulk(payload)
+            except Exception:
+                self._requeue(payloads[position:])
+                raise
+            if report.failures:
+                with self._lock:
+                    self._failures.setdefault(key[0], []).extend(report.failures)
+
+    def _bulk(self, payload: bytes) -> BulkReport:
+        """POST an NDJSON payload to the bulk endpoint and collect per-item results."""
+        # Templates must exist before a bulk write auto-creates an index.
+        self.ensure_templates()
+        response = self._client.post(
+            "/_bulk",
+            content=payload,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        response.raise_for_status()
+        body = response.json()
+        report = BulkReport()
+        for item in body.get("items", []):
+            result = next(iter(item.values()), {})
+            status = int(result.get("status", 500))
+            if status < 300:
+                report.indexed += 1
+                continue
+            failure = BulkItemError(
+                index=result.get("_index", ""),
+                doc_id=result.get("_id"),
+                status=status,
+                error=result.get("error"),
+            )
+            logger.warning(
+                "elastic_bulk_item_failed index=%s doc_id=%s status=%s error=%s",
+                failure.index,
+                failure.doc_id,
+                failure.status,
+                failure.error,
+            )
+            report.failures.append(failure)
+        logger.info("elastic_bulk_flushed indexed=%s failed=%s", report.indexed, len(report.failures))
+        return report
+
+
+_client_lock = threading.Lock()
+_client_pid: int | None = None
+_client: ElasticClient | None = None
+
+
+def get_elastic_client() -> ElasticClient:
+    """Return this worker process's shared ElasticClient."""
+    global _client_pid, _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client_pid = os.getpid()
+            _client = ElasticClient()
+        return _client
+
+
+def close_elastic_client() -> None:
+    """Flush and close this process's shared ElasticClient, if any."""
+    global _client_pid, _client
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            try:
+                _client.close()
+            except Exception as exc:
+                logger.warning("elastic_client_close_failed error=%s", exc)
+        _client_pid, _client = None, None
+
+
+atexit.register(close_elastic_client)
@@ -0,0 +1,172 @@
+"""Content-addressed cache for LLM and Strands responses."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import redis
+
+from app.core.config import settings
+from app.services.llm_client import LLMClient, LLMResult
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(provider: str, model: str, temperature: float | None, prompt: str) -> str:
+    """Hash the inputs that fully determine a model response."""
+    material = json.dumps([provider, model, temperature, prompt], ensure_ascii=True)
+    return "llm:" + hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(
+        self,
+        redis_client: redis.Redis | None = None,
+        ttl: int | None = None,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+    ) -> None:
+        """Local LRU (bounded by entries and bytes) in front of Redis entries with a TTL."""
+        if redis_client is None:
+            redis_client = redis.Redis.from_url(settings.llm_cache_redis_url or settings.broker_url)
+        self._redis = redis_client
+        self._ttl = ttl or settings.llm_cache_ttl
+        self._max_entries = max_entries or settings.llm_cache_local_max_entries
+        self._max_bytes = max_bytes or settings.llm_cache_local_max_bytes
+        self._lock = threading.Lock()
+        self._local: OrderedDict[str, str] = OrderedDict()
+        self._local_bytes = 0
+        self._counters = {"local_hits": 0, "remote_hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+
+    def get(self, key: str) -> str | None:
+        """Return a cached payload from the local LRU, then Redis."""
+        with self._lock:
+            value = self._local.get(key)
+            if value is not None:
+                self._local.move_to_end(key)
+                self._counters["local_hits"] += 1
+                return value
+        try:
+            raw = self._redis.get(key)
+        except redis.RedisError as exc:
+            logger.warning("llm_cache_get_failed error=%s", exc)
+            raw = None
+            self._count("errors")
+        if raw is None:
+            self._count("misses")
+            return None
+        value = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+        self._count("remote_hits")
+        self._put_local(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a payload locally and in Redis."""
+        self._put_local(key, value)
+        try:
+            self._redis.set(key, value, ex=self._ttl)
+        except redis.RedisError as exc:
+            logger.warning("llm_cache_set_failed error=%s", exc)
+            self._count("errors")
+
+    def stats(self) -> dict[str, float]:
+        """Return hit/miss counters, hit rate and local LRU size."""
+        with self._lock:
+            counters = dict(self._counters)
+            counters["local_entries"] = len(self._local)
+            counters["local_bytes"] = self._local_bytes
+        lookups = counters["local_hits"] + counters["remote_hits"] + counters["misses"]
+        counters["hit_rate"] = (counters["local_hits"] + counters["remote_hits"]) / lookups if lookups else 0.0
+        return counters
+
+    def _put_local(self, key: str, value: str) -> None:
+        size = len(value)
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            previous = self._local.pop(key, None)
+            if previous is not None:
+                self._local_bytes -= len(previous)
+            self._local[key] = value
+            self._local_bytes += size
+            while len(self._local) > self._max_entries or self._local_bytes > self._max_bytes:
+                _, evicted = self._local.popitem(last=False)
+                self._local_bytes -= len(evicted)
+                self._counters["evictions"] += 1
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+
+class CachedLLMClient(LLMClient):
+    def __init__(self, client: LLMClient, cache: LLMResponseCache) -> None:
+        """Serve repeated prompts for the wrapped client from the response cache."""
+        self._client = client
+        self._cache = cache
+        self.provider = getattr(client, "provider", type(client).__name__)
+        self.model = getattr(client, "model", "")
+        self.temperature = getattr(client, "temperature", None)
+
+    def generate(self, prompt: str) -> LLMResult:
+        """Return a cached result for this exact prompt, or call the model and cache it."""
+        key = cache_key(self.provider, self.model, self.temperature, prompt)
+        cached = self._cache.get(key)
+        if cached is not None:
+            result = LLMResult.model_validate_json(cached)
+            return result.model_copy(update={"metadata": {**(result.metadata or {}), "cache": "hit"}})
+        result = self._client.generate(prompt)
+        self._cache.set(key, result.model_dump_json())
+        return result
+
+    async def agenerate(self, prompt: str) -> LLMResult:
+        """Async variant of ``generate``; cache I/O runs off the event loop."""
+        key = cache_key(self.provider, self.model, self.temperature, prompt)
+        cached = await asyncio.to_thread(self._cache.get, key)
+        if cached is not None:
+            result = LLMResult.model_validate_json(cached)
+            return result.model_copy(update={"metadata": {**(result.metadata or {}), "cache": "hit"}})
+        result = await self._client.agenerate(prompt)
+        await asyncio.to_thread(self._cache.set, key, result.model_dump_json())
+        return result
+
+    async def astream(self, prompt: str, on_text: Callable[[str], None]) -> LLMResult:
+        """Stream through the wrapped client; a cached response is delivered as one chunk."""
+        key = cache_key(self.provider, self.model, self.temperature, prompt)
+        cached = await asyncio.to_thread(self._cache.get, key)
+        if cached is not None:
+            result = LLMResult.model_validate_json(cached)
+            on_text(result.text)
+            return result.model_copy(update={"metadata": {**(result.metadata or {}), "cache": "hit"}})
+        result = await self._client.astream(prompt, on_text)
+        await asyncio.to_thread(self._cache.set, key, result.model_dump_json())
+        return result
+
+
+def llm_cache_enabled_for(tenant_id: str | None, route_allows: bool = True) -> bool:
+    """Whether responses for this tenant may be cached."""
+    if not settings.llm_cache_enabled or not route_allows:
+        return False
+    disabled = {tenant.strip() for tenant in settings.llm_cache_disabled_tenants.split(",") if tenant.strip()}
+    return not (tenant_id and str(tenant_id) in disabled)
+
+
+_cache_lock = threading.Lock()
+_cache_pid: int | None = None
+_cache: LLMResponseCache | None = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Return this worker process's response cache."""
+    global _cache_pid, _cache
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache_pid = os.getpid()
+            _cache = LLMResponseCache()
+        return _cache
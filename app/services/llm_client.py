@@ -1,16 +1,28 @@
 """Pluggable LLM client interfaces."""
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import logging
 import os
+import threading
+import time
+from typing import Any, Callable, Coroutine, TypeVar
 
 from pydantic import BaseModel
 
 from app.core.config import settings
+from app.core.metrics import estimate_cost
+from app.services.rate_limit import estimate_tokens, get_rate_limiter, retry_after
+from app.utils.event_loop import BackgroundLoop
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
 
 
 class LLMResult(BaseModel):
     text: str
-    metadata: dict[str, str] | None = None
+    metadata: dict[str, Any] | None = None
 
 
 class LLMClient:
@@ -18,11 +30,40 @@ class LLMClient:
         """Generate text from a prompt using the configured LLM."""
         raise NotImplementedError
 
+    async def agenerate(self, prompt: str) -> LLMResult:
+        """Async generate; clients without native async support run ``generate`` in a thread."""
+        return await asyncio.to_thread(self.generate, prompt)
+
+    async def astream(self, prompt: str, on_text: Callable[[str], None]) -> LLMResult:
+        """Generate, passing output text to ``on_text`` as it arrives; returns the complete result.
+
+        Clients without native streaming deliver the whole response as one chunk.
+        """
+        result = await self.agenerate(prompt)
+        on_text(result.text)
+        return result
+
 
 class StubLLMClient(LLMClient):
+    def __init__(self, latency: float = 0.0, text: str = "stub-response") -> None:
+        """Placeholder client; ``latency`` seconds are spent per call to mimic a provider."""
+        self.provider = "stub"
+        self.model = "stub"
+        self.temperature = 0.0
+        self.latency = latency
+        self.text = text
+
     def generate(self, prompt: str) -> LLMResult:
         """Return a placeholder response for tests or local runs."""
-        return LLMResult(text="stub-response", metadata={"provider": "stub"})
+        if self.latency:
+            time.sleep(self.latency)
+        return LLMResult(text=self.text, metadata={"provider": "stub", "model": "stub"})
+
+    async def agenerate(self, prompt: str) -> LLMResult:
+        """Async placeholder response; sleeps without blocking the event loop."""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return LLMResult(text=self.text, metadata={"provider": "stub", "model": "stub"})
 
 
 class LangChainLLMClient(LLMClient):
@@ -37,6 +78,7 @@ class LangChainLLMClient(LLMClient):
         self.model = model or settings.llm_model
         self.temperature = temperature if temperature is not None else settings.llm_temperature
         self._client = self._build_client()
+        self._limiter = get_rate_limiter(self.provider, self.model)
 
     def _build_client(self):
         """Construct the provider-specific LangChain client."""
@@ -47,6 +89,8 @@ class LangChainLLMClient(LLMClient):
                 api_key=os.getenv("OPENAI_API_KEY"),
                 model=self.model,
                 temperature=self.temperature,
+                # Report token usage on the final chunk of streamed responses.
+                stream_usage=True,
             )
         if self.provider == "bedrock":
             from langchain_aws import ChatBedrock
@@ -59,13 +103,122 @@ class LangChainLLMClient(LLMClient):
         raise ValueError(f"Unsupported LLM provider: {self.provider}")
 
     def generate(self, prompt: str) -> LLMResult:
-        """Invoke the LLM and normalize its response."""
-        response = self._client.invoke(prompt)
-        text = getattr(response, "content", str(response))
-        return LLMResult(
-            text=text,
-            metadata={
-                "provider": self.provider,
-                "model": self.model,
-            },
+        """Invoke the LLM under the provider rate limit and normalize its response."""
+        estimated = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            with self._limiter.slot(estimated):
+                try:
+                    response = self._client.invoke(prompt)
+                except Exception as exc:
+                    if not self._back_off(exc, attempt, estimated):
+                        raise
+                    attempt += 1
+                    continue
+            return self._result(response, estimated)
+
+    async def agenerate(self, prompt: str) -> LLMResult:
+        """Invoke the LLM with ``ainvoke`` under the provider rate limit."""
+        estimated = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            async with self._limiter.aslot(estimated):
+                try:
+                    response = await self._client.ainvoke(prompt)
+                except Exception as exc:
+                    if not self._back_off(exc, attempt, estimated):
+                        raise
+                    attempt += 1
+                    continue
+            return self._result(response, estimated)
+
+    async def astream(self, prompt: str, on_text: Callable[[str], None]) -> LLMResult:
+        """Stream the LLM with ``astream`` under the provider rate limit."""
+        estimated = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            async with self._limiter.aslot(estimated):
+                response = None
+                try:
+                    async for chunk in self._client.astream(prompt):
+                        response = chunk if response is None else response + chunk
+                        if isinstance(chunk.content, str) and chunk.content:
+                            on_text(chunk.content)
+                except Exception as exc:
+                    # Once text was delivered a retry would repeat it; let the caller decide.
+                    if response is not None or not self._back_off(exc, attempt, estimated):
+                        raise
+                    attempt += 1
+                    continue
+            return self._result(response, estimated) if response is not None else self._empty(estimated)
+
+    def _back_off(self, exc: Exception, attempt: int, estimated: int) -> bool:
+        """Pause the shared limiter after a rate-limit error; False when the error should propagate."""
+        delay = retry_after(exc, attempt)
+        if delay is None:
+            return False
+        # A rejected call used no tokens; give its reservation back before the retry reserves again.
+        self._limiter.settle(estimated, 0)
+        if attempt >= settings.llm_rate_limit_retries:
+            return False
+        logger.warning(
+            "llm_rate_limited provider=%s model=%s attempt=%s retry_after=%.2f",
+            self.provider,
+            self.model,
+            attempt + 1,
+            delay,
         )
+        self._limiter.block_for(delay)
+        return True
+
+    def _result(self, response: Any, estimated: int) -> LLMResult:
+        """Normalize a LangChain message and settle the token reservation."""
+        text = getattr(response, "content", str(response))
+        metadata: dict[str, Any] = {"provider": self.provider, "model": self.model}
+        usage = getattr(response, "usage_metadata", None) or {}
+        self._limiter.settle(estimated, usage.get("total_tokens"))
+        if usage:
+            prompt_tokens = int(usage.get("input_tokens", 0))
+            completion_tokens = int(usage.get("output_tokens", 0))
+            metadata.update(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=int(usage.get("total_tokens", prompt_tokens + completion_tokens)),
+                cost_usd=estimate_cost(self.model, prompt_tokens, completion_tokens),
+            )
+        return LLMResult(text=text, metadata=metadata)
+
+    def _empty(self, estimated: int) -> LLMResult:
+        """Result for a stream that produced no chunks."""
+        self._limiter.settle(estimated, None)
+        return LLMResult(text="", metadata={"provider": self.provider, "model": self.model})
+
+
+_loop_lock = threading.Lock()
+_loop_pid: int | None = None
+_loop: BackgroundLoop | None = None
+
+
+def submit_async(coro: Coroutine[Any, Any, T]) -> concurrent.futures.Future[T]:
+    """Schedule an LLM coroutine on this process's long-lived loop without waiting for it.
+
+    Pooled async provider clients keep connections bound to the loop they were first
+    used on, so every async LLM call goes through the same loop.
+    """
+    global _loop_pid, _loop
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        with _loop_lock:
+            if _loop is None or _loop_pid != os.getpid():
+                _loop_pid = os.getpid()
+                _loop = BackgroundLoop("llm-loop")
+            loop = _loop
+        return loop.submit(coro)
+    coro.close()
+    raise RuntimeError("LLM loop used from an active event loop; await the coroutine instead.")
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """Run an LLM coroutine on this process's long-lived loop and wait for the result."""
+    return submit_async(coro).result()
@@ -0,0 +1,154 @@
+"""Worker-wide registry of tenant routes and pooled LLM / Strands clients."""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Any
+
+from app.core.config import settings
+from app.mcp.routing import RouteDecision, RoutingClient
+from app.services.llm_client import LangChainLLMClient, LLMClient
+from app.utils.cache import TTLCache
+
+if TYPE_CHECKING:
+    from strands import Agent as StrandsAgent
+
+logger = logging.getLogger(__name__)
+
+
+def build_strands_agent(provider: str, model_id: str, temperature: float) -> StrandsAgent:
+    """Build a Strands agent for a specific provider/model."""
+    from strands import Agent as StrandsAgent
+    from strands.models import BedrockModel, OpenAIModel
+
+    provider = provider.lower()
+    if provider == "default":
+        return StrandsAgent()
+    if provider == "openai":
+        client_args = {}
+        api_key = os.getenv("OPENAI_API_KEY")
+        if api_key:
+            client_args["api_key"] = api_key
+        model = OpenAIModel(
+            client_args=client_args,
+            model_id=model_id,
+            params={"temperature": temperature},
+        )
+        return StrandsAgent(model=model)
+    if provider == "bedrock":
+        model = BedrockModel(
+            model_id=model_id,
+            region_name=settings.strands_region,
+            temperature=temperature,
+        )
+        return StrandsAgent(model=model)
+    raise ValueError(f"Unsupported Strands provider: {provider}")
+
+
+class _PooledStrandsAgent:
+    def __init__(self, key: tuple[str, str, float], size: int) -> None:
+        """Up to ``size`` Strands agents for one model; each call borrows one and starts from an empty history."""
+        self.provider, self.model, self.temperature = key
+        self._key = key
+        self._size = max(1, size)
+        self._available = threading.Condition()
+        self._idle: list[StrandsAgent] = []
+        self._built = 0
+
+    def __call__(self, prompt: str) -> Any:
+        agent = self._acquire()
+        try:
+            # Pooled agents are shared across documents; never carry one document's turns into the next.
+            agent.messages = []
+            return agent(prompt)
+        finally:
+            self._release(agent)
+
+    def _acquire(self) -> StrandsAgent:
+        """Borrow an idle agent, building another while under ``size``, else wait for one."""
+        with self._available:
+            while not self._idle and self._built >= self._size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._built += 1
+        try:
+            return build_strands_agent(*self._key)
+        except BaseException:
+            with self._available:
+                self._built -= 1
+                self._available.notify()
+            raise
+
+    def _release(self, agent: StrandsAgent) -> None:
+        with self._available:
+            self._idle.append(agent)
+            self._available.notify()
+
+
+class ModelRegistry:
+    def __init__(self, router: RoutingClient | None = None) -> None:
+        """Cache tenant routes and reuse one client per (provider, model, temperature)."""
+        self._router = router or RoutingClient()
+        self._routes = TTLCache("tenant_routes", settings.route_cache_ttl)
+        self._lock = threading.Lock()
+        self._llms: dict[tuple[str, str, float], LLMClient] = {}
+        self._strands: dict[tuple[str, str, float], _PooledStrandsAgent] = {}
+
+    def resolve_route(self, tenant_id: str) -> RouteDecision:
+        """Resolve a tenant's model route, served from the TTL cache when fresh."""
+        return self._routes.get_or_load(tenant_id, lambda: (self._router.resolve_route(tenant_id), None))
+
+    def get_llm(
+        self,
+        provider: str | None = None,
+        model: str | None = None,
+        temperature: float | None = None,
+    ) -> LLMClient:
+        """Return the shared LangChain client for a provider/model/temperature."""
+        key = (
+            (provider or settings.llm_provider).lower(),
+            model or settings.llm_model,
+            settings.llm_temperature if temperature is None else temperature,
+        )
+        with self._lock:
+            client = self._llms.get(key)
+            if client is None:
+                client = self._llms[key] = LangChainLLMClient(provider=key[0], model=key[1], temperature=key[2])
+                logger.info("llm_client_created provider=%s model=%s", key[0], key[1])
+            return client
+
+    def get_strands_agent(
+        self,
+        provider: str | None = None,
+        model_id: str | None = None,
+        temperature: float | None = None,
+    ) -> _PooledStrandsAgent:
+        """Return the shared Strands agent for a provider/model/temperature."""
+        key = (
+            (provider or settings.strands_provider).lower(),
+            model_id or settings.strands_model_id,
+            settings.strands_temperature if temperature is None else temperature,
+        )
+        with self._lock:
+            agent = self._strands.get(key)
+            if agent is None:
+                agent = self._strands[key] = _PooledStrandsAgent(key, settings.strands_pool_size)
+                logger.info("strands_agent_created provider=%s model=%s", key[0], key[1])
+            return agent
+
+
+_registry_lock = threading.Lock()
+_registry_pid: int | None = None
+_registry: ModelRegistry | None = None
+
+
+def get_model_registry() -> ModelRegistry:
+    """Return this worker process's model registry."""
+    global _registry_pid, _registry
+    with _registry_lock:
+        if _registry is None or _registry_pid != os.getpid():
+            _registry_pid = os.getpid()
+            _registry = ModelRegistry()
+        return _registry
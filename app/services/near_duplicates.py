@@ -0,0 +1,160 @@
+"""MinHash/LSH index for near-duplicate contract detection."""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+import redis
+
+from app.core.config import settings
+from app.utils.minhash import MinHasher, estimate_jaccard, shingle_hashes
+
+
+class RedisLshStore:
+    def __init__(self, client: redis.Redis | None = None, prefix: str = "lsh") -> None:
+        """Keep LSH buckets as Redis sets and signatures as raw bytes."""
+        self._client = client or redis.Redis.from_url(settings.broker_url)
+        self._prefix = prefix
+
+    def candidates(self, band_keys: list[str]) -> set[str]:
+        """Return document ids sharing at least one band bucket."""
+        pipe = self._client.pipeline(transaction=False)
+        for key in band_keys:
+            pipe.smembers(f"{self._prefix}:{key}")
+        return {member.decode("utf-8") for members in pipe.execute() for member in members}
+
+    def signatures(self, document_ids: list[str]) -> dict[str, bytes]:
+        """Fetch stored signatures for candidate documents."""
+        if not document_ids:
+            return {}
+        values = self._client.mget([f"{self._prefix}:sig:{doc_id}" for doc_id in document_ids])
+        return {doc_id: value for doc_id, value in zip(document_ids, values) if value is not None}
+
+    def add(self, document_id: str, band_keys: list[str], signature: bytes) -> None:
+        """Store a signature and add the document to each of its band buckets."""
+        pipe = self._client.pipeline(transaction=False)
+        pipe.set(f"{self._prefix}:sig:{document_id}", signature)
+        for key in band_keys:
+            pipe.sadd(f"{self._prefix}:{key}", document_id)
+        pipe.execute()
+
+
+class SqliteLshStore:
+    def __init__(self, path: str) -> None:
+        """Keep LSH buckets and signatures in a local SQLite file."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                bucket TEXT NOT NULL,
+                document_id TEXT NOT NULL,
+                PRIMARY KEY (bucket, document_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS lsh_signatures (
+                document_id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL
+            );
+            """
+        )
+
+    def candidates(self, band_keys: list[str]) -> set[str]:
+        """Return document ids sharing at least one band bucket."""
+        placeholders = ",".join("?" * len(band_keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT document_id FROM lsh_buckets WHERE bucket IN ({placeholders})",
+                band_keys,
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def signatures(self, document_ids: list[str]) -> dict[str, bytes]:
+        """Fetch stored signatures for candidate documents."""
+        if not document_ids:
+            return {}
+        placeholders = ",".join("?" * len(document_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT document_id, signature FROM lsh_signatures WHERE document_id IN ({placeholders})",
+                document_ids,
+            ).fetchall()
+        return dict(rows)
+
+    def add(self, document_id: str, band_keys: list[str], signature: bytes) -> None:
+        """Store a signature and add the document to each of its band buckets."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lsh_signatures (document_id, signature) VALUES (?, ?)",
+                (document_id, signature),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets (bucket, document_id) VALUES (?, ?)",
+                [(key, document_id) for key in band_keys],
+            )
+
+
+class NearDuplicateIndex:
+    def __init__(
+        self,
+        store: RedisLshStore | SqliteLshStore | None = None,
+        num_perm: int | None = None,
+        bands: int | None = None,
+        shingle_size: int | None = None,
+        threshold: float | None = None,
+    ) -> None:
+        """LSH banding index over MinHash signatures; lookups touch only ``bands`` buckets."""
+        self._store = store or _default_store()
+        self._hasher = MinHasher(num_perm or settings.near_dup_num_perm)
+        self._bands = bands or settings.near_dup_bands
+        if self._hasher.num_perm % self._bands:
+            raise ValueError("near_dup_num_perm must be divisible by near_dup_bands.")
+        self._rows = self._hasher.num_perm // self._bands
+        self._shingle_size = shingle_size or settings.near_dup_shingle_size
+        self._threshold = settings.near_dup_threshold if threshold is None else threshold
+
+    def signature(self, text: str) -> np.ndarray | None:
+        """Compute the MinHash signature for document text, or None when it has no words to shingle.
+
+        An empty shingle set hashes to the all-max signature, which would match every other empty document.
+        """
+        hashes = shingle_hashes(text, self._shingle_size)
+        return self._hasher.signature(hashes) if len(hashes) else None
+
+    def query(self, signature: np.ndarray | None, exclude: str | None = None) -> list[tuple[str, float]]:
+        """Return (document_id, estimated Jaccard) above the threshold, most similar first."""
+        if signature is None:
+            return []
+        candidates = sorted(self._store.candidates(self._band_keys(signature)) - {exclude})
+        matches = []
+        for document_id, raw in self._store.signatures(candidates).items():
+            similarity = estimate_jaccard(signature, np.frombuffer(raw, dtype=np.uint64))
+            if similarity >= self._threshold:
+                matches.append((document_id, similarity))
+        return sorted(matches, key=lambda match: (-match[1], match[0]))
+
+    def add(self, document_id: str, signature: np.ndarray | None) -> None:
+        """Index a processed document's signature (documents without one are never indexed)."""
+        if signature is None:
+            return
+        self._store.add(document_id, self._band_keys(signature), signature.astype(np.uint64).tobytes())
+
+    def _band_keys(self, signature: np.ndarray) -> list[str]:
+        """Hash each band of rows into a bucket key prefixed by the band number."""
+        keys = []
+        for band in range(self._bands):
+            rows = signature[band * self._rows : (band + 1) * self._rows].astype(np.uint64).tobytes()
+            keys.append(f"{band}:{hashlib.blake2b(rows, digest_size=8).hexdigest()}")
+        return keys
+
+
+def _default_store() -> RedisLshStore | SqliteLshStore:
+    """Build the store named by NEAR_DUP_STORE ('redis' or 'sqlite:///path')."""
+    if settings.near_dup_store.startswith("sqlite:///"):
+        return SqliteLshStore(settings.near_dup_store[len("sqlite:///") :])
+    if settings.near_dup_store == "redis":
+        return RedisLshStore()
+    raise ValueError(f"Unsupported near-duplicate store: {settings.near_dup_store}")
@@ -0,0 +1,272 @@
+"""Node-local NER inference server with cross-document micro-batching.
+
+One server process per worker node owns the only copy of the NER model.
+Celery worker processes send window texts over a Unix socket; the server
+groups windows from concurrent requests into micro-batches (bounded by
+``NER_SERVER_MAX_BATCH_SIZE`` and ``NER_SERVER_MAX_WAIT_MS``) and returns
+per-request results.
+
+    python -m app.services.ner_server
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("!I")
+
+
+def _normalize(items: list[dict]) -> list[dict]:
+    """Keep the JSON-serializable fields of pipeline entities."""
+    return [
+        {
+            "entity_group": item.get("entity_group"),
+            "word": item.get("word"),
+            "start": int(item.get("start", 0)),
+            "end": int(item.get("end", 0)),
+            "score": float(item.get("score", 0.0)),
+        }
+        for item in items
+    ]
+
+
+def _encode(message: dict) -> bytes:
+    body = json.dumps(message, ensure_ascii=True).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+async def _read_message(reader: asyncio.StreamReader) -> dict | None:
+    """Read one length-prefixed JSON message, or None at EOF."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = _HEADER.unpack(header)
+    return json.loads(await reader.readexactly(length))
+
+
+class NerInferenceServer:
+    def __init__(
+        self,
+        socket_path: str | None = None,
+        max_batch_size: int | None = None,
+        max_wait_ms: float | None = None,
+        extractor: Callable[[list[str], int], list[list[dict]]] | None = None,
+    ) -> None:
+        """Create a server; ``extractor`` defaults to the shared Transformers pipeline."""
+        self._socket_path = socket_path or settings.ner_server_socket
+        self._max_batch_size = max_batch_size or settings.ner_server_max_batch_size
+        self._max_wait = (settings.ner_server_max_wait_ms if max_wait_ms is None else max_wait_ms) / 1000
+        self._extractor = extractor or _pipeline_extractor
+        # A single inference thread: the model is the shared resource being batched.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ner-infer")
+        self._queue: asyncio.Queue[tuple[str, asyncio.Future]] | None = None
+        self.batches = 0
+        self.windows = 0
+
+    async def serve_forever(self) -> None:
+        """Listen on the Unix socket and run the batching loop until cancelled."""
+        if not self._socket_path:
+            raise RuntimeError("NER_SERVER_SOCKET is not configured.")
+        self._queue = asyncio.Queue()
+        Path(self._socket_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(self._socket_path).unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self._handle, path=self._socket_path)
+        batcher = asyncio.create_task(self._batch_loop())
+        logger.info(
+            "ner_server_listening socket=%s max_batch_size=%s max_wait_ms=%s",
+            self._socket_path,
+            self._max_batch_size,
+            self._max_wait * 1000,
+        )
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._executor.shutdown(wait=False)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve requests from one worker connection until it closes."""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request = await _read_message(reader)
+                if request is None:
+                    break
+                futures = []
+                for text in request.get("texts", []):
+                    future = loop.create_future()
+                    self._queue.put_nowait((text, future))
+                    futures.append(future)
+                try:
+                    response = {"results": list(await asyncio.gather(*futures))}
+                except Exception as exc:
+                    response = {"error": f"{type(exc).__name__}: {exc}"}
+                writer.write(_encode(response))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _batch_loop(self) -> None:
+        """Collect queued windows into micro-batches and run them on the inference thread."""
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(items) < self._max_batch_size:
+                if not self._queue.empty():
+                    items.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            texts = [text for text, _ in items]
+            try:
+                results = await loop.run_in_executor(self._executor, self._extractor, texts, len(texts))
+            except Exception as exc:
+                logger.exception("ner_server_batch_failed size=%s", len(texts))
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.windows += len(texts)
+            for (_, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(_normalize(result))
+            logger.debug("ner_server_batch size=%s avg=%.1f", len(texts), self.windows / self.batches)
+
+
+def _pipeline_extractor(texts: list[str], batch_size: int) -> list[list[dict]]:
+    """Run the cached Transformers pipeline over a micro-batch."""
+    from app.agents.ner_agent import NerAgent
+
+    results = NerAgent._get_pipeline()(texts, batch_size=batch_size)
+    if results and isinstance(results[0], dict):
+        results = [results]
+    return results
+
+
+class NerInferenceClient:
+    def __init__(self, socket_path: str | None = None, timeout: float | None = None) -> None:
+        """Client for the node-local NER server; one persistent connection per process."""
+        self._socket_path = socket_path or settings.ner_server_socket
+        self._timeout = timeout or settings.ner_server_timeout
+        self._lock = threading.Lock()
+        self._sock: socket.socket | None = None
+
+    def infer(self, texts: list[str]) -> list[list[dict[str, Any]]]:
+        """Send window texts to the server and return entities per text."""
+        if not texts:
+            return []
+        payload = _encode({"texts": texts})
+        with self._lock:
+            sock = self._send(payload)
+            try:
+                response = self._receive(sock)
+            except OSError:
+                # A timed-out or half-read response leaves the stream unusable; the request is not retried.
+                self._close()
+                raise
+        if "error" in response:
+            raise RuntimeError(f"NER server error: {response['error']}")
+        return response["results"]
+
+    def close(self) -> None:
+        """Close the connection to the server."""
+        with self._lock:
+            self._close()
+
+    def _send(self, payload: bytes) -> socket.socket:
+        """Send a request, reconnecting once if the persistent connection has gone stale."""
+        try:
+            sock = self._connect()
+            sock.sendall(payload)
+            return sock
+        except OSError:
+            self._close()
+        sock = self._connect()
+        try:
+            sock.sendall(payload)
+        except OSError:
+            self._close()
+            raise
+        return sock
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self._timeout)
+            try:
+                sock.connect(self._socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._sock = sock
+        return self._sock
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _receive(self, sock: socket.socket) -> dict:
+        (length,) = _HEADER.unpack(self._receive_exactly(sock, _HEADER.size))
+        return json.loads(self._receive_exactly(sock, length))
+
+    @staticmethod
+    def _receive_exactly(sock: socket.socket, size: int) -> bytes:
+        chunks = bytearray()
+        while len(chunks) < size:
+            chunk = sock.recv(size - len(chunks))
+            if not chunk:
+                raise ConnectionResetError("NER server closed the connection.")
+            chunks.extend(chunk)
+        return bytes(chunks)
+
+
+_client_lock = threading.Lock()
+_client_pid: int | None = None
+_client: NerInferenceClient | None = None
+
+
+def get_ner_client() -> NerInferenceClient:
+    """Return this process's NER server client."""
+    global _client_pid, _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client_pid = os.getpid()
+            _client = NerInferenceClient()
+        return _client
+
+
+def main() -> None:
+    """Load the model once and serve it to every worker process on this node."""
+    from app.core.logging import configure_logging
+
+    configure_logging()
+    _pipeline_extractor(["warm up"], 1)
+    asyncio.run(NerInferenceServer().serve_forever())
+
+
+if __name__ == "__main__":
+    main()
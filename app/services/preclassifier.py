@@ -0,0 +1,203 @@
+"""Local hashed-feature legal/non-legal pre-classifier.
+
+A logistic regression over hashed word and bigram features of the first
+``PRECLASSIFIER_MAX_CHARS`` characters. Documents scoring at or above
+``PRECLASSIFIER_HIGH`` are accepted as legal and at or below
+``PRECLASSIFIER_LOW`` rejected, without an LLM call; only the uncertain band
+goes to the Strands classifier.
+
+    python -m app.services.preclassifier train --legal data/legal --other data/other --out model.npz
+    python -m app.services.preclassifier eval --legal data/legal --other data/other --model model.npz
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import math
+import random
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9]+")
+
+
+class PreDecision(BaseModel):
+    is_legal: bool | None
+    score: float
+
+
+def _features(text: str, n_features: int) -> dict[int, float]:
+    """Signed, log-scaled, L2-normalized hashed unigram + bigram counts."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    counts: dict[int, float] = {}
+    grams = tokens + [f"{left} {right}" for left, right in zip(tokens, tokens[1:])]
+    for gram in grams:
+        digest = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little")
+        index = digest % n_features
+        sign = 1.0 if (digest >> 63) & 1 else -1.0
+        counts[index] = counts.get(index, 0.0) + sign
+    features = {index: math.copysign(math.log1p(abs(value)), value) for index, value in counts.items() if value}
+    norm = math.sqrt(sum(value * value for value in features.values())) or 1.0
+    return {index: value / norm for index, value in features.items()}
+
+
+class PreClassifier:
+    def __init__(self, weights: np.ndarray, bias: float, max_chars: int | None = None) -> None:
+        """Wrap trained weights; ``max_chars`` bounds how much of the document is read."""
+        self.weights = weights
+        self.bias = bias
+        self.max_chars = max_chars or settings.preclassifier_max_chars
+
+    @classmethod
+    def load(cls, path: str | Path) -> "PreClassifier":
+        """Load a model saved by ``save``."""
+        with np.load(path) as data:
+            return cls(data["weights"], float(data["bias"]), int(data["max_chars"]))
+
+    def save(self, path: str | Path) -> None:
+        """Persist the model as a compressed .npz file."""
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, max_chars=self.max_chars)
+
+    def score(self, text: str) -> float:
+        """Probability that the document is legal."""
+        features = _features(text[: self.max_chars], len(self.weights))
+        logit = self.bias + sum(self.weights[index] * value for index, value in features.items())
+        return 1.0 / (1.0 + math.exp(-max(min(logit, 35.0), -35.0)))
+
+    def decide(self, text: str, low: float | None = None, high: float | None = None) -> PreDecision:
+        """Decide locally when confident; ``is_legal`` is None inside the uncertain band."""
+        low = settings.preclassifier_low if low is None else low
+        high = settings.preclassifier_high if high is None else high
+        score = self.score(text)
+        if score >= high:
+            return PreDecision(is_legal=True, score=score)
+        if score <= low:
+            return PreDecision(is_legal=False, score=score)
+        return PreDecision(is_legal=None, score=score)
+
+    @classmethod
+    def train(
+        cls,
+        samples: list[tuple[str, bool]],
+        n_features: int = 2**18,
+        epochs: int = 10,
+        learning_rate: float = 0.5,
+        l2: float = 1e-6,
+        max_chars: int | None = None,
+        seed: int = 13,
+    ) -> "PreClassifier":
+        """Fit logistic regression with plain SGD over hashed features."""
+        max_chars = max_chars or settings.preclassifier_max_chars
+        encoded = [(_features(text[:max_chars], n_features), label) for text, label in samples]
+        weights = np.zeros(n_features, dtype=np.float64)
+        bias = 0.0
+        order = list(range(len(encoded)))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            rate = learning_rate / (1 + epoch)
+            for position in order:
+                features, label = encoded[position]
+                logit = bias + sum(weights[index] * value for index, value in features.items())
+                prediction = 1.0 / (1.0 + math.exp(-max(min(logit, 35.0), -35.0)))
+                gradient = prediction - (1.0 if label else 0.0)
+                for index, value in features.items():
+                    weights[index] -= rate * (gradient * value + l2 * weights[index])
+                bias -= rate * gradient
+        return cls(weights, bias, max_chars)
+
+
+_lock = threading.Lock()
+_loaded: PreClassifier | None = None
+
+
+def get_preclassifier() -> PreClassifier | None:
+    """Return the configured pre-classifier, or None when no model path is set."""
+    global _loaded
+    if not settings.preclassifier_model_path:
+        return None
+    with _lock:
+        if _loaded is None:
+            _loaded = PreClassifier.load(settings.preclassifier_model_path)
+        return _loaded
+
+
+def _read_corpus(legal_dir: Path, other_dir: Path, max_chars: int) -> list[tuple[str, bool]]:
+    """Read labelled documents; only the first ``max_chars`` characters are kept."""
+    samples = []
+    for directory, label in ((legal_dir, True), (other_dir, False)):
+        for path in sorted(p for p in directory.rglob("*") if p.is_file()):
+            with path.open("rb") as handle:
+                raw = handle.read(max_chars * 4)
+            samples.append((raw.decode("utf-8", errors="ignore")[:max_chars], label))
+    return samples
+
+
+def evaluate(model: PreClassifier, samples: list[tuple[str, bool]], low: float, high: float) -> dict[str, float]:
+    """Precision/recall of local decisions and the share of LLM calls avoided."""
+    true_pos = false_pos = true_neg = false_neg = uncertain = 0
+    for text, label in samples:
+        decision = model.decide(text, low, high)
+        if decision.is_legal is None:
+            uncertain += 1
+        elif decision.is_legal and label:
+            true_pos += 1
+        elif decision.is_legal:
+            false_pos += 1
+        elif label:
+            false_neg += 1
+        else:
+            true_neg += 1
+    total = len(samples) or 1
+    legal_total = sum(1 for _, label in samples if label) or 1
+    return {
+        "documents": len(samples),
+        "decided_locally": total - uncertain,
+        "llm_call_reduction": (total - uncertain) / total,
+        "legal_precision": true_pos / (true_pos + false_pos) if true_pos + false_pos else 1.0,
+        "legal_recall_local": true_pos / legal_total,
+        "non_legal_precision": true_neg / (true_neg + false_neg) if true_neg + false_neg else 1.0,
+        "legal_lost_to_false_reject": false_neg / legal_total,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train or evaluate the legal pre-classifier.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("train", "eval"):
+        command = commands.add_parser(name)
+        command.add_argument("--legal", type=Path, required=True, help="Directory of legal documents.")
+        command.add_argument("--other", type=Path, required=True, help="Directory of non-legal documents.")
+        command.add_argument("--max-chars", type=int, default=settings.preclassifier_max_chars)
+        command.add_argument("--low", type=float, default=settings.preclassifier_low)
+        command.add_argument("--high", type=float, default=settings.preclassifier_high)
+    commands.choices["train"].add_argument("--out", type=Path, required=True)
+    commands.choices["train"].add_argument("--epochs", type=int, default=10)
+    commands.choices["train"].add_argument("--holdout", type=float, default=0.2)
+    commands.choices["eval"].add_argument("--model", type=Path, required=True)
+    args = parser.parse_args()
+
+    samples = _read_corpus(args.legal, args.other, args.max_chars)
+    if args.command == "train":
+        random.Random(7).shuffle(samples)
+        split = int(len(samples) * (1 - args.holdout))
+        train_set, holdout = samples[:split], samples[split:]
+        model = PreClassifier.train(train_set, epochs=args.epochs, max_chars=args.max_chars)
+        model.save(args.out)
+        print(f"trained on {len(train_set)} documents -> {args.out}")
+        report = evaluate(model, holdout or train_set, args.low, args.high)
+    else:
+        report = evaluate(PreClassifier.load(args.model), samples, args.low, args.high)
+    print(f"thresholds low={args.low} high={args.high}")
+    for key, value in report.items():
+        print(f"{key:<28} {value:.3f}" if isinstance(value, float) else f"{key:<28} {value}")
+
+
+if __name__ == "__main__":
+    main()
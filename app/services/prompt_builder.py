@@ -0,0 +1,145 @@
+"""Token-budgeted prompt assembly with a cacheable static prefix."""
+from __future__ import annotations
+
+import json
+import logging
+
+from pydantic import BaseModel
+
+from app.utils.chunking import split_sections
+from app.utils.tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+_GAP = "\n[...]\n"
+# Never select sections smaller than this, or the selection degenerates into fragments.
+_MIN_SECTION_CHARS = 500
+
+
+class BuiltPrompt(BaseModel):
+    text: str
+    tokens: int
+    budget: int | None = None
+    # Tokens of the leading template/vars/schema block, identical across documents.
+    static_tokens: int
+    document_tokens: int
+    tokens_saved: int = 0
+    truncated: bool = False
+
+
+def serialize_context(context: dict) -> str:
+    """Compact, key-sorted JSON so equal contexts render identically."""
+    return json.dumps(context, ensure_ascii=True, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def static_block(prefix: str, schema_json: str | None) -> str:
+    """Template + prompt vars + schema: the part providers can cache as a prompt prefix."""
+    return f"{prefix}\n\nSchema: {schema_json}" if schema_json else prefix
+
+
+def dynamic_header(context: dict) -> str:
+    """Per-document lines between the static block and the document text."""
+    lines = [f"Context: {serialize_context(context)}"] if context else []
+    lines.append("Document:\n")
+    return "\n\n".join(lines)
+
+
+def document_allowance(static: str, header: str, budget: int, model: str = "") -> int:
+    """Tokens left for the document once the static block and header are paid for."""
+    return budget - count_tokens(static, model) - count_tokens(header, model) - 1
+
+
+def build_prompt(
+    prefix: str,
+    schema_json: str | None,
+    context: dict,
+    document_text: str,
+    *,
+    model: str = "",
+    budget: int = 0,
+    strategy: str = "sections",
+) -> BuiltPrompt:
+    """Lay out static parts first, then context and document, fitting the document into ``budget`` tokens.
+
+    ``strategy`` is ``"sections"`` (keep whole sections from the start and end of the
+    document) or ``"truncate"`` (keep the head). A budget of 0 disables the limit.
+    """
+    static = static_block(prefix, schema_json)
+    header = dynamic_header(context)
+    static_tokens = count_tokens(static, model)
+    header_tokens = count_tokens(header, model)
+    full_document_tokens = count_tokens(document_text, model)
+    document, document_tokens = document_text, full_document_tokens
+    truncated = False
+    if budget and static_tokens + header_tokens + full_document_tokens > budget:
+        allowance = budget - static_tokens - header_tokens - 1
+        if allowance <= 0:
+            raise ValueError(f"Prompt budget of {budget} tokens does not cover the {static_tokens}-token static prompt.")
+        if strategy == "sections":
+            document = _select_sections(document_text, allowance, full_document_tokens, model)
+        elif strategy == "truncate":
+            document = truncate_tokens(document_text, allowance, model)
+        else:
+            raise ValueError(f"Unknown prompt budget strategy: {strategy}")
+        document_tokens = count_tokens(document, model)
+        truncated = True
+    tokens = static_tokens + 1 + header_tokens + document_tokens
+    built = BuiltPrompt(
+        text=f"{static}\n\n{header}{document}",
+        tokens=tokens,
+        budget=budget or None,
+        static_tokens=static_tokens,
+        document_tokens=document_tokens,
+        tokens_saved=full_document_tokens - document_tokens,
+        truncated=truncated,
+    )
+    if truncated:
+        logger.info(
+            "prompt_budget_applied strategy=%s budget=%s tokens=%s saved=%s",
+            strategy,
+            budget,
+            built.tokens,
+            built.tokens_saved,
+        )
+    return built
+
+
+def _select_sections(text: str, allowance: int, text_tokens: int, model: str) -> str:
+    """Keep whole sections alternately from the start and end of ``text`` while they fit ``allowance``.
+
+    Openings (parties, recitals, definitions) and endings (governing law, signatures)
+    carry most of a contract's type and legal signals; omitted middles are marked.
+    """
+    chars_per_token = len(text) / max(1, text_tokens)
+    section_chars = max(_MIN_SECTION_CHARS, int(allowance * chars_per_token) // 8)
+    sections = split_sections(text, section_chars)
+    gap_tokens = count_tokens(_GAP, model)
+    order = []
+    head, tail = 0, len(sections) - 1
+    while head <= tail:
+        order.append(head)
+        if tail != head:
+            order.append(tail)
+        head, tail = head + 1, tail - 1
+
+    kept: set[int] = set()
+    remaining = allowance - gap_tokens
+    for index in order:
+        cost = count_tokens(text[sections[index].start : sections[index].end], model) + gap_tokens
+        if cost > remaining:
+            break
+        kept.add(index)
+        remaining -= cost
+    if not kept:
+        return truncate_tokens(text, allowance, model)
+
+    parts: list[str] = []
+    previous = -1
+    for index in sorted(kept):
+        if index != previous + 1:
+            parts.append(_GAP)
+        parts.append(text[sections[index].start : sections[index].end])
+        previous = index
+    if previous != len(sections) - 1:
+        parts.append(_GAP)
+    return "".join(parts)
@@ -0,0 +1,85 @@
+"""Versioned TTL cache for prompts, prompt vars and schemas."""
+from __future__ import annotations
+
+import json
+import logging
+
+from app.core.config import settings
+from app.mcp.prompt_registry import PromptRegistryClient
+from app.mcp.schema_registry import SchemaRegistryClient
+from app.utils.cache import MISSING, TTLCache
+from app.utils.prompt_loader import load_prompt, load_prompt_vars
+
+logger = logging.getLogger(__name__)
+
+_prompt_registry = PromptRegistryClient()
+_schema_registry = SchemaRegistryClient()
+
+_templates = TTLCache("prompt_templates", settings.prompt_cache_ttl)
+_prompt_vars = TTLCache("prompt_vars", settings.prompt_cache_ttl, settings.prompt_cache_negative_ttl)
+_schemas = TTLCache("prompt_schemas", settings.prompt_cache_ttl, settings.prompt_cache_negative_ttl)
+_prefixes = TTLCache("prompt_prefixes", settings.prompt_cache_ttl)
+
+
+def get_prompt_template(prompt_name: str) -> str:
+    """Return a prompt template from MCP if configured, otherwise from disk."""
+
+    def load() -> tuple[str, str | None]:
+        try:
+            record = _prompt_registry.fetch_prompt(prompt_name)
+            return record.template, record.version
+        except Exception as exc:
+            logger.debug("prompt_registry_fallback name=%s error=%s", prompt_name, exc)
+            return load_prompt(prompt_name), None
+
+    return _templates.get_or_load(
+        prompt_name,
+        load,
+        revalidate=lambda: _prompt_registry.fetch_prompt_version(prompt_name),
+    )
+
+
+def get_prompt_vars_json(prompt_name: str) -> str:
+    """Return the serialized prompt vars for a prompt (``{}`` when no vars file exists)."""
+    vars_name = prompt_name.replace(".txt", ".json")
+
+    def load() -> tuple[object, None]:
+        try:
+            return json.dumps(load_prompt_vars(vars_name), ensure_ascii=True), None
+        except FileNotFoundError:
+            return MISSING, None
+
+    return _prompt_vars.get_or_load(vars_name, load) or "{}"
+
+
+def get_schema_json(schema_name: str | None) -> str | None:
+    """Return a serialized JSON schema from MCP, or None when unavailable."""
+    if not schema_name:
+        return None
+
+    def load() -> tuple[object, str | None]:
+        try:
+            record = _schema_registry.fetch_schema(schema_name)
+        except Exception as exc:
+            logger.debug("schema_registry_unavailable name=%s error=%s", schema_name, exc)
+            return MISSING, None
+        if not record.payload:
+            return MISSING, record.version
+        return json.dumps(record.payload, ensure_ascii=True), record.version
+
+    return _schemas.get_or_load(
+        schema_name,
+        load,
+        revalidate=lambda: _schema_registry.fetch_schema_version(schema_name),
+    )
+
+
+def get_prompt_prefix(prompt_name: str) -> str:
+    """Return the pre-serialized static prefix (template + prompt vars) for a prompt."""
+    template = get_prompt_template(prompt_name)
+    vars_json = get_prompt_vars_json(prompt_name)
+    # Keyed by content so a refreshed template or vars file rebuilds the prefix.
+    return _prefixes.get_or_load(
+        (prompt_name, template, vars_json),
+        lambda: ("\n\n".join([template, f"Prompt vars: {vars_json}"]), None),
+    )
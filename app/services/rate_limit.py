@@ -0,0 +1,283 @@
+"""Per-(provider, model) request/token rate limiting for LLM calls, shared across workers through Redis."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Iterator
+
+import redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Refill a bucket to the current Redis time, then take ARGV[3] units (a negative amount gives units back).
+# Returns the seconds until the bucket is non-negative again, as a string to keep the fraction.
+_TAKE = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'level', 'updated')
+local level = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+level = math.min(capacity, level + math.max(0, now - updated) * rate)
+level = math.min(capacity, level - tonumber(ARGV[3]))
+redis.call('HSET', KEYS[1], 'level', tostring(level), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+if level >= 0 then
+    return '0'
+end
+return tostring(-level / rate)
+"""
+
+# Extend (never shorten) a shared Retry-After pause: KEYS[1] exists for ARGV[1] more milliseconds.
+_BLOCK = """
+if redis.call('PTTL', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], '1', 'PX', ARGV[1])
+end
+return 1
+"""
+
+
+class _Bucket:
+    def __init__(self, per_minute: float) -> None:
+        """Token bucket refilled continuously at ``per_minute / 60`` units per second."""
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` (going negative if needed) and return the wait until it is covered."""
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            self.level -= min(amount, self.capacity)
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float) -> None:
+        """Give back (or, when negative, charge) units after the real cost is known."""
+        with self._lock:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _RedisBucket:
+    def __init__(self, client: redis.Redis, key: str, per_minute: float) -> None:
+        """Token bucket kept in Redis, so every worker process on every node draws from one budget."""
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self._key = key
+        self._take = client.register_script(_TAKE)
+        # An idle bucket is full again after a minute; let Redis drop it a little later.
+        self._ttl = 120
+        # Used while Redis is unreachable, so a Redis outage does not stop LLM calls.
+        self._fallback = _Bucket(per_minute)
+
+    def reserve(self, amount: float) -> float:
+        """Atomically refill and take ``amount``; return the wait until it is covered."""
+        try:
+            wait = self._take(keys=[self._key], args=[self.rate, self.capacity, min(amount, self.capacity), self._ttl])
+            return float(wait)
+        except redis.RedisError as exc:
+            logger.warning("llm_rate_limit_store_failed key=%s error=%s", self._key, exc)
+            return self._fallback.reserve(amount)
+
+    def refund(self, amount: float) -> None:
+        """Give back (or, when negative, charge) units after the real cost is known."""
+        try:
+            self._take(keys=[self._key], args=[self.rate, self.capacity, -amount, self._ttl])
+        except redis.RedisError as exc:
+            logger.warning("llm_rate_limit_store_failed key=%s error=%s", self._key, exc)
+            self._fallback.refund(amount)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 0,
+        store: redis.Redis | None = None,
+    ) -> None:
+        """Limit request rate, token rate and in-flight calls; a zero limit disables that dimension.
+
+        With a Redis ``store`` the rate buckets and Retry-After pauses are shared by every
+        process using it; the concurrency limit always applies per process.
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._store = store
+        self._blocked_key = f"llm_rate_limit:{name}:blocked"
+        self._block = store.register_script(_BLOCK) if store is not None else None
+        self._requests = self._bucket(store, "requests", requests_per_minute)
+        self._tokens = self._bucket(store, "tokens", tokens_per_minute)
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+        self._blocked_until = 0.0
+
+    def _bucket(self, store: redis.Redis | None, dimension: str, per_minute: float) -> _Bucket | _RedisBucket | None:
+        """A local or Redis-backed bucket for one dimension, or None when it is unlimited."""
+        if per_minute <= 0:
+            return None
+        if store is None:
+            return _Bucket(per_minute)
+        return _RedisBucket(store, f"llm_rate_limit:{self.name}:{dimension}", per_minute)
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request and ``tokens`` tokens; return how long the caller must wait."""
+        with self._lock:
+            delay = max(0.0, self._blocked_until - time.monotonic())
+        delay = max(delay, self._shared_block())
+        if self._requests is not None:
+            delay = max(delay, self._requests.reserve(1))
+        if self._tokens is not None:
+            delay = max(delay, self._tokens.reserve(tokens))
+        if delay:
+            logger.debug("llm_rate_limited limiter=%s wait=%.2f", self.name, delay)
+        return delay
+
+    def settle(self, estimated: int, actual: int | None) -> None:
+        """Correct the token bucket once the provider reports real usage (0 for a rejected call)."""
+        if self._tokens is None or actual is None:
+            return
+        self._tokens.refund(estimated - actual)
+
+    def block_for(self, seconds: float) -> None:
+        """Hold every caller back for ``seconds`` (after a 429 / Retry-After), in every process sharing the store."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        if self._block is not None and seconds > 0:
+            try:
+                self._block(keys=[self._blocked_key], args=[max(1, int(seconds * 1000))])
+            except redis.RedisError as exc:
+                logger.warning("llm_rate_limit_store_failed key=%s error=%s", self._blocked_key, exc)
+        logger.warning("llm_rate_limit_backoff limiter=%s seconds=%.2f", self.name, seconds)
+
+    def _shared_block(self) -> float:
+        """Seconds left on a Retry-After pause another process stored, or 0."""
+        if self._store is None:
+            return 0.0
+        try:
+            remaining = self._store.pttl(self._blocked_key)
+        except redis.RedisError as exc:
+            logger.warning("llm_rate_limit_store_failed key=%s error=%s", self._blocked_key, exc)
+            return 0.0
+        return remaining / 1000 if remaining > 0 else 0.0
+
+    @contextmanager
+    def slot(self, tokens: int) -> Iterator[None]:
+        """Wait for rate budget and a concurrency slot (blocking)."""
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    @asynccontextmanager
+    async def aslot(self, tokens: int) -> AsyncIterator[None]:
+        """Wait for rate budget and a concurrency slot without blocking the event loop."""
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+        if self._slots is not None:
+            # The semaphore is shared with sync callers, so poll instead of parking a thread.
+            while not self._slots.acquire(blocking=False):
+                await asyncio.sleep(0.01)
+        try:
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Rough prompt + completion token estimate used to reserve token budget."""
+    return len(prompt) // 4 + settings.llm_output_token_estimate
+
+
+def retry_after(exc: BaseException, attempt: int) -> float | None:
+    """Seconds to back off if ``exc`` is a provider rate-limit error, else None."""
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if isinstance(response, dict):
+        # botocore ClientError
+        code = response.get("Error", {}).get("Code", "")
+        status = 429 if code in {"ThrottlingException", "TooManyRequestsException"} else status
+    if status != 429 and type(exc).__name__ not in {"RateLimitError", "ThrottlingException"}:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return min(2.0**attempt, 30.0)
+
+
+def _limits_for(provider: str, model: str) -> dict[str, float]:
+    """Configured limits for a provider/model, with ``LLM_RATE_LIMITS`` overrides."""
+    limits = {
+        "rpm": settings.llm_rate_limit_rpm,
+        "tpm": settings.llm_rate_limit_tpm,
+        "concurrency": settings.llm_max_concurrency,
+    }
+    overrides = json.loads(settings.llm_rate_limits or "{}")
+    limits.update(overrides.get(provider, {}))
+    limits.update(overrides.get(f"{provider}:{model}", {}))
+    return limits
+
+
+def _get_store() -> redis.Redis | None:
+    """The Redis client shared rate buckets live in, or None for per-process buckets."""
+    global _store
+    if settings.llm_rate_limit_backend != "redis":
+        return None
+    if _store is None:
+        _store = redis.Redis.from_url(settings.llm_rate_limit_redis_url or settings.broker_url)
+    return _store
+
+
+_limiters_lock = threading.Lock()
+_limiters_pid: int | None = None
+_limiters: dict[tuple[str, str], RateLimiter] = {}
+_store: redis.Redis | None = None
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """Return this process's shared limiter for a provider/model."""
+    global _limiters_pid, _store
+    with _limiters_lock:
+        if _limiters_pid != os.getpid():
+            # A forked child must not reuse the parent's Redis connections.
+            _limiters_pid, _store = os.getpid(), None
+            _limiters.clear()
+        limiter = _limiters.get((provider, model))
+        if limiter is None:
+            limits = _limits_for(provider, model)
+            limiter = _limiters[(provider, model)] = RateLimiter(
+                f"{provider}:{model}",
+                requests_per_minute=float(limits.get("rpm", 0)),
+                tokens_per_minute=float(limits.get("tpm", 0)),
+                max_concurrency=int(limits.get("concurrency", 0)),
+                store=_get_store(),
+            )
+        return limiter
@@ -2,14 +2,24 @@
 from __future__ import annotations
 
 import asyncio
+import atexit
 import json
-from typing import Any
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Coroutine, TypeVar
 
 import asyncpg
 import redis
 from pydantic import BaseModel
 
 from app.core.config import settings
+from app.utils.event_loop import BackgroundLoop
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
 
 
 class TaskLog(BaseModel):
@@ -18,13 +28,171 @@ class TaskLog(BaseModel):
     status: str
     error: str | None = None
     metadata: dict[str, Any] | None = None
+    document_id: str | None = None
+    created_at: datetime | None = None
+
+
+class PostgresPool:
+    """Bounded, health-checked asyncpg pool owned by the background loop."""
+
+    def __init__(self, dsn: str) -> None:
+        self._dsn = dsn
+        self._pool: asyncpg.Pool | None = None
+        self._lock: asyncio.Lock | None = None
+        self._last_check = 0.0
+        self._schema_ready = False
+
+    async def get(self) -> asyncpg.Pool:
+        """Return the live pool, creating, health-checking and migrating it as needed."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._pool is None:
+                self._pool = await self._create()
+            elif time.monotonic() - self._last_check >= settings.postgres_health_interval:
+                await self._health_check()
+            if not self._schema_ready:
+                async with self._pool.acquire() as conn:
+                    await _ensure_schema(conn)
+                self._schema_ready = True
+            return self._pool
+
+    async def close(self) -> None:
+        """Close all pooled connections."""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def _create(self) -> asyncpg.Pool:
+        """Open a new pool bounded by the configured sizes."""
+        pool = await asyncpg.create_pool(
+            self._dsn,
+            min_size=settings.postgres_pool_min_size,
+            max_size=settings.postgres_pool_max_size,
+            max_inactive_connection_lifetime=settings.postgres_pool_max_idle,
+            command_timeout=settings.postgres_command_timeout,
+        )
+        self._last_check = time.monotonic()
+        logger.info(
+            "postgres_pool_created pid=%s min_size=%s max_size=%s",
+            os.getpid(),
+            settings.postgres_pool_min_size,
+            settings.postgres_pool_max_size,
+        )
+        return pool
+
+    async def _health_check(self) -> None:
+        """Ping the pool and rebuild it if the server stopped answering."""
+        try:
+            await self._pool.fetchval("SELECT 1")
+        except (asyncpg.PostgresError, OSError, asyncio.TimeoutError) as exc:
+            logger.warning("postgres_pool_unhealthy error=%s", exc)
+            self._pool.terminate()
+            self._pool = await self._create()
+        self._last_check = time.monotonic()
+
+
+_registry_lock = threading.Lock()
+_owner_pid: int | None = None
+_background: BackgroundLoop | None = None
+_pools: dict[str, PostgresPool] = {}
+
+
+def _get_pool(dsn: str) -> tuple[BackgroundLoop, PostgresPool]:
+    """Return this process's background loop and the pool for a DSN."""
+    global _owner_pid, _background, _pools
+    with _registry_lock:
+        if _owner_pid != os.getpid():
+            # Fresh process or forked Celery child: inherited loop threads and sockets are unusable.
+            _owner_pid = os.getpid()
+            _background = BackgroundLoop("postgres-loop")
+            _pools = {}
+        pool = _pools.get(dsn)
+        if pool is None:
+            pool = _pools[dsn] = PostgresPool(dsn)
+        return _background, pool
+
+
+def close_postgres_pools() -> None:
+    """Close every pool owned by this process and stop its background loop."""
+    global _owner_pid, _background, _pools
+    with _registry_lock:
+        if _owner_pid != os.getpid() or _background is None:
+            return
+        for pool in _pools.values():
+            try:
+                _background.submit(pool.close()).result(timeout=10)
+            except Exception as exc:
+                logger.warning("postgres_pool_close_failed error=%s", exc)
+        _background.stop()
+        _owner_pid, _background, _pools = None, None, {}
+
+
+atexit.register(close_postgres_pools)
+
+
+async def _ensure_schema(conn: asyncpg.Connection) -> None:
+    """Create required tables; runs once per pool per process."""
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS task_logs (
+            id BIGSERIAL PRIMARY KEY,
+            task_id TEXT NOT NULL,
+            agent TEXT NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            metadata JSONB,
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        """
+    )
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pipeline_state (
+            document_id TEXT PRIMARY KEY,
+            last_completed_step TEXT,
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        """
+    )
+    await conn.execute(
+        "ALTER TABLE pipeline_state ADD COLUMN IF NOT EXISTS completed_steps TEXT[] NOT NULL DEFAULT '{}'"
+    )
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stage_results (
+            document_id TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            stage_version TEXT NOT NULL,
+            payload JSONB NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            PRIMARY KEY (document_id, stage, stage_version)
+        );
+        """
+    )
+    await conn.execute("ALTER TABLE task_logs ADD COLUMN IF NOT EXISTS document_id TEXT")
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS task_logs_document_id_idx ON task_logs (document_id, agent, created_at DESC)"
+    )
+
+
+class PipelineProgress(BaseModel):
+    completed_steps: list[str] = []
+    # Rows written before per-stage tracking only carry the last step of the old linear order.
+    last_completed_step: str | None = None
+    updated_at: datetime | None = None
+
+
+class StageResult(BaseModel):
+    stage: str
+    stage_version: str
+    payload: dict[str, Any]
 
 
 class PostgresClient:
     def __init__(self, dsn: str | None = None) -> None:
         """Create a Postgres client for task logs and pipeline state."""
         self._dsn = dsn or settings.postgres_dsn
-        self._schema_ready = False
 
     def save_task_log(self, log: TaskLog) -> None:
         """Persist a task log entry."""
@@ -38,92 +206,247 @@ class PostgresClient:
         """Load the last completed step for a document, if any."""
         return self._run(self._load_pipeline_state(document_id))
 
-    def _run(self, coro):
-        """Run an async Postgres operation from a sync context."""
+    def mark_step_completed(self, document_id: str, step: str) -> None:
+        """Record one pipeline stage as completed for a document."""
+        self._run(self._mark_step_completed(document_id, step))
+
+    def load_pipeline_progress(self, document_id: str) -> PipelineProgress:
+        """Load which pipeline stages have completed for a document."""
+        return self._run(self._load_pipeline_progress(document_id))
+
+    def save_stage_result(self, document_id: str, result: StageResult) -> None:
+        """Persist one stage's output so retries and resumes can reuse it."""
+        self._run(self._save_stage_result(document_id, result))
+
+    def load_stage_results(self, document_id: str) -> list[StageResult]:
+        """Load every stored stage output for a document, oldest first."""
+        return self._run(self._load_stage_results(document_id))
+
+    def load_progress_many(self, document_ids: list[str]) -> dict[str, PipelineProgress]:
+        """Load pipeline progress for several documents in one query."""
+        return self._run(self._load_progress_many(document_ids))
+
+    def load_latest_task_logs(self, document_ids: list[str]) -> dict[str, list[TaskLog]]:
+        """Latest task log per (document, agent) for several documents in one query."""
+        return self._run(self._load_latest_task_logs(document_ids))
+
+    async def asave_task_log(self, log: TaskLog) -> None:
+        """Persist a task log entry from async code."""
+        await self._submit(self._save_task_log(log))
+
+    async def aupdate_pipeline_state(self, document_id: str, step: str) -> None:
+        """Persist the latest pipeline step from async code."""
+        await self._submit(self._update_pipeline_state(document_id, step))
+
+    async def aload_pipeline_state(self, document_id: str) -> str | None:
+        """Load the last completed step from async code."""
+        return await self._submit(self._load_pipeline_state(document_id))
+
+    async def amark_step_completed(self, document_id: str, step: str) -> None:
+        """Record a completed stage from async code."""
+        await self._submit(self._mark_step_completed(document_id, step))
+
+    async def aload_pipeline_progress(self, document_id: str) -> PipelineProgress:
+        """Load per-stage completion from async code."""
+        return await self._submit(self._load_pipeline_progress(document_id))
+
+    async def asave_stage_result(self, document_id: str, result: StageResult) -> None:
+        """Persist a stage output from async code."""
+        await self._submit(self._save_stage_result(document_id, result))
+
+    async def aload_stage_results(self, document_id: str) -> list[StageResult]:
+        """Load stored stage outputs from async code."""
+        return await self._submit(self._load_stage_results(document_id))
+
+    def _run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run an async Postgres operation on the background loop and wait for it."""
         try:
-            loop = asyncio.get_running_loop()
+            asyncio.get_running_loop()
         except RuntimeError:
-            return asyncio.run(coro)
+            background, _ = _get_pool(self._dsn)
+            return background.submit(coro).result()
+        coro.close()
         raise RuntimeError("PostgresClient used from an active event loop; use async methods instead.")
 
-    async def _connect(self) -> asyncpg.Connection:
-        """Connect to Postgres and ensure required tables exist."""
-        conn = await asyncpg.connect(self._dsn)
-        if not self._schema_ready:
-            await self._ensure_schema(conn)
-            self._schema_ready = True
-        return conn
+    async def _submit(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Await an operation on the background loop from any other event loop."""
+        background, _ = _get_pool(self._dsn)
+        return await asyncio.wrap_future(background.submit(coro))
 
-    async def _ensure_schema(self, conn: asyncpg.Connection) -> None:
-        await conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS task_logs (
-                id BIGSERIAL PRIMARY KEY,
-                task_id TEXT NOT NULL,
-                agent TEXT NOT NULL,
-                status TEXT NOT NULL,
-                error TEXT,
-                metadata JSONB,
-                created_at TIMESTAMPTZ DEFAULT NOW()
-            );
-            """
-        )
-        await conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS pipeline_state (
-                document_id TEXT PRIMARY KEY,
-                last_completed_step TEXT,
-                updated_at TIMESTAMPTZ DEFAULT NOW()
-            );
-            """
-        )
+    async def _pool(self) -> asyncpg.Pool:
+        """Return the process-wide pool for this DSN (background loop only)."""
+        _, pool = _get_pool(self._dsn)
+        return await pool.get()
 
     async def _save_task_log(self, log: TaskLog) -> None:
         """Insert a task log record into Postgres."""
-        conn = await self._connect()
-        try:
-            await conn.execute(
-                """
-                INSERT INTO task_logs (task_id, agent, status, error, metadata)
-                VALUES ($1, $2, $3, $4, $5)
-                """,
-                log.task_id,
-                log.agent,
-                log.status,
-                log.error,
-                json.dumps(log.metadata) if log.metadata is not None else None,
-            )
-        finally:
-            await conn.close()
+        pool = await self._pool()
+        await pool.execute(
+            """
+            INSERT INTO task_logs (task_id, agent, status, error, metadata, document_id)
+            VALUES ($1, $2, $3, $4, $5, $6)
+            """,
+            log.task_id,
+            log.agent,
+            log.status,
+            log.error,
+            json.dumps(log.metadata) if log.metadata is not None else None,
+            log.document_id,
+        )
 
     async def _update_pipeline_state(self, document_id: str, step: str) -> None:
         """Upsert the latest pipeline step into Postgres."""
-        conn = await self._connect()
-        try:
-            await conn.execute(
-                """
-                INSERT INTO pipeline_state (document_id, last_completed_step)
-                VALUES ($1, $2)
-                ON CONFLICT (document_id)
-                DO UPDATE SET last_completed_step = EXCLUDED.last_completed_step, updated_at = NOW()
-                """,
-                document_id,
-                step,
-            )
-        finally:
-            await conn.close()
+        pool = await self._pool()
+        await pool.execute(
+            """
+            INSERT INTO pipeline_state (document_id, last_completed_step)
+            VALUES ($1, $2)
+            ON CONFLICT (document_id)
+            DO UPDATE SET last_completed_step = EXCLUDED.last_completed_step, updated_at = NOW()
+            """,
+            document_id,
+            step,
+        )
 
     async def _load_pipeline_state(self, document_id: str) -> str | None:
         """Fetch the latest pipeline step from Postgres."""
-        conn = await self._connect()
-        try:
-            row = await conn.fetchrow(
-                "SELECT last_completed_step FROM pipeline_state WHERE document_id = $1",
-                document_id,
+        pool = await self._pool()
+        row = await pool.fetchrow(
+            "SELECT last_completed_step FROM pipeline_state WHERE document_id = $1",
+            document_id,
+        )
+        return row["last_completed_step"] if row else None
+
+    async def _mark_step_completed(self, document_id: str, step: str) -> None:
+        """Add a stage to the document's completed set (idempotent)."""
+        pool = await self._pool()
+        await pool.execute(
+            """
+            INSERT INTO pipeline_state (document_id, last_completed_step, completed_steps)
+            VALUES ($1, $2::text, ARRAY[$2::text])
+            ON CONFLICT (document_id)
+            DO UPDATE SET
+                completed_steps = CASE
+                    WHEN $2 = ANY(pipeline_state.completed_steps) THEN pipeline_state.completed_steps
+                    ELSE array_append(pipeline_state.completed_steps, $2)
+                END,
+                last_completed_step = EXCLUDED.last_completed_step,
+                updated_at = NOW()
+            """,
+            document_id,
+            step,
+        )
+
+    async def _load_pipeline_progress(self, document_id: str) -> PipelineProgress:
+        """Fetch completed stages (and the legacy last step) from Postgres."""
+        pool = await self._pool()
+        row = await pool.fetchrow(
+            "SELECT completed_steps, last_completed_step FROM pipeline_state WHERE document_id = $1",
+            document_id,
+        )
+        if row is None:
+            return PipelineProgress()
+        return PipelineProgress(
+            completed_steps=list(row["completed_steps"] or []),
+            last_completed_step=row["last_completed_step"],
+        )
+
+    async def _save_stage_result(self, document_id: str, result: StageResult) -> None:
+        """Upsert a stage output keyed by (document, stage, stage_version)."""
+        pool = await self._pool()
+        await pool.execute(
+            """
+            INSERT INTO stage_results (document_id, stage, stage_version, payload)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (document_id, stage, stage_version)
+            DO UPDATE SET payload = EXCLUDED.payload, created_at = NOW()
+            """,
+            document_id,
+            result.stage,
+            result.stage_version,
+            json.dumps(result.payload, default=str),
+        )
+
+    async def _load_stage_results(self, document_id: str) -> list[StageResult]:
+        """Fetch stored stage outputs for a document."""
+        pool = await self._pool()
+        rows = await pool.fetch(
+            """
+            SELECT stage, stage_version, payload FROM stage_results
+            WHERE document_id = $1 ORDER BY created_at
+            """,
+            document_id,
+        )
+        return [
+            StageResult(stage=row["stage"], stage_version=row["stage_version"], payload=json.loads(row["payload"]))
+            for row in rows
+        ]
+
+    async def _load_progress_many(self, document_ids: list[str]) -> dict[str, PipelineProgress]:
+        """Fetch pipeline_state rows for a set of documents."""
+        pool = await self._pool()
+        rows = await pool.fetch(
+            """
+            SELECT document_id, completed_steps, last_completed_step, updated_at
+            FROM pipeline_state WHERE document_id = ANY($1::text[])
+            """,
+            document_ids,
+        )
+        return {
+            row["document_id"]: PipelineProgress(
+                completed_steps=list(row["completed_steps"] or []),
+                last_completed_step=row["last_completed_step"],
+                updated_at=row["updated_at"],
             )
-            return row["last_completed_step"] if row else None
-        finally:
-            await conn.close()
+            for row in rows
+        }
+
+    async def _load_latest_task_logs(self, document_ids: list[str]) -> dict[str, list[TaskLog]]:
+        """Fetch the newest task_logs row per (document, agent)."""
+        pool = await self._pool()
+        rows = await pool.fetch(
+            """
+            SELECT DISTINCT ON (document_id, agent) document_id, task_id, agent, status, error, created_at
+            FROM task_logs WHERE document_id = ANY($1::text[])
+            ORDER BY document_id, agent, created_at DESC, id DESC
+            """,
+            document_ids,
+        )
+        logs: dict[str, list[TaskLog]] = {}
+        for row in rows:
+            logs.setdefault(row["document_id"], []).append(TaskLog(**dict(row)))
+        return logs
+
+
+class DocumentClaim(BaseModel):
+    document_id: str | None = None
+    state: str
+
+
+_RELEASE_CLAIM = """
+local raw = redis.call('GET', KEYS[1])
+if raw then
+    local ok, claim = pcall(cjson.decode, raw)
+    if ok and type(claim) == 'table' and claim['document_id'] == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+end
+return 0
+"""
+
+
+# Set the done marker if the hash is unclaimed (our claim expired) or still claimed by ARGV[1].
+_MARK_CLAIM_DONE = """
+local raw = redis.call('GET', KEYS[1])
+if raw then
+    local ok, claim = pcall(cjson.decode, raw)
+    if not ok or type(claim) ~= 'table' or claim['document_id'] ~= ARGV[1] then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[2])
+return 1
+"""
 
 
 class RedisClient:
@@ -131,10 +454,57 @@ class RedisClient:
         """Create a Redis client for deduplication."""
         self._client = redis.Redis.from_url(url or settings.broker_url)
 
-    def cache_document_hash(self, document_hash: str) -> None:
-        """Store a document hash to mark it as processed."""
-        self._client.set(document_hash, 1)
+    def claim_document_hash(self, document_hash: str, document_id: str) -> DocumentClaim | None:
+        """Atomically claim a hash as in-flight; return the existing claim if another owns it."""
+        value = json.dumps({"document_id": document_id, "state": "in_flight"})
+        for _ in range(2):
+            if self._client.set(document_hash, value, nx=True, ex=settings.dedup_claim_ttl):
+                return None
+            existing = self.get_document_claim(document_hash)
+            if existing is not None:
+                return existing
+            # The previous claim expired between SET NX and GET; try once more.
+        return self.get_document_claim(document_hash)
+
+    def get_document_claim(self, document_hash: str) -> DocumentClaim | None:
+        """Return who claimed a hash and whether processing finished."""
+        raw = self._client.get(document_hash)
+        if raw is None:
+            return None
+        try:
+            return DocumentClaim(**json.loads(raw))
+        except (ValueError, TypeError):
+            # Hashes cached before claims existed hold a bare marker.
+            return DocumentClaim(state="done")
+
+    def mark_document_hash_done(self, document_hash: str, document_id: str) -> bool:
+        """Promote our claim to done (completed hashes never expire); never overwrite another owner's claim."""
+        value = json.dumps({"document_id": document_id, "state": "done"})
+        if self._client.eval(_MARK_CLAIM_DONE, 1, document_hash, document_id, value):
+            return True
+        logger.warning("dedup_claim_lost document_hash=%s document_id=%s", document_hash, document_id)
+        return False
+
+    def save_batch(self, batch_id: str, members: list[dict[str, Any]]) -> None:
+        """Record which documents belong to an ingestion batch."""
+        self._client.set(f"batch:{batch_id}", json.dumps(members), ex=settings.batch_ttl)
+
+    def mark_documents_queued(self, document_ids: list[str]) -> None:
+        """Remember enqueued documents so status lookups can tell them from unknown ids."""
+        pipe = self._client.pipeline(transaction=False)
+        for document_id in document_ids:
+            pipe.set(f"queued:{document_id}", 1, ex=settings.batch_ttl)
+        pipe.execute()
+
+    def is_document_queued(self, document_id: str) -> bool:
+        """Whether a document was enqueued within the last ``BATCH_TTL`` seconds."""
+        return bool(self._client.exists(f"queued:{document_id}"))
+
+    def load_batch(self, batch_id: str) -> list[dict[str, Any]] | None:
+        """Return a batch's members, or None when unknown or expired."""
+        raw = self._client.get(f"batch:{batch_id}")
+        return json.loads(raw) if raw is not None else None
 
-    def has_document_hash(self, document_hash: str) -> bool:
-        """Check whether a document hash already exists."""
-        return bool(self._client.exists(document_hash))
+    def release_document_hash(self, document_hash: str, document_id: str) -> bool:
+        """Drop a claim only if ``document_id`` still owns it."""
+        return bool(self._client.eval(_RELEASE_CLAIM, 1, document_hash, document_id))
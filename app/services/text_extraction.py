@@ -0,0 +1,321 @@
+"""Text extraction for uploaded binary formats (PDF, DOCX), cached by document digest."""
+from __future__ import annotations
+
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from xml.etree import ElementTree
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.services.document_store import DocumentStore, get_document_store
+from app.utils.document import DocumentHandle
+
+logger = logging.getLogger(__name__)
+
+# Bump when extraction output changes; cached artifacts of older versions are ignored.
+EXTRACTOR_VERSION = "2"
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_TRAILING_SPACE_RE = re.compile(r"[ \t]+\n")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+# Soft hyphens only mark where a word may break; real hyphens ("non-compete") are kept.
+_SOFT_HYPHEN_RE = re.compile(r"\u00ad(?:\r?\n)?")
+
+
+class UnsupportedDocumentError(ValueError):
+    def __init__(self, document_format: str) -> None:
+        """Raised for uploads whose format has no text extractor."""
+        super().__init__(f"Unsupported document format: {document_format}")
+        self.document_format = document_format
+
+    def __reduce__(self):
+        return type(self), (self.document_format,)
+
+
+class DocumentExtractionError(ValueError):
+    def __init__(self, document_format: str, reason: str) -> None:
+        """Raised for a supported format that cannot be parsed (corrupt, password-protected, too slow)."""
+        super().__init__(f"Could not extract text from {document_format} document: {reason}")
+        self.document_format = document_format
+        self.reason = reason
+
+    def __reduce__(self):
+        # Rebuilt from its own arguments when raised in the extraction pool.
+        return type(self), (self.document_format, self.reason)
+
+
+class PageSpan(BaseModel):
+    page: int
+    start: int
+    end: int
+
+
+class ExtractedText(BaseModel):
+    sha256: str = ""
+    format: str
+    text: str
+    # Character range of each page in ``text`` (one span for formats without pages).
+    pages: list[PageSpan] = []
+    version: str = EXTRACTOR_VERSION
+
+    def page_at(self, offset: int) -> int | None:
+        """Page number containing a character offset."""
+        return next((span.page for span in self.pages if span.start <= offset < span.end), None)
+
+
+def detect_format(head: bytes) -> str:
+    """Classify a document by its leading bytes: ``pdf``, ``zip``, ``ole``, ``binary`` or ``text``."""
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        # Legacy .doc/.xls containers.
+        return "ole"
+    if b"\x00" in head[:1024]:
+        return "binary"
+    return "text"
+
+
+def normalize_text(text: str) -> str:
+    """NFKC-normalize, drop control characters and collapse trailing spaces and blank-line runs."""
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL_RE.sub("", text)
+    text = _TRAILING_SPACE_RE.sub("\n", text)
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def _join_pages(document_format: str, pages: list[str]) -> ExtractedText:
+    """Join normalized pages with blank lines, recording each page's offsets."""
+    parts: list[str] = []
+    spans: list[PageSpan] = []
+    offset = 0
+    for number, page in enumerate(pages, start=1):
+        if parts:
+            parts.append("\n\n")
+            offset += 2
+        parts.append(page)
+        spans.append(PageSpan(page=number, start=offset, end=offset + len(page)))
+        offset += len(page)
+    return ExtractedText(format=document_format, text="".join(parts), pages=spans)
+
+
+def _extract_pdf(data: bytes) -> ExtractedText:
+    """Page-by-page PDF text via pypdf, re-joining words split at soft hyphens."""
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PyPdfError
+    except ImportError as exc:
+        raise RuntimeError("PDF extraction requires the 'pypdf' package.") from exc
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        # Owner-password-only PDFs open with an empty user password; others need the real one.
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise DocumentExtractionError("pdf", "encrypted with a user password")
+        pages: list[str] = []
+        remaining = settings.extraction_max_chars
+        for page in reader.pages:
+            text = normalize_text(_SOFT_HYPHEN_RE.sub("", page.extract_text() or ""))[:remaining]
+            pages.append(text)
+            remaining -= len(text)
+            if remaining <= 0:
+                break
+    except PyPdfError as exc:
+        raise DocumentExtractionError("pdf", f"{type(exc).__name__}: {exc}") from exc
+    return _join_pages("pdf", pages)
+
+
+def _extract_docx(data: bytes) -> ExtractedText:
+    """Paragraph text of a DOCX body, split into pages at explicit and last-rendered page breaks."""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        pages: list[str] = []
+        current: list[str] = []
+        length = 0
+        with archive.open("word/document.xml") as body:
+            for event, element in ElementTree.iterparse(body, events=("start", "end")):
+                tag = element.tag
+                if event == "start":
+                    if tag == f"{_W}lastRenderedPageBreak" or (
+                        tag == f"{_W}br" and element.get(f"{_W}type") == "page"
+                    ):
+                        pages.append("".join(current))
+                        current = []
+                    continue
+                if tag == f"{_W}t":
+                    current.append(element.text or "")
+                    length += len(element.text or "")
+                elif tag == f"{_W}tab":
+                    current.append("\t")
+                elif tag in {f"{_W}br", f"{_W}cr"} and element.get(f"{_W}type") != "page":
+                    current.append("\n")
+                elif tag == f"{_W}p":
+                    current.append("\n\n")
+                    element.clear()
+                    if length >= settings.extraction_max_chars:
+                        break
+        pages.append("".join(current))
+    normalized = [normalize_text(page) for page in pages]
+    return _join_pages("docx", normalized)
+
+
+# What parsers raise on truncated or malformed input, beyond their own error types.
+_PARSE_ERRORS = (
+    ValueError,
+    KeyError,
+    IndexError,
+    TypeError,
+    AttributeError,
+    EOFError,
+    zipfile.BadZipFile,
+    ElementTree.ParseError,
+)
+
+
+def _is_docx(path: Path) -> bool:
+    """Whether a zip archive is a Word document (reads only the central directory)."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return "word/document.xml" in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+
+def extract_file(path: str, document_format: str) -> ExtractedText:
+    """Parse a stored binary document; runs in the extraction process pool.
+
+    Malformed input raises ``DocumentExtractionError``: it would fail the same way on every retry.
+    """
+    extractors = {"pdf": _extract_pdf, "docx": _extract_docx}
+    if document_format not in extractors:
+        raise UnsupportedDocumentError(document_format)
+    data = Path(path).read_bytes()
+    try:
+        return extractors[document_format](data)
+    except DocumentExtractionError:
+        raise
+    except _PARSE_ERRORS as exc:
+        raise DocumentExtractionError(document_format, f"{type(exc).__name__}: {exc}") from exc
+
+
+_pool_lock = threading.Lock()
+_pool_pid: int | None = None
+_pool: ProcessPoolExecutor | None = None
+_pool_disabled = False
+
+
+def _get_pool() -> ProcessPoolExecutor | None:
+    """This process's extraction pool, or None when parsing should run inline."""
+    global _pool_pid, _pool, _pool_disabled
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            _pool_pid, _pool, _pool_disabled = os.getpid(), None, False
+        if _pool_disabled or settings.extraction_workers <= 0:
+            return None
+        if _pool is None:
+            # Spawned, not forked: the worker process is multi-threaded.
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.extraction_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _disable_pool(pool: ProcessPoolExecutor) -> None:
+    """Fall back to inline parsing for the rest of this process's life (unless ``pool`` was recycled)."""
+    global _pool, _pool_disabled
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        pool.shutdown(wait=False, cancel_futures=True)
+        _pool, _pool_disabled = None, True
+
+
+def _recycle_pool(pool: ProcessPoolExecutor) -> None:
+    """Replace a pool whose worker is stuck on a document; the next parse starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    # Shutting down does not stop a running parse; terminate the pool's processes as well.
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def close_extraction_pool() -> None:
+    """Shut down this process's extraction pool, if any."""
+    global _pool_pid, _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool_pid, _pool = None, None
+
+
+def _parse(path: Path, document_format: str) -> ExtractedText:
+    """Parse in the process pool, or inline where child processes cannot be started."""
+    pool = _get_pool()
+    if pool is not None:
+        try:
+            future = pool.submit(extract_file, str(path), document_format)
+        except (AssertionError, BrokenProcessPool, OSError) as exc:
+            # Daemonic prefork children may not start processes of their own.
+            logger.warning("extraction_pool_unavailable error=%s", exc)
+            _disable_pool(pool)
+        else:
+            try:
+                return future.result(timeout=settings.extraction_timeout)
+            except FutureTimeoutError as exc:
+                logger.warning("extraction_timeout path=%s timeout=%s", path, settings.extraction_timeout)
+                _recycle_pool(pool)
+                raise DocumentExtractionError(
+                    document_format, f"parsing took longer than {settings.extraction_timeout}s"
+                ) from exc
+            except BrokenProcessPool as exc:
+                # Also raised for documents in flight when another thread recycled the pool.
+                logger.warning("extraction_pool_broken error=%s", exc)
+                _disable_pool(pool)
+    return extract_file(str(path), document_format)
+
+
+def get_extracted_text(document: DocumentHandle, store: DocumentStore | None = None) -> ExtractedText:
+    """Normalized text for a document, parsed once per SHA-256 and cached in the document store.
+
+    Plain text is decoded in place; binary formats are parsed off the task thread.
+    """
+    document_format = detect_format(bytes(document.raw[:1024]))
+    if document_format == "zip" and _is_docx(document.path):
+        document_format = "docx"
+    if document_format == "text":
+        text = document.text
+        return ExtractedText(
+            sha256=document.sha256, format="text", text=text, pages=[PageSpan(page=1, start=0, end=len(text))]
+        )
+    if document_format not in {"pdf", "docx"}:
+        raise UnsupportedDocumentError(document_format)
+    store = store or get_document_store()
+    artifact = f"text-v{EXTRACTOR_VERSION}.json"
+    cached = store.load_artifact(document.sha256, artifact)
+    if cached is not None:
+        return ExtractedText.model_validate_json(cached)
+    extracted = _parse(document.path, document_format).model_copy(update={"sha256": document.sha256})
+    store.save_artifact(document.sha256, artifact, extracted.model_dump_json().encode("utf-8"))
+    logger.info(
+        "text_extracted sha256=%s format=%s pages=%s chars=%s",
+        document.sha256,
+        extracted.format,
+        len(extracted.pages),
+        len(extracted.text),
+    )
+    return extracted
@@ -0,0 +1,8 @@
+"""Celery application shared by the API (producer) and the worker."""
+from __future__ import annotations
+
+from celery import Celery
+
+from app.core.config import settings
+
+celery_app = Celery("lexiai", broker=settings.broker_url, backend=settings.backend_url)
@@ -2,122 +2,361 @@
 from __future__ import annotations
 
 import logging
+import os
+import threading
+from typing import Callable
 
-from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 
-from app.agents.clause_extractor import ClauseExtractionAgent
-from app.agents.contract_type import ContractTypeAgent
-from app.agents.deduplicator import DeduplicationAgent
-from app.agents.legal_classifier import LegalClassifierAgent
-from app.agents.ner_agent import NerAgent
+from app.agents.base import AgentResult
+from app.agents.registry import AGENT_CLASSES, get_agent
 from app.core.config import settings
-from app.services.elastic import ElasticClient
-from app.services.storage import PostgresClient, RedisClient, TaskLog
+from app.core.metrics import current_span, mark_worker_process_dead, stage_span, start_worker_metrics_server
+from app.mcp.client import shutdown_mcp_sessions
+from app.services.document_store import get_document_store
+from app.services.elastic import ElasticClient, build_doc_id, close_elastic_client, get_elastic_client
+from app.services.llm_cache import get_llm_cache
+from app.services.storage import PostgresClient, RedisClient, StageResult, TaskLog, close_postgres_pools
+from app.services.text_extraction import (
+    DocumentExtractionError,
+    UnsupportedDocumentError,
+    close_extraction_pool,
+    get_extracted_text,
+)
+from app.tasks.celery_app import celery_app
+from app.tasks.pipeline import GATE_STAGES, PIPELINE_DAG, completed_steps
+from app.tasks.signatures import PROCESS_DOCUMENT_TASK
+from app.utils.cache import cache_stats
+from app.utils.dag import run_dag
+from app.utils.document import DocumentHandle
 
-celery_app = Celery("lexiai", broker=settings.broker_url, backend=settings.backend_url)
 logger = logging.getLogger(__name__)
 
-PIPELINE_STEPS = [
-    "classification",
-    "deduplication",
-    "contract_type",
-    "clauses",
-    "ner",
-]
 
+@worker_init.connect
+def _start_metrics_server(**_kwargs) -> None:
+    """Expose worker metrics on WORKER_METRICS_PORT when configured."""
+    if settings.worker_metrics_port:
+        start_worker_metrics_server(settings.worker_metrics_port)
+
+
+@worker_process_shutdown.connect
+def _close_worker_resources(**_kwargs) -> None:
+    """Release worker-lifetime connection pools when a worker process exits."""
+    close_elastic_client()
+    close_postgres_pools()
+    shutdown_mcp_sessions()
+    close_extraction_pool()
+    mark_worker_process_dead(os.getpid())
 
-def _step_index(step: str | None) -> int:
-    """Return a stable index for pipeline steps, or -1 when unset."""
-    if step is None:
-        return -1
-    return PIPELINE_STEPS.index(step)
+
+def _rehydrate(context: dict, stage: str, stored: dict[tuple[str, str], StageResult], version: str) -> None:
+    """Restore what a completed stage contributed to the context, preferring this agent version's output."""
+    result = stored.get((stage, version)) or next(
+        (candidate for (name, _), candidate in reversed(stored.items()) if name == stage), None
+    )
+    if result is None:
+        return
+    if stage == "contract_type":
+        context.update(result.payload)
+    elif stage == "deduplication" and result.payload.get("near_duplicate_of"):
+        context["near_duplicate_of"] = result.payload["near_duplicate_of"]
+
+
+def _without_offsets(source: dict) -> dict:
+    """An indexed clause or entity without its source-document character offsets."""
+    return {key: value for key, value in source.items() if key not in {"start_offset", "end_offset"}}
+
+
+def _reuse_indexed_results(elastic: ElasticClient, source_document_id: str, context: dict) -> bool:
+    """Copy a near-duplicate's indexed clauses and entities to this document instead of re-extracting.
+
+    Copies keep the source's text but not its character offsets, which do not apply to
+    this document; ``source_document_id`` records where they came from.
+    """
+    document_id = context["document_id"]
+    clauses = (
+        elastic.fetch_documents("legal_clauses_index", source_document_id)
+        if context["extraction_mode"] == "all"
+        else []
+    )
+    entities = elastic.fetch_documents("legal_ner_index", source_document_id)
+    if not clauses and not entities:
+        return False
+    if clauses and clauses[0].get("contract_type"):
+        context.setdefault("contract_type", clauses[0]["contract_type"])
+    provenance = {"document_id": document_id, "source_document_id": source_document_id}
+    if context["extraction_mode"] == "all":
+        # An earlier attempt may have indexed extracted clauses under ids the copies do not reuse.
+        elastic.delete_documents("legal_clauses_index", document_id)
+    for ordinal, clause in enumerate(clauses):
+        elastic.index(
+            "legal_clauses_index",
+            {**_without_offsets(clause), **context, **provenance},
+            doc_id=build_doc_id(document_id, "clauses", ordinal),
+            owner=document_id,
+        )
+    for ordinal, entity in enumerate(entities):
+        elastic.index(
+            "legal_ner_index",
+            {**_without_offsets(entity), **provenance},
+            doc_id=build_doc_id(document_id, "ner", ordinal),
+            owner=document_id,
+        )
+    elastic.flush(owner=document_id)
+    logger.info(
+        "near_duplicate_reused document_id=%s source=%s clauses=%s entities=%s",
+        document_id,
+        source_document_id,
+        len(clauses),
+        len(entities),
+    )
+    return True
 
 
 @celery_app.task(
+    name=PROCESS_DOCUMENT_TASK,
     bind=True,
     autoretry_for=(Exception,),
     retry_kwargs={"max_retries": settings.max_retries, "countdown": settings.retry_countdown},
 )
-def process_legal_document(self, document_id: str, document_path: str, extraction_mode: str = "all") -> None:
+def process_legal_document(
+    self,
+    document_id: str,
+    document_path: str,
+    extraction_mode: str = "all",
+    document_hash: str | None = None,
+) -> None:
     """Run the contract intelligence pipeline for a single document."""
     postgres = PostgresClient()
     redis = RedisClient()
-    elastic = ElasticClient()
+    elastic = get_elastic_client()
+    # Celery's request is thread-local; stages run on worker threads.
+    task_id = self.request.id
 
     if extraction_mode not in {"all", "ner-only"}:
         raise ValueError("Invalid extraction_mode. Use 'all' or 'ner-only'.")
     context = {"document_id": document_id, "extraction_mode": extraction_mode}
-    current_step = postgres.load_pipeline_state(document_id)
+    context_lock = threading.Lock()
+    completed = completed_steps(postgres.load_pipeline_progress(document_id))
+    stored = {(result.stage, result.stage_version): result for result in postgres.load_stage_results(document_id)}
+    for stage in sorted(completed & AGENT_CLASSES.keys(), key=list(PIPELINE_DAG).index):
+        _rehydrate(context, stage, stored, get_agent(stage).version)
+    stop_reason: dict[str, str] = {}
 
     def log(agent: str, status: str, error: str | None = None) -> None:
         """Persist task execution status to Postgres."""
-        postgres.save_task_log(TaskLog(task_id=self.request.id, agent=agent, status=status, error=error))
+        span = current_span()
+        postgres.save_task_log(
+            TaskLog(
+                task_id=task_id,
+                agent=agent,
+                status=status,
+                error=error,
+                document_id=document_id,
+                metadata=span.metadata() if span is not None else None,
+            )
+        )
+
+    def snapshot() -> dict:
+        """Copy of the shared context; concurrent stages must not see it mid-update."""
+        with context_lock:
+            return dict(context)
+
+    def run_stage(stage: str, **options) -> AgentResult:
+        """Run a stage's agent, reusing its stored output for this agent version when present."""
+        agent = get_agent(stage)
+        previous = stored.get((stage, agent.version))
+        if previous is not None:
+            logger.info("stage_result_reused document_id=%s stage=%s version=%s", document_id, stage, agent.version)
+            return AgentResult(payload=previous.payload)
+        result = agent.run_document(document, snapshot(), **options)
+        postgres.save_stage_result(
+            document_id, StageResult(stage=stage, stage_version=agent.version, payload=result.payload)
+        )
+        return result
+
+    def finish(step: str) -> bool:
+        """Persist a stage as completed."""
+        postgres.mark_step_completed(document_id, step)
+        return True
 
     logger.info(
-        "pipeline_start document_id=%s task_id=%s mode=%s",
+        "pipeline_start document_id=%s task_id=%s mode=%s resumed_steps=%s",
         document_id,
-        self.request.id,
+        task_id,
         extraction_mode,
+        sorted(completed),
     )
 
-    if _step_index(current_step) < _step_index("classification"):
-        classifier = LegalClassifierAgent()
-        result = classifier.run(document_path, context)
-        log("legal_classifier", "completed")
-        if not result.payload.get("is_legal"):
-            logger.info("pipeline_stop_non_legal document_id=%s", document_id)
-            return
-        postgres.update_pipeline_state(document_id, "classification")
-        current_step = "classification"
-
-    if _step_index(current_step) < _step_index("deduplication"):
-        deduplicator = DeduplicationAgent(redis_client=redis)
-        dedup_result = deduplicator.run(document_path, context)
-        document_hash = dedup_result.payload.get("document_hash")
-        if dedup_result.payload.get("is_duplicate"):
-            log("deduplication", "duplicate")
-            logger.info("pipeline_stop_duplicate document_id=%s", document_id)
-            return
-        if document_hash:
-            redis.cache_document_hash(document_hash)
-        postgres.update_pipeline_state(document_id, "deduplication")
-        current_step = "deduplication"
-        log("deduplication", "completed")
-
-    if _step_index(current_step) < _step_index("contract_type"):
-        contract_type_agent = ContractTypeAgent()
-        contract_type = contract_type_agent.run(document_path, context)
-        context.update(contract_type.payload)
-        postgres.update_pipeline_state(document_id, "contract_type")
-        current_step = "contract_type"
-        log("contract_type", "completed")
-
-    if _step_index(current_step) < _step_index("clauses"):
-        if extraction_mode == "all":
-            clause_agent = ClauseExtractionAgent()
-            clauses = clause_agent.run(document_path, context).payload.get("clauses", [])
-            for clause in clauses:
-                elastic.index(
-                    "legal_clauses_index",
-                    {"document_id": document_id, **context, "clause_text": clause.get("text"), **clause},
-                )
-            log("clauses", "completed")
-            logger.info("clauses_indexed document_id=%s count=%s", document_id, len(clauses))
-        else:
-            log("clauses", "skipped")
-            logger.info("clauses_skipped document_id=%s", document_id)
-        postgres.update_pipeline_state(document_id, "clauses")
-        current_step = "clauses"
-
-    if _step_index(current_step) < _step_index("ner"):
-        ner_agent = NerAgent()
-        entities = ner_agent.run(document_path, context).payload.get("entities", [])
-        for entity in entities:
-            elastic.index("legal_ner_index", {"document_id": document_id, **entity})
-        postgres.update_pipeline_state(document_id, "ner")
-        current_step = "ner"
-        log("ner", "completed")
-        logger.info("ner_indexed document_id=%s count=%s", document_id, len(entities))
+    try:
+        with DocumentHandle.open(get_document_store().local_path(document_path)) as document:
+            document_hash = document_hash or document.sha256
+
+            def extraction() -> bool:
+                try:
+                    extracted = get_extracted_text(document)
+                except UnsupportedDocumentError as exc:
+                    log("extraction", "unsupported_format", error=str(exc))
+                    logger.info("pipeline_stop_unsupported document_id=%s error=%s", document_id, exc)
+                    stop_reason.setdefault("reason", "unsupported_format")
+                    return False
+                except DocumentExtractionError as exc:
+                    # Corrupt, password-protected or too slow to parse: a retry would fail the same way.
+                    log("extraction", "extraction_failed", error=str(exc))
+                    logger.warning("pipeline_stop_extraction_failed document_id=%s error=%s", document_id, exc)
+                    stop_reason.setdefault("reason", "extraction_failed")
+                    return False
+                document.use_text(extracted.text)
+                log("extraction", "completed")
+                return finish("extraction")
+
+            if "extraction" in completed:
+                # Later stages still read the extracted text; served from the artifact cache.
+                document.use_text(get_extracted_text(document).text)
+
+            def classification() -> bool:
+                result = run_stage("classification")
+                log("legal_classifier", "completed")
+                if not result.payload.get("is_legal"):
+                    logger.info("pipeline_stop_non_legal document_id=%s", document_id)
+                    stop_reason.setdefault("reason", "non_legal")
+                    return False
+                return finish("classification")
+
+            def deduplication() -> bool:
+                dedup_result = run_stage("deduplication")
+                if dedup_result.payload.get("is_duplicate"):
+                    log("deduplication", "duplicate")
+                    logger.info("pipeline_stop_duplicate document_id=%s", document_id)
+                    # Takes precedence: the hash belongs to the other document and must not be touched.
+                    stop_reason["reason"] = "duplicate"
+                    return False
+                near_duplicate_of = dedup_result.payload.get("near_duplicate_of")
+                if near_duplicate_of:
+                    with context_lock:
+                        context["near_duplicate_of"] = near_duplicate_of
+                    if settings.near_dup_action == "skip":
+                        log("deduplication", "near_duplicate")
+                        logger.info(
+                            "pipeline_stop_near_duplicate document_id=%s near_duplicate_of=%s",
+                            document_id,
+                            near_duplicate_of,
+                        )
+                        stop_reason.setdefault("reason", "near_duplicate")
+                        return False
+                finish("deduplication")
+                log("deduplication", "completed")
+                return True
+
+            def reuse_near_duplicate() -> None:
+                """Copy a near-duplicate's indexed results and mark the stages they replace as completed."""
+                near_duplicate_of = context.get("near_duplicate_of")
+                replaced = {"contract_type", "clauses", "ner"}
+                if not near_duplicate_of or settings.near_dup_action != "reuse" or replaced <= completed:
+                    return
+                if _reuse_indexed_results(elastic, near_duplicate_of, snapshot()):
+                    for step in sorted(replaced - completed):
+                        finish(step)
+                        completed.add(step)
+                    log("deduplication", "reused")
+
+            def contract_type() -> bool:
+                result = run_stage("contract_type")
+                with context_lock:
+                    context.update(result.payload)
+                log("contract_type", "completed")
+                return finish("contract_type")
+
+            def clauses() -> bool:
+                if extraction_mode != "all":
+                    log("clauses", "skipped")
+                    logger.info("clauses_skipped document_id=%s", document_id)
+                    return finish("clauses")
+                stage_context = snapshot()
+                indexed: set[str] = set()
+                # Clause ids follow arrival order, so an earlier attempt's clauses may not be overwritten.
+                elastic.delete_documents("legal_clauses_index", document_id)
+
+                def index_clause(clause: dict, ordinal: int | str) -> None:
+                    elastic.index(
+                        "legal_clauses_index",
+                        {"document_id": document_id, **stage_context, "clause_text": clause.get("text"), **clause},
+                        doc_id=build_doc_id(document_id, "clauses", clause.get("clause_id", ordinal)),
+                        owner=document_id,
+                    )
+
+                def index_streamed(clause: dict) -> None:
+                    index_clause(clause, clause["clause_id"])
+                    indexed.add(clause["clause_id"])
+
+                extracted = run_stage("clauses", on_clause=index_streamed).payload.get("clauses", [])
+                for ordinal, clause in enumerate(extracted):
+                    if clause.get("clause_id") not in indexed:
+                        index_clause(clause, ordinal)
+                elastic.flush("legal_clauses_index", owner=document_id)
+                log("clauses", "completed")
+                logger.info("clauses_indexed document_id=%s count=%s", document_id, len(extracted))
+                return finish("clauses")
+
+            def ner() -> bool:
+                entities = run_stage("ner").payload.get("entities", [])
+                for ordinal, entity in enumerate(entities):
+                    elastic.index(
+                        "legal_ner_index",
+                        {"document_id": document_id, **entity},
+                        doc_id=build_doc_id(document_id, "ner", ordinal),
+                        owner=document_id,
+                    )
+                elastic.flush("legal_ner_index", owner=document_id)
+                log("ner", "completed")
+                logger.info("ner_indexed document_id=%s count=%s", document_id, len(entities))
+                return finish("ner")
+
+            def spanned(stage: str, runner: Callable[[], bool]) -> Callable[[], bool]:
+                """Run a stage inside a metrics span (wall time, tokens, cost, cache hits)."""
+
+                def run() -> bool:
+                    with stage_span(stage, context.get("tenant_id"), document.size):
+                        return runner()
+
+                return run
+
+            runners = {
+                "extraction": spanned("extraction", extraction),
+                "classification": spanned("classification", classification),
+                "deduplication": spanned("deduplication", deduplication),
+                "contract_type": spanned("contract_type", contract_type),
+                "clauses": spanned("clauses", clauses),
+                "ner": spanned("ner", ner),
+            }
+            gates = {stage: PIPELINE_DAG[stage] for stage in GATE_STAGES}
+            passed = run_dag(gates, runners, completed, settings.pipeline_max_parallel_stages)
+            if passed:
+                # Only reuse results once classification has also confirmed the document is legal.
+                reuse_near_duplicate()
+                passed = run_dag(PIPELINE_DAG, runners, completed, settings.pipeline_max_parallel_stages)
+            if not passed:
+                log("orchestrator", stop_reason.get("reason", "stopped"))
+                if stop_reason.get("reason") != "duplicate":
+                    redis.mark_document_hash_done(document_hash, document_id)
+                return
+
+            get_agent("deduplication").register(document, document_id)
+    except Exception as exc:
+        exhausted = self.request.retries >= settings.max_retries
+        try:
+            log("orchestrator", "failed" if exhausted else "retrying", error=str(exc))
+        except Exception as log_exc:
+            logger.warning("task_log_failed document_id=%s error=%s", document_id, log_exc)
+        if document_hash and exhausted:
+            # Out of retries: free the hash so a re-upload is not reported as a duplicate forever.
+            redis.release_document_hash(document_hash, document_id)
+            logger.warning("dedup_claim_released document_id=%s", document_id)
+        raise
 
+    redis.mark_document_hash_done(document_hash, document_id)
     log("orchestrator", "completed")
     logger.info("pipeline_complete document_id=%s", document_id)
+    logger.info("prompt_cache_stats %s", cache_stats())
+    logger.info("llm_cache_stats %s", get_llm_cache().stats())
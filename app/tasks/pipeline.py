@@ -0,0 +1,39 @@
+"""Pipeline stage graph, importable without loading any worker code."""
+from __future__ import annotations
+
+from app.services.storage import PipelineProgress
+
+# Stage -> stages it depends on. Text extraction feeds everything; classification
+# and deduplication gate the pipeline; NER runs alongside contract-type
+# detection and clause extraction.
+PIPELINE_DAG: dict[str, tuple[str, ...]] = {
+    "extraction": (),
+    "classification": ("extraction",),
+    "deduplication": ("extraction",),
+    "contract_type": ("classification", "deduplication"),
+    "clauses": ("contract_type",),
+    "ner": ("classification", "deduplication"),
+}
+# Stages that decide whether a document is processed further, with their dependencies;
+# they finish before near-duplicate results are reused.
+GATE_STAGES = ("extraction", "classification", "deduplication")
+# Order used when pipeline_state only recorded last_completed_step.
+LEGACY_STEP_ORDER = ["extraction", "classification", "deduplication", "contract_type", "clauses", "ner"]
+# task_logs.agent value written for each stage.
+STAGE_LOG_AGENTS = {
+    "extraction": "extraction",
+    "classification": "legal_classifier",
+    "deduplication": "deduplication",
+    "contract_type": "contract_type",
+    "clauses": "clauses",
+    "ner": "ner",
+}
+
+
+def completed_steps(progress: PipelineProgress) -> set[str]:
+    """Completed stages, expanding a legacy ``last_completed_step`` to every step before it."""
+    if progress.completed_steps:
+        return set(progress.completed_steps)
+    if progress.last_completed_step in LEGACY_STEP_ORDER:
+        return set(LEGACY_STEP_ORDER[: LEGACY_STEP_ORDER.index(progress.last_completed_step) + 1])
+    return set()
@@ -0,0 +1,45 @@
+"""Lightweight task signatures for enqueueing work by name.
+
+The API imports only this module, so it never pulls in the agents, Transformers,
+Strands or LangChain just to publish a task.
+"""
+from __future__ import annotations
+
+from celery import Signature, group
+from celery.result import AsyncResult, GroupResult
+
+from app.tasks.celery_app import celery_app
+
+PROCESS_DOCUMENT_TASK = "app.tasks.orchestrator.process_legal_document"
+
+
+def process_document_signature(
+    document_id: str,
+    document_path: str,
+    extraction_mode: str = "all",
+    document_hash: str | None = None,
+) -> Signature:
+    """Build a signature for the document pipeline task."""
+    return celery_app.signature(
+        PROCESS_DOCUMENT_TASK,
+        args=(document_id, document_path, extraction_mode),
+        kwargs={"document_hash": document_hash},
+    )
+
+
+def enqueue_process_document(
+    document_id: str,
+    document_path: str,
+    extraction_mode: str = "all",
+    document_hash: str | None = None,
+) -> AsyncResult:
+    """Publish the document pipeline task without importing the worker code."""
+    return process_document_signature(document_id, document_path, extraction_mode, document_hash).apply_async()
+
+
+def enqueue_process_documents(documents: list[tuple[str, str, str, str | None]]) -> GroupResult:
+    """Publish many pipeline tasks as one group over a single broker connection.
+
+    Each entry is ``(document_id, document_path, extraction_mode, document_hash)``.
+    """
+    return group(process_document_signature(*document) for document in documents).apply_async()
@@ -0,0 +1,91 @@
+"""In-process TTL caching utilities."""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, negative_ttl: float | None = None, max_entries: int = 1024) -> None:
+        """Thread-safe TTL cache with version revalidation, negative entries and counters."""
+        self.name = name
+        self._ttl = ttl
+        self._negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: dict[Hashable, tuple[Any, str | None, float]] = {}
+        self._counters = {"hits": 0, "misses": 0, "revalidated": 0, "negative_hits": 0}
+        _register(self)
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], tuple[Any, str | None]],
+        revalidate: Callable[[], str | None] | None = None,
+    ) -> Any:
+        """Return a cached value, calling ``loader`` on miss or when the version changed.
+
+        ``loader`` returns ``(value, version)``; return ``MISSING`` as the value to cache
+        a negative entry. ``revalidate`` returns the registry's current version and is
+        only consulted for expired entries that carry a version.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            value, version, expires_at = entry
+            if now < expires_at:
+                self._count("negative_hits" if value is MISSING else "hits")
+                return None if value is MISSING else value
+            if version is not None and revalidate is not None:
+                try:
+                    current = revalidate()
+                except Exception:
+                    current = None
+                if current == version:
+                    self._store(key, value, version, now)
+                    self._count("revalidated")
+                    return value
+        self._count("misses")
+        value, version = loader()
+        self._store(key, value, version, now)
+        return None if value is MISSING else value
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """Drop one key, or every key when ``key`` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        """Return a snapshot of hit/miss counters and the current size."""
+        with self._lock:
+            return {**self._counters, "size": len(self._entries)}
+
+    def _store(self, key: Hashable, value: Any, version: str | None, now: float) -> None:
+        ttl = self._negative_ttl if value is MISSING else self._ttl
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self._max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (value, version, now + ttl)
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+
+_registry: dict[str, TTLCache] = {}
+
+
+def _register(cache: TTLCache) -> None:
+    _registry[cache.name] = cache
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Return counters for every named TTL cache in this process."""
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -0,0 +1,123 @@
+"""Text chunking utilities for window-based model inference."""
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+
+from pydantic import BaseModel
+
+_WORD_RE = re.compile(r"\S+")
+
+
+class TextWindow(BaseModel):
+    index: int
+    start: int
+    end: int
+    # Entities starting in [own_start, own_end) belong to this window; the
+    # boundaries sit mid-way through each overlap so every offset has one owner.
+    own_start: int
+    own_end: int
+
+
+def word_offsets(text: str) -> list[tuple[int, int]]:
+    """Whitespace token offsets, used when no fast tokenizer is available."""
+    return [match.span() for match in _WORD_RE.finditer(text)]
+
+
+def token_windows(offsets: list[tuple[int, int]], text_length: int, window: int, stride: int) -> list[TextWindow]:
+    """Group token character offsets into windows of ``window`` tokens overlapping by ``stride``."""
+    if window <= 0:
+        raise ValueError("window must be positive.")
+    if not 0 <= stride < window:
+        raise ValueError("stride must be in [0, window).")
+    if not offsets:
+        return [TextWindow(index=0, start=0, end=text_length, own_start=0, own_end=text_length)] if text_length else []
+
+    spans: list[tuple[int, int]] = []
+    first = 0
+    while True:
+        last = min(first + window, len(offsets))
+        spans.append((first, last))
+        if last == len(offsets):
+            break
+        first += window - stride
+
+    windows: list[TextWindow] = []
+    own_start = 0
+    for index, (first, last) in enumerate(spans):
+        if index + 1 < len(spans):
+            next_first = spans[index + 1][0]
+            own_end = offsets[(next_first + last) // 2][0]
+        else:
+            own_end = text_length
+        windows.append(
+            TextWindow(
+                index=index,
+                start=offsets[first][0],
+                end=offsets[last - 1][1],
+                own_start=own_start,
+                own_end=own_end,
+            )
+        )
+        own_start = own_end
+    return windows
+
+
+# Lines that open a new contract section: "ARTICLE IV", "Section 12", "12.3 Payment", "SCHEDULE A".
+_HEADING_RE = re.compile(
+    r"^[ \t]*(?:(?:article|section|clause|schedule|exhibit|annex|appendix)\b|\d+(?:\.\d+)*[.)]?[ \t]+\S)",
+    re.IGNORECASE | re.MULTILINE,
+)
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n")
+
+
+class TextSection(BaseModel):
+    index: int
+    start: int
+    end: int
+
+
+def split_sections(text: str, max_chars: int, overlap: int = 0) -> list[TextSection]:
+    """Split ``text`` into sections of at most ``max_chars`` characters, cutting at section boundaries.
+
+    Each section ends at the last heading (or, failing that, paragraph break) that
+    fits; a hard cut is used only when neither exists. Consecutive sections overlap
+    by up to ``overlap`` characters so clauses straddling a cut appear whole in one
+    of them.
+    """
+    if max_chars <= 0:
+        raise ValueError("max_chars must be positive.")
+    if not 0 <= overlap < max_chars // 2:
+        raise ValueError("overlap must be in [0, max_chars / 2).")
+    if len(text) <= max_chars:
+        return [TextSection(index=0, start=0, end=len(text))] if text else []
+
+    headings = sorted(match.start() for match in _HEADING_RE.finditer(text))
+    paragraphs = [match.end() for match in _PARAGRAPH_RE.finditer(text)]
+    sections: list[TextSection] = []
+    start = 0
+    while start < len(text):
+        limit = start + max_chars
+        if limit >= len(text):
+            end = len(text)
+        else:
+            # Never cut in the first half of a section, or sections degenerate into headings.
+            floor = start + max_chars // 2
+            end = _last_between(headings, floor, limit) or _last_between(paragraphs, floor, limit) or limit
+        sections.append(TextSection(index=len(sections), start=start, end=end))
+        if end == len(text):
+            break
+        start = max(end - overlap, start + 1)
+        if overlap:
+            # Begin the overlap on a word boundary.
+            space = text.find(" ", start, end)
+            start = space + 1 if space != -1 else start
+    return sections
+
+
+def _last_between(offsets: list[int], low: int, high: int) -> int | None:
+    """Largest offset in ``(low, high]``, or None."""
+    position = bisect_right(offsets, high)
+    if position and offsets[position - 1] > low:
+        return offsets[position - 1]
+    return None
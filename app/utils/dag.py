@@ -0,0 +1,75 @@
+"""Dependency-ordered concurrent execution of pipeline stages."""
+from __future__ import annotations
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Mapping
+
+
+def topological_order(graph: Mapping[str, tuple[str, ...]]) -> list[str]:
+    """Return stages in dependency order; raise ValueError on unknown dependencies or cycles."""
+    order: list[str] = []
+    state: dict[str, str] = {}
+
+    def visit(stage: str) -> None:
+        if state.get(stage) == "done":
+            return
+        if state.get(stage) == "visiting":
+            raise ValueError(f"Pipeline graph has a cycle through '{stage}'.")
+        if stage not in graph:
+            raise ValueError(f"Unknown pipeline stage '{stage}'.")
+        state[stage] = "visiting"
+        for dependency in graph[stage]:
+            visit(dependency)
+        state[stage] = "done"
+        order.append(stage)
+
+    for stage in graph:
+        visit(stage)
+    return order
+
+
+def run_dag(
+    graph: Mapping[str, tuple[str, ...]],
+    runners: Mapping[str, Callable[[], bool]],
+    completed: set[str],
+    max_workers: int,
+) -> bool:
+    """Run every stage not in ``completed`` once its dependencies are done.
+
+    A runner returns False to stop the pipeline: nothing new is started, stages
+    already running finish, and ``run_dag`` returns False. The first runner
+    exception is re-raised after in-flight stages finish. Runners may add stage
+    names to ``completed`` (e.g. when results were reused); a stage is only
+    scheduled after its dependencies return, so such additions are always seen.
+    """
+    topological_order(graph)
+    running: dict[Future, str] = {}
+    stopped = False
+    error: BaseException | None = None
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="stage") as pool:
+        while True:
+            if not stopped and error is None:
+                for stage, dependencies in graph.items():
+                    if stage in completed or stage in running.values():
+                        continue
+                    if all(dependency in completed for dependency in dependencies):
+                        # Each stage sees the caller's context variables (request ids, metrics spans).
+                        running[pool.submit(contextvars.copy_context().run, runners[stage])] = stage
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    keep_going = future.result()
+                except BaseException as exc:
+                    error = error or exc
+                    continue
+                if keep_going:
+                    completed.add(stage)
+                else:
+                    stopped = True
+    if error is not None:
+        raise error
+    return not stopped
@@ -0,0 +1,71 @@
+"""Per-run document handle shared by every pipeline agent."""
+from __future__ import annotations
+
+import hashlib
+import mmap
+from functools import cached_property
+from pathlib import Path
+from typing import Union
+
+from app.core.config import settings
+
+
+class DocumentHandle:
+    def __init__(self, path: Union[str, Path], mmap_threshold: int | None = None) -> None:
+        """Open a document once; files above ``mmap_threshold`` bytes are memory-mapped."""
+        self.path = Path(path)
+        threshold = settings.document_mmap_threshold if mmap_threshold is None else mmap_threshold
+        self._file = None
+        self._mmap: mmap.mmap | None = None
+        size = self.path.stat().st_size
+        if size and size >= threshold:
+            self._file = self.path.open("rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._bytes: bytes | None = None
+        else:
+            self._bytes = self.path.read_bytes()
+        self.size = size
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "DocumentHandle":
+        """Open a document handle for ``path``."""
+        return cls(path)
+
+    @property
+    def raw(self) -> bytes | mmap.mmap:
+        """Raw document bytes (the zero-copy memory map for large files)."""
+        if self._mmap is not None:
+            return self._mmap
+        return self._bytes or b""
+
+    @cached_property
+    def sha256(self) -> str:
+        """SHA-256 hex digest of the raw bytes."""
+        return hashlib.sha256(self.raw).hexdigest()
+
+    @cached_property
+    def text(self) -> str:
+        """Decoded document text, matching ``Path.read_text(errors="ignore")``."""
+        text = str(self.raw, "utf-8", "ignore")
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+
+    def use_text(self, text: str) -> None:
+        """Serve ``text`` (e.g. extracted from a PDF) as this document's text from now on."""
+        self.__dict__["text"] = text
+
+    def close(self) -> None:
+        """Release the memory map and file descriptor, if any."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "DocumentHandle":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,130 @@
+"""Incremental, tolerant extraction of JSON objects from streamed model output."""
+from __future__ import annotations
+
+import json
+import logging
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+_CLOSERS = {"}": "{", "]": "["}
+
+
+class JsonArrayStream:
+    """Emit each object element of a JSON array as soon as its closing brace arrives.
+
+    Works on ``[{...}, ...]`` as well as arrays nested in a wrapper such as
+    ``{"clauses": [...]}``; only the outermost array elements are emitted, not
+    objects nested inside them. Prose, code fences and a truncated tail are
+    ignored, and an element that fails to parse is skipped without affecting
+    the ones around it. Call ``close`` at the end of the stream: if prose with an
+    unbalanced quote or bracket hid every element, it re-parses the whole text.
+    """
+
+    def __init__(self) -> None:
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        # Text of the element being captured and the stack depth it opened at.
+        self._capture: list[str] = []
+        self._capture_depth: int | None = None
+        # Full text, kept only until the first element is emitted, for the ``close`` fallback.
+        self._text: list[str] | None = []
+        self.skipped = 0
+
+    def feed(self, chunk: str) -> list[dict]:
+        """Consume a chunk of output and return the elements it completed."""
+        completed: list[dict] = []
+        if self._text is not None:
+            self._text.append(chunk)
+        capturing = self._capture_depth is not None
+        start = 0
+        for position, char in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                # Quotes in prose around the JSON are not strings.
+                self._in_string = bool(self._stack)
+            elif char in "{[":
+                if char == "{" and not capturing and self._stack and self._stack[-1] == "[":
+                    capturing = True
+                    self._capture_depth = len(self._stack)
+                    start = position
+                self._stack.append(char)
+            elif char in _CLOSERS:
+                opener = _CLOSERS[char]
+                if opener not in self._stack:
+                    continue
+                # Tolerate a missing closer by unwinding to the matching opener.
+                while self._stack.pop() != opener:
+                    pass
+                if capturing and len(self._stack) <= self._capture_depth:
+                    self._capture.append(chunk[start : position + 1])
+                    if char == "}" and len(self._stack) == self._capture_depth:
+                        self._emit("".join(self._capture), completed)
+                    else:
+                        self.skipped += 1
+                    self._capture = []
+                    self._capture_depth = None
+                    capturing = False
+        if capturing:
+            self._capture.append(chunk[start:])
+        if completed:
+            self._text = None
+        return completed
+
+    def close(self) -> list[dict]:
+        """Elements the incremental scan missed; only when it emitted none at all."""
+        if self._text is None:
+            return []
+        text = "".join(self._text)
+        self._text = None
+        decoder = json.JSONDecoder()
+        for position, char in enumerate(text):
+            if char not in "[{":
+                continue
+            try:
+                value, _ = decoder.raw_decode(text, position)
+            except json.JSONDecodeError:
+                continue
+            elements = _array_objects(value)
+            if elements:
+                logger.debug("json_stream_fallback_parsed elements=%s", len(elements))
+                return elements
+        return []
+
+    def _emit(self, text: str, completed: list[dict]) -> None:
+        try:
+            element = json.loads(text)
+        except json.JSONDecodeError:
+            self.skipped += 1
+            logger.debug("json_stream_element_skipped length=%s", len(text))
+            return
+        completed.append(element)
+
+
+def _array_objects(value: object) -> list[dict]:
+    """Object elements of ``value`` if it is an array, else of the first array nested in it."""
+    if isinstance(value, list):
+        return [element for element in value if isinstance(element, dict)]
+    if isinstance(value, dict):
+        for nested in value.values():
+            elements = _array_objects(nested)
+            if elements:
+                return elements
+    return []
+
+
+def parse_array_objects(chunks: Iterable[str] | str) -> list[dict]:
+    """Every parseable object element of the JSON array(s) in ``chunks``."""
+    stream = JsonArrayStream()
+    if isinstance(chunks, str):
+        chunks = [chunks]
+    elements = [element for chunk in chunks for element in stream.feed(chunk)]
+    return elements + stream.close()
@@ -0,0 +1,49 @@
+"""Shingling and MinHash signatures for near-duplicate detection."""
+from __future__ import annotations
+
+import hashlib
+import re
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN_RE = re.compile(r"\w+")
+_CHUNK = 4096
+
+
+def shingle_hashes(text: str, size: int) -> np.ndarray:
+    """Return 32-bit hashes of the distinct word ``size``-shingles in normalized text."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) < size:
+        shingles = {" ".join(tokens)} if tokens else set()
+    else:
+        shingles = {" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+class MinHasher:
+    def __init__(self, num_perm: int, seed: int = 1) -> None:
+        """Universal hash family ``(a * x + b) mod p`` with fixed, seeded parameters."""
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = generator.randint(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)[:, None]
+        self._b = generator.randint(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        """MinHash signature of a set of shingle hashes (all-max for an empty set, which callers must not index)."""
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), _CHUNK):
+            chunk = hashes[start : start + _CHUNK][None, :]
+            permuted = ((self._a * chunk + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+            np.minimum(signature, permuted.min(axis=1), out=signature)
+        return signature
+
+
+def estimate_jaccard(left: np.ndarray, right: np.ndarray) -> float:
+    """Estimate Jaccard similarity from two signatures of equal length."""
+    return float(np.count_nonzero(left == right)) / len(left)
@@ -0,0 +1,52 @@
+"""Per-model token counting for prompt budgets."""
+from __future__ import annotations
+
+import logging
+from functools import lru_cache
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Fallback when tiktoken or its encoding files are unavailable: roughly four characters per token for English prose.
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=32)
+def _encoding(model: str) -> Any:
+    """The tiktoken encoding for ``model`` (cl100k_base for unknown models), or None when unavailable.
+
+    Encodings are downloaded on first use; an offline worker gets None (cached like any
+    result) and falls back to the character estimate instead of failing the stage.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Non-OpenAI models (Bedrock, local): cl100k_base is a close enough approximation for budgeting.
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        logger.warning("token_encoding_unavailable model=%s error=%s", model, exc)
+        return None
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    """Number of tokens ``text`` costs on ``model``."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "") -> str:
+    """The longest prefix of ``text`` that fits in ``max_tokens`` tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
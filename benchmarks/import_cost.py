@@ -0,0 +1,95 @@
+"""Import-time and RSS benchmark for the API and worker entry points.
+
+Each entry point is imported in a fresh interpreter so results are not skewed
+by modules already loaded in this process. Exits non-zero when a budget is
+exceeded or the API process pulls in a heavy ML/agent dependency.
+
+    python -m benchmarks.import_cost --max-api-seconds 2 --max-api-rss-mb 150
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ENTRY_POINTS = {
+    "api": "app.main",
+    "worker": "app.tasks.orchestrator",
+}
+
+# Modules that must never be imported just to enqueue a task.
+API_FORBIDDEN = ("torch", "transformers", "strands", "langchain_core", "app.agents.base")
+
+_PROBE = """
+import json, resource, sys, time
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": peak / 1024,
+    "rss_delta_mb": (peak - baseline) / 1024,
+    "modules": len(sys.modules),
+    "heavy": sorted(m for m in {heavy!r} if m in sys.modules),
+}}))
+"""
+
+
+def measure(module: str, repeat: int) -> dict:
+    """Import ``module`` in ``repeat`` fresh interpreters and keep the fastest run."""
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=API_FORBIDDEN)],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).resolve().parent.parent,
+            check=True,
+        )
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run["seconds"])
+    return {"module": module, **best}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-api-seconds", type=float, default=None)
+    parser.add_argument("--max-api-rss-mb", type=float, default=None)
+    parser.add_argument("--max-worker-seconds", type=float, default=None)
+    parser.add_argument("--max-worker-rss-mb", type=float, default=None)
+    parser.add_argument("--output", type=Path, default=None, help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    results = {name: measure(module, args.repeat) for name, module in ENTRY_POINTS.items()}
+    failures = []
+    if results["api"]["heavy"]:
+        failures.append(f"api imports heavy modules: {', '.join(results['api']['heavy'])}")
+    budgets = {
+        ("api", "seconds"): args.max_api_seconds,
+        ("api", "rss_mb"): args.max_api_rss_mb,
+        ("worker", "seconds"): args.max_worker_seconds,
+        ("worker", "rss_mb"): args.max_worker_rss_mb,
+    }
+    for (name, metric), limit in budgets.items():
+        if limit is not None and results[name][metric] > limit:
+            failures.append(f"{name} {metric}={results[name][metric]:.2f} exceeds {limit}")
+
+    for name, result in results.items():
+        print(
+            f"{name:<7} {result['module']:<24} {result['seconds']:.3f}s "
+            f"rss={result['rss_mb']:.1f}MB modules={result['modules']} heavy={result['heavy']}"
+        )
+    if args.output:
+        args.output.write_text(json.dumps({"results": results, "failures": failures}, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
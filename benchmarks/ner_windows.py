@@ -0,0 +1,59 @@
+"""NER sliding-window throughput and determinism benchmark.
+
+Runs NerAgent over the given text files for several batch sizes and window
+settings, reporting windows/sec and whether every configuration produced the
+same entities as the first one.
+
+    python -m benchmarks.ner_windows contracts/*.txt --batch-sizes 1 8 16
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from app.agents.ner_agent import NerAgent
+from app.utils.document import DocumentHandle
+
+
+def run(paths: list[Path], window: int, stride: int, batch_size: int) -> tuple[float, int, list]:
+    """Return (seconds, windows, entities) for one configuration."""
+    agent = NerAgent(window_tokens=window, stride_tokens=stride, batch_size=batch_size)
+    agent._get_pipeline()
+    windows = 0
+    entities = []
+    start = time.perf_counter()
+    for path in paths:
+        with DocumentHandle.open(path) as document:
+            windows += len(agent._windows(document.text))
+            result = agent.run_document(document, {"document_id": path.name})
+        entities.append([(e["entity_type"], e["start_offset"], e["end_offset"]) for e in result.payload["entities"]])
+    return time.perf_counter() - start, windows, entities
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", type=Path)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4, 8, 16])
+    parser.add_argument("--windows", nargs="+", type=int, default=[256, 384])
+    parser.add_argument("--stride", type=int, default=64)
+    args = parser.parse_args()
+
+    reference = None
+    consistent = True
+    for window in args.windows:
+        for batch_size in args.batch_sizes:
+            seconds, windows, entities = run(args.paths, window, args.stride, batch_size)
+            reference = entities if reference is None else reference
+            same = entities == reference
+            consistent &= same
+            print(
+                f"window={window:<4} stride={args.stride:<3} batch={batch_size:<3} "
+                f"{seconds:.2f}s {windows / seconds:.1f} windows/s same_entities={same}"
+            )
+    return 0 if consistent else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,429 @@
+"""Offline end-to-end pipeline benchmark.
+
+Runs ``process_legal_document`` eagerly over a synthetic CUAD-like corpus (or a
+directory of .txt contracts) with in-memory Postgres/Redis, an Elastic bulk
+stand-in behind an httpx mock transport, and stub LLM/Strands/NER models with
+injectable latency. Reports documents/sec, per-stage p50/p95/p99, allocations
+and peak RSS; ``--output`` stores the results as JSON for cross-commit diffs.
+
+    python -m benchmarks.pipeline_bench --documents 50 --llm-latency 0.2 --output bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+import httpx
+
+from app.agents.clause_extractor import ClauseExtractionAgent
+from app.agents.contract_type import ContractTypeAgent
+from app.agents.deduplicator import DeduplicationAgent
+from app.agents.legal_classifier import LegalClassifierAgent
+from app.agents.ner_agent import NerAgent
+from app.core.config import settings
+from app.services.elastic import ElasticClient
+from app.services.llm_client import LLMResult, StubLLMClient
+from app.services.storage import DocumentClaim, PipelineProgress, StageResult, TaskLog
+from app.tasks import orchestrator
+from app.tasks.pipeline import PIPELINE_DAG
+
+T = TypeVar("T")
+
+CLAUSES = {
+    "termination": "Either party may terminate this Agreement upon {n} days written notice to the other party.",
+    "confidentiality": (
+        "The Receiving Party shall hold all Confidential Information in strict confidence for {n} years."
+    ),
+    "governing_law": "This Agreement shall be governed by the laws of the State of {state}.",
+    "payment": "Customer shall pay each invoice within {n} days of receipt by wire transfer.",
+}
+STATES = ["Delaware", "New York", "California", "Texas", "Washington"]
+FILLER = (
+    "The parties acknowledge that the services described herein are provided on a non-exclusive basis and that "
+    "nothing in this Section limits the obligations of {party} under any Statement of Work executed by the parties."
+)
+PARTIES = ["Acme Corporation", "Globex Inc", "Initech LLC", "Umbrella Holdings", "Stark Industries"]
+
+
+def synthetic_contract(rng: random.Random, index: int, sections: int) -> str:
+    """Build a contract-shaped document with headings, boilerplate and the four tracked clause types."""
+    parts = [f"MASTER SERVICES AGREEMENT No. {index}\n\nBetween {rng.choice(PARTIES)} and {rng.choice(PARTIES)}."]
+    for number in range(1, sections + 1):
+        body = [FILLER.format(party=rng.choice(PARTIES)) for _ in range(rng.randint(2, 6))]
+        if rng.random() < 0.5:
+            clause = rng.choice(list(CLAUSES.values()))
+            body.insert(rng.randint(0, len(body)), clause.format(n=rng.randint(10, 90), state=rng.choice(STATES)))
+        parts.append(f"Section {number}. Terms\n" + " ".join(body))
+    return "\n\n".join(parts)
+
+
+def load_corpus(args: argparse.Namespace, directory: Path) -> list[Path]:
+    """Return document paths: files from ``--corpus`` or freshly generated synthetic contracts."""
+    if args.corpus:
+        return sorted(args.corpus.glob("*.txt"))[: args.documents]
+    rng = random.Random(args.seed)
+    paths = []
+    for index in range(args.documents):
+        path = directory / f"contract-{index:05d}.txt"
+        path.write_text(synthetic_contract(rng, index, args.sections))
+        paths.append(path)
+    return paths
+
+
+class InMemoryPostgres:
+    def __init__(self) -> None:
+        """Dict-backed stand-in for the PostgresClient methods the orchestrator uses."""
+        self._lock = threading.Lock()
+        self.logs: list[TaskLog] = []
+        self.progress: dict[str, list[str]] = {}
+        self.results: dict[str, list[StageResult]] = {}
+
+    def load_pipeline_progress(self, document_id: str) -> PipelineProgress:
+        with self._lock:
+            return PipelineProgress(completed_steps=list(self.progress.get(document_id, [])))
+
+    def mark_step_completed(self, document_id: str, step: str) -> None:
+        with self._lock:
+            steps = self.progress.setdefault(document_id, [])
+            if step not in steps:
+                steps.append(step)
+
+    def load_stage_results(self, document_id: str) -> list[StageResult]:
+        with self._lock:
+            return list(self.results.get(document_id, []))
+
+    def save_stage_result(self, document_id: str, result: StageResult) -> None:
+        with self._lock:
+            self.results.setdefault(document_id, []).append(result)
+
+    def save_task_log(self, log: TaskLog) -> None:
+        with self._lock:
+            self.logs.append(log)
+
+
+class InMemoryRedis:
+    def __init__(self) -> None:
+        """Dict-backed stand-in for the RedisClient claim methods."""
+        self._lock = threading.Lock()
+        self.claims: dict[str, DocumentClaim] = {}
+
+    def claim_document_hash(self, document_hash: str, document_id: str) -> DocumentClaim | None:
+        with self._lock:
+            existing = self.claims.get(document_hash)
+            if existing is not None:
+                return existing
+            self.claims[document_hash] = DocumentClaim(document_id=document_id, state="in_flight")
+            return None
+
+    def mark_document_hash_done(self, document_hash: str, document_id: str) -> bool:
+        with self._lock:
+            claim = self.claims.get(document_hash)
+            if claim is not None and claim.document_id != document_id:
+                return False
+            self.claims[document_hash] = DocumentClaim(document_id=document_id, state="done")
+            return True
+
+    def release_document_hash(self, document_hash: str, document_id: str) -> bool:
+        with self._lock:
+            claim = self.claims.get(document_hash)
+            if claim is not None and claim.document_id == document_id:
+                del self.claims[document_hash]
+                return True
+            return False
+
+
+def elastic_stub(latency: float) -> tuple[ElasticClient, dict[str, int]]:
+    """Real ElasticClient (buffering, NDJSON encoding) against in-process bulk, delete and template endpoints."""
+    counters = {"bulk_requests": 0, "documents": 0}
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/_index_template/"):
+            return httpx.Response(200, json={"acknowledged": True})
+        if request.url.path.endswith("/_delete_by_query"):
+            return httpx.Response(200, json={"deleted": 0})
+        lines = request.content.splitlines()
+        items = [
+            {"index": {"_index": json.loads(action)["index"]["_index"], "status": 201}} for action in lines[::2]
+        ]
+        counters["bulk_requests"] += 1
+        counters["documents"] += len(items)
+        if latency:
+            time.sleep(latency)
+        return httpx.Response(200, json={"errors": False, "items": items})
+
+    return ElasticClient("http://elastic.invalid", transport=httpx.MockTransport(handle)), counters
+
+
+class StubStrandsAgent:
+    def __init__(self, latency: float, respond: Callable[[str], str]) -> None:
+        """Pooled-Strands-agent stand-in: sleeps ``latency`` then answers from ``respond``."""
+        self.provider, self.model, self.temperature = "stub", "stub", 0.0
+        self.latency = latency
+        self.respond = respond
+
+    def __call__(self, prompt: str) -> str:
+        time.sleep(self.latency)
+        return self.respond(prompt)
+
+
+class BenchClassifier(LegalClassifierAgent):
+    def __init__(self, latency: float) -> None:
+        super().__init__()
+        self._stub = StubStrandsAgent(latency, lambda prompt: '{"is_legal": true}')
+
+    def _get_strands_agent(self, context: dict) -> StubStrandsAgent:
+        return self._stub
+
+
+class BenchContractType(ContractTypeAgent):
+    def __init__(self, latency: float) -> None:
+        super().__init__()
+        self._stub = StubStrandsAgent(latency, lambda prompt: '{"contract_type": "Service Agreement"}')
+
+    def _get_strands_agent(self, context: dict) -> StubStrandsAgent:
+        return self._stub
+
+
+_CLAUSE_PATTERNS = [
+    (
+        name,
+        re.compile(
+            re.escape(template).replace(r"\{n\}", r"\d+").replace(r"\{state\}", r"[A-Z][a-z]+(?: [A-Z][a-z]+)?")
+        ),
+    )
+    for name, template in CLAUSES.items()
+]
+
+
+class ClauseStubLLM(StubLLMClient):
+    def _answer(self, prompt: str) -> LLMResult:
+        """Return every known clause sentence present in the prompt's document section."""
+        document = prompt.rsplit("Document:\n", 1)[-1]
+        clauses = [
+            {"clause_type": name, "text": match.group(0), "confidence": 0.9}
+            for name, pattern in _CLAUSE_PATTERNS
+            for match in pattern.finditer(document)
+        ]
+        return LLMResult(text=json.dumps(clauses), metadata={"provider": "stub"})
+
+    def generate(self, prompt: str) -> LLMResult:
+        time.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def agenerate(self, prompt: str) -> LLMResult:
+        await asyncio.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def astream(self, prompt: str, on_text) -> LLMResult:
+        """Emit the answer in chunks spread over ``latency``, like a provider stream."""
+        result = self._answer(prompt)
+        chunks = [result.text[start : start + 64] for start in range(0, len(result.text), 64)] or [""]
+        for chunk in chunks:
+            await asyncio.sleep(self.latency / len(chunks))
+            on_text(chunk)
+        return result
+
+
+_ORG_SUFFIXES = {"Corporation", "Inc", "LLC", "Holdings", "Industries"}
+_ENTITY_RE = re.compile(
+    r"\b(?:[A-Z][a-z]+ )+(?:Corporation|Inc|LLC|Holdings|Industries)\b"
+    r"|\b(?:Delaware|New York|California|Texas|Washington)\b"
+)
+
+
+class BenchNer(NerAgent):
+    def __init__(self, latency: float) -> None:
+        super().__init__()
+        self._latency = latency
+
+    @classmethod
+    def _get_tokenizer(cls):
+        return None
+
+    def _extract(self, texts: list[str]) -> list[list[dict]]:
+        """Regex entities, sleeping ``latency`` per model batch."""
+        batches = -(-len(texts) // self._batch_size)
+        time.sleep(self._latency * batches)
+        return [
+            [
+                {
+                    "entity_group": "ORG" if match.group(0).split()[-1] in _ORG_SUFFIXES else "LOC",
+                    "word": match.group(0),
+                    "start": match.start(),
+                    "end": match.end(),
+                    "score": 0.99,
+                }
+                for match in _ENTITY_RE.finditer(text)
+            ]
+            for text in texts
+        ]
+
+
+def _timed(stage: str, function: Callable[..., T], timings: dict[str, list[float]]) -> Callable[..., T]:
+    """Wrap an agent's ``run_document`` (or another stage entry point) to record per-stage wall time."""
+    lock = threading.Lock()
+
+    def run(*args, **kwargs) -> T:
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with lock:
+                timings[stage].append(elapsed)
+
+    return run
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    """Nearest-rank p50/p95/p99 plus mean and count, in milliseconds."""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": rank(0.50),
+        "p95_ms": rank(0.95),
+        "p99_ms": rank(0.99),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).resolve().parent.parent,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    """Execute the benchmark and return the JSON-serializable results."""
+    settings.llm_cache_enabled = False
+    settings.near_dup_enabled = False
+    settings.preclassifier_model_path = ""
+    settings.ner_server_socket = ""
+    settings.pipeline_max_parallel_stages = args.parallel_stages
+    settings.clause_max_concurrency = args.clause_concurrency
+
+    postgres = InMemoryPostgres()
+    redis = InMemoryRedis()
+    elastic, elastic_counters = elastic_stub(args.elastic_latency)
+    agents = {
+        "classification": BenchClassifier(args.strands_latency),
+        "deduplication": DeduplicationAgent(redis_client=redis),
+        "contract_type": BenchContractType(args.strands_latency),
+        "clauses": ClauseExtractionAgent(llm_client=ClauseStubLLM(latency=args.llm_latency)),
+        "ner": BenchNer(args.ner_latency),
+    }
+    timings: dict[str, list[float]] = {stage: [] for stage in PIPELINE_DAG}
+    for stage, agent in agents.items():
+        agent.run_document = _timed(stage, agent.run_document, timings)
+
+    orchestrator.PostgresClient = lambda: postgres
+    orchestrator.RedisClient = lambda: redis
+    orchestrator.get_elastic_client = lambda: elastic
+    orchestrator.get_agent = agents.__getitem__
+    orchestrator.get_extracted_text = _timed("extraction", orchestrator.get_extracted_text, timings)
+
+    with tempfile.TemporaryDirectory(prefix="lexiai-bench-") as directory:
+        paths = load_corpus(args, Path(directory))
+        if not paths:
+            raise SystemExit("No documents to process.")
+        corpus_bytes = sum(path.stat().st_size for path in paths)
+
+        if args.tracemalloc:
+            tracemalloc.start()
+        document_seconds: list[float] = []
+        start = time.perf_counter()
+        for index, path in enumerate(paths):
+            document_start = time.perf_counter()
+            result = orchestrator.process_legal_document.apply(args=(f"bench-{index:05d}", str(path)))
+            result.get(propagate=True)
+            document_seconds.append(time.perf_counter() - document_start)
+        elapsed = time.perf_counter() - start
+        allocations = {}
+        if args.tracemalloc:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            allocations = {"traced_current_mb": current / 2**20, "traced_peak_mb": peak / 2**20}
+    elastic.close()
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            key: (str(value) if isinstance(value, Path) else value)
+            for key, value in vars(args).items()
+            if key != "output"
+        },
+        "documents": len(paths),
+        "corpus_mb": corpus_bytes / 2**20,
+        "seconds": elapsed,
+        "documents_per_second": len(paths) / elapsed,
+        "pipeline": percentiles(document_seconds),
+        "stages": {stage: percentiles(values) for stage, values in timings.items()},
+        "elastic": elastic_counters,
+        "memory": {"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, **allocations},
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--sections", type=int, default=40, help="Sections per synthetic contract.")
+    parser.add_argument(
+        "--corpus", type=Path, default=None, help="Directory of .txt contracts instead of synthetic ones."
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per clause-extraction LLM call.")
+    parser.add_argument("--strands-latency", type=float, default=0.05, help="Seconds per Strands call.")
+    parser.add_argument("--ner-latency", type=float, default=0.01, help="Seconds per NER model batch.")
+    parser.add_argument("--elastic-latency", type=float, default=0.0, help="Seconds per bulk request.")
+    parser.add_argument("--parallel-stages", type=int, default=settings.pipeline_max_parallel_stages)
+    parser.add_argument("--clause-concurrency", type=int, default=settings.clause_max_concurrency)
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false")
+    parser.add_argument("--output", type=Path, default=None, help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(
+        f"{results['documents']} documents in {results['seconds']:.2f}s "
+        f"({results['documents_per_second']:.2f} docs/s) peak_rss={results['memory']['peak_rss_mb']:.1f}MB"
+    )
+    for stage, stats in {"pipeline": results["pipeline"], **results["stages"]}.items():
+        if stats["count"]:
+            print(
+                f"{stage:<15} n={stats['count']:<5} p50={stats['p50_ms']:8.1f}ms "
+                f"p95={stats['p95_ms']:8.1f}ms p99={stats['p99_ms']:8.1f}ms"
+            )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+"""Tiny stdio MCP server used as a stand-in by the MCP session tests."""
+from __future__ import annotations
+
+import os
+
+from mcp.server.fastmcp import FastMCP
+
+server = FastMCP("stand-in")
+
+
+@server.resource("stand-in://pid")
+def server_pid() -> str:
+    """Process id of this server, so callers can tell sessions apart."""
+    return str(os.getpid())
+
+
+if __name__ == "__main__":
+    server.run()
@@ -0,0 +1,112 @@
+"""ElasticClient bulk buffering against an in-process httpx.MockTransport stand-in."""
+from __future__ import annotations
+
+import json
+
+import httpx
+import pytest
+
+from app.services.elastic import ElasticBulkError, ElasticClient
+
+
+class BulkStandIn:
+    def __init__(self) -> None:
+        """Accept every bulk item except ids listed in ``reject``; fail requests while ``down``."""
+        self.reject: set[str] = set()
+        self.down = False
+        self.indexed: list[tuple[str, dict]] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/_index_template/"):
+            return httpx.Response(200, json={"acknowledged": True})
+        if self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        if request.url.path.endswith("/_delete_by_query"):
+            index = request.url.path.split("/")[1]
+            document_id = json.loads(request.content)["query"]["bool"]["should"][0]["term"]["document_id"]
+            kept = [item for item in self.indexed if (item[0], item[1]["document_id"]) != (index, document_id)]
+            deleted = len(self.indexed) - len(kept)
+            self.indexed[:] = kept
+            return httpx.Response(200, json={"deleted": deleted})
+        lines = request.content.splitlines()
+        items = []
+        for action_line, source_line in zip(lines[::2], lines[1::2]):
+            action = json.loads(action_line)["index"]
+            if action.get("_id") in self.reject:
+                items.append({"index": {**action, "status": 400, "error": {"type": "mapper_parsing_exception"}}})
+                continue
+            self.indexed.append((action["_index"], json.loads(source_line)))
+            items.append({"index": {**action, "status": 201}})
+        return httpx.Response(200, json={"errors": False, "items": items})
+
+
+@pytest.fixture
+def stand_in() -> BulkStandIn:
+    return BulkStandIn()
+
+
+@pytest.fixture
+def client(stand_in: BulkStandIn):
+    # Thresholds no test reaches: documents stay buffered until flushed explicitly.
+    elastic = ElasticClient(
+        "http://elastic.invalid",
+        transport=httpx.MockTransport(stand_in),
+        max_docs=1000,
+        max_bytes=1 << 30,
+        flush_interval=3600,
+    )
+    yield elastic
+    stand_in.down = False
+    stand_in.reject.clear()
+    elastic.close()
+
+
+def test_flush_sends_and_reports_only_the_owners_documents(client: ElasticClient, stand_in: BulkStandIn) -> None:
+    client.index("legal_ner_index", {"document_id": "a"}, doc_id="a:ner:0", owner="a")
+    client.index("legal_ner_index", {"document_id": "b"}, doc_id="b:ner:0", owner="b")
+    stand_in.reject.add("b:ner:0")
+
+    report = client.flush("legal_ner_index", owner="a")
+
+    assert report.indexed == 1
+    assert report.failures == []
+    assert [source["document_id"] for _, source in stand_in.indexed] == ["a"]
+
+
+def test_rejected_items_raise_bulk_error(client: ElasticClient, stand_in: BulkStandIn) -> None:
+    stand_in.reject.add("a:clauses:1")
+    client.index("legal_clauses_index", {"document_id": "a"}, doc_id="a:clauses:0", owner="a")
+    client.index("legal_clauses_index", {"document_id": "a"}, doc_id="a:clauses:1", owner="a")
+
+    with pytest.raises(ElasticBulkError) as raised:
+        client.flush(owner="a")
+
+    report = raised.value.report
+    assert report.indexed == 1
+    assert [(failure.doc_id, failure.status) for failure in report.failures] == [("a:clauses:1", 400)]
+
+
+def test_unsent_payloads_are_requeued_after_connect_error(client: ElasticClient, stand_in: BulkStandIn) -> None:
+    client.index("legal_clauses_index", {"document_id": "a"}, doc_id="a:clauses:0", owner="a")
+    client.index("legal_ner_index", {"document_id": "a"}, doc_id="a:ner:0", owner="a")
+    stand_in.down = True
+
+    with pytest.raises(httpx.ConnectError):
+        client.flush(owner="a")
+    assert stand_in.indexed == []
+
+    stand_in.down = False
+    report = client.flush(owner="a")
+
+    assert report.indexed == 2
+    assert sorted(index for index, _ in stand_in.indexed) == ["legal_clauses_index", "legal_ner_index"]
+
+
+def test_delete_documents_removes_only_that_document(client: ElasticClient, stand_in: BulkStandIn) -> None:
+    client.index("legal_clauses_index", {"document_id": "a"}, doc_id="a:clauses:0.0", owner="a")
+    client.index("legal_clauses_index", {"document_id": "b"}, doc_id="b:clauses:0.0", owner="b")
+    client.flush(owner="a")
+    client.flush(owner="b")
+
+    assert client.delete_documents("legal_clauses_index", "a") == 1
+    assert [source["document_id"] for _, source in stand_in.indexed] == ["b"]
@@ -0,0 +1,17 @@
+"""Tolerant JSON array parsing of streamed model output."""
+from __future__ import annotations
+
+from app.utils.json_stream import JsonArrayStream, parse_array_objects
+
+
+def test_elements_are_emitted_as_they_complete() -> None:
+    stream = JsonArrayStream()
+
+    assert stream.feed('Here you go: [{"a": 1}, {"b"') == [{"a": 1}]
+    assert stream.feed(": 2}]") == [{"b": 2}]
+    assert stream.close() == []
+
+
+def test_unbalanced_prose_before_the_json_falls_back_to_a_full_parse() -> None:
+    assert parse_array_objects('Note: "quoted [thing" then [{"a":1}]') == [{"a": 1}]
+    assert parse_array_objects(['Note: "quoted [thing" then ', '{"clauses": [{"a":1}]}']) == [{"a": 1}]
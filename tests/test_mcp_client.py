@@ -0,0 +1,45 @@
+"""MCPSessionManager against a local stdio MCP server stand-in."""
+from __future__ import annotations
+
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("mcp")
+pytest.importorskip("strands.tools.mcp")
+
+from app.mcp.client import MCPConfig, MCPSessionManager  # noqa: E402
+
+STAND_IN = MCPConfig(command=sys.executable, args=[str(Path(__file__).with_name("mcp_stand_in.py"))])
+
+
+def _server_pid(manager: MCPSessionManager) -> int:
+    result = manager.call(STAND_IN, lambda client: client.read_resource_sync("stand-in://pid"))
+    return int(result.contents[0].text)
+
+
+@pytest.fixture
+def manager():
+    sessions = MCPSessionManager()
+    yield sessions
+    sessions.shutdown()
+
+
+def test_session_is_reused_across_calls(manager: MCPSessionManager) -> None:
+    assert _server_pid(manager) == _server_pid(manager)
+
+
+def test_session_reconnects_after_server_dies(manager: MCPSessionManager) -> None:
+    first = _server_pid(manager)
+    os.kill(first, signal.SIGKILL)
+    # Give the client's background thread time to notice the closed pipe.
+    time.sleep(1)
+
+    second = _server_pid(manager)
+
+    assert second != first
+    assert _server_pid(manager) == second